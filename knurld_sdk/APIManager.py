@@ -6,27 +6,40 @@
 # license that can be found in the LICENSE file
 """
 
+import hashlib
 import json
+import logging
 import re
-import requests
-import time
 from datetime import datetime
+from functools import partial
 
-from knurld_sdk import app_globals as g
 from knurld_sdk import helpers as h
-from knurld_sdk.CustomExceptions import ImproperArgumentsException
+from knurld_sdk.client import default_client
+from knurld_sdk.deadline import budget, current_deadline, remaining
+from knurld_sdk.logs import log_failure, log_response
+from knurld_sdk.pagination import DEFAULT_SCAN_WORKERS, iter_items, page_size_from_config, scan
+from knurld_sdk.pipeline import Call
+from knurld_sdk.polling import FINAL_STATUSES, work_order_done
+from knurld_sdk.session import retry_after_hint
+from knurld_sdk.timeline import STATUS_ERROR, Timeline, outcome
+from knurld_sdk.tokens import TokenManager
+from knurld_sdk.CustomExceptions import DeadlineExceeded, ImproperArgumentsException
 
+log = logging.getLogger(__name__)
 
-def authorization_header(token=None, content_type='application/json', developer_id=None):
+
+def authorization_header(token=None, content_type='application/json', developer_id=None, client=None):
 
     try:
-        tg = TokenGetter()
-        token = token if token else tg.get_token()
+        client = client if client else default_client()
+        if not token:
+            # prebuilt headers of the client's token, reused until the token rotates
+            return client.headers(content_type=content_type, developer_id=developer_id)
 
         headers = {
             'Content-Type': content_type,
             'Authorization': 'Bearer ' + str(token),
-            'Developer-Id': g.config['DEVELOPER_ID']
+            'Developer-Id': client.config['DEVELOPER_ID']
         }
         # for a consumer the consumer token replaces the Developer-Id
         if developer_id:
@@ -35,18 +48,59 @@ def authorization_header(token=None, content_type='application/json', developer_
         return headers
 
     except Exception as e:
-        print('Could not obtain Authorization header' + str(e))
+        log.error('Could not obtain Authorization header: %s', e)
+        return None
+
+
+def _call(client, method, url_key, path=(), query='', expect=200, payload=None):
+    """ sends a call through the pipeline of the client; the url is built here as well, so that a missing id or
+    config option fails the call like any other error
+    :param url_key: config option of the resource url, or a callable(config) returning the url
+    :param path: segments appended to the url, e.g. [enrollment_id]
+    :param query: query string appended to the url, starting with '?'
+    :param expect: status code of a successful response
+    :return: the decoded body of a successful response, (status code, content) of an error response, None when the
+        call raised, timed out or was not sent because the deadline of the current budget had passed
+    """
+    try:
+        url = url_key(client.config) if callable(url_key) else client.config[url_key]
+        url += ''.join('/' + segment for segment in path) + query
+        response = client.pipeline.send(Call(method, url, client, json=payload, deadline=current_deadline()))
+        log_response(response)
+        if response.status_code == expect:
+            return json.loads(response.content)
+        log_failure(log, response)
+        return response.status_code, response.content
+
+    except Exception as e:
+        log.error('Could not perform the operation: %s', e)
         return None
 
 
+def _within(resource, seconds, flow, *args):
+    """ runs flow(*args), a multi-step flow of resource, under a budget of seconds
+    :raise DeadlineExceeded: when the budget ran out before the flow succeeded
+    """
+    with budget(seconds) as deadline:
+        result = flow(*args)
+    timeline = resource.timeline
+    if deadline is not None and deadline.expired and timeline.root.status == STATUS_ERROR:
+        timeline.root.set(status='deadline exceeded')
+        raise DeadlineExceeded('{} did not finish within its {}s budget'.format(timeline.name, deadline.seconds))
+    return result
+
+
 class Verification(object):
 
     # can leave app_model_id & consumer_id blank, for readonly objects
-    def __init__(self, token, app_model_id='', consumer_id=''):
+    def __init__(self, token, app_model_id='', consumer_id='', client=None):
         self.token = token
+        self.client = client if client else default_client()
         self.app_model_id = app_model_id
         self.consumer_id = consumer_id
         self.verification_url = None
+        self.poll_metrics = None
+        self.timeline = None    # Timeline of the last steps() call
 
     @property
     def verification_id(self):
@@ -63,22 +117,11 @@ class Verification(object):
     def create(self):
         """ create or register the verification work order
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_VERIFICATIONS']
-            response = requests.post(url, json=self.payload, headers=headers)
-            print(response)
-            print(response.content)
-            if response.status_code == 201:
-                result = json.loads(response.content)
-                self.verification_url = result.get('href')
-                return self.verification_id
-            else:
-                return response.status_code, response.content
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_VERIFICATIONS', expect=201, payload=self.payload)
+        if not isinstance(result, dict):
+            return result
+        self.verification_url = result.get('href')
+        return self.verification_id
 
     def update(self, verification_id, payload_update):
         """ update existing verification work order with a payload containing wav_file and/or intervals
@@ -97,89 +140,81 @@ class Verification(object):
                 }
         """
         # TODO: could change this to use the consumer specific tokens in the future, with developer_id param to headers
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_VERIFICATIONS'] + '/' + verification_id
-            response = requests.post(url, json=payload_update, headers=headers)
-            print(response)
-            print(response.content)
-            if response.status_code == 202:
-                result = json.loads(response.content)
-                self.verification_url = result.get('href')
-                return self.verification_id
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_VERIFICATIONS', [verification_id], expect=202, payload=payload_update)
+        if not isinstance(result, dict):
+            return result
+        self.verification_url = result.get('href')
+        return self.verification_id
 
     def get(self, verification_id):
         """ get verification for the given enrollment id
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_VERIFICATIONS'] + '/' + verification_id
-
-            response = requests.get(url, headers=headers)
-            print(response)
-            print(response.content)
-
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                self.verification_url = result.get('href')
-                return result
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'GET', 'URL_VERIFICATIONS', [verification_id])
+        if isinstance(result, dict):
+            self.verification_url = result.get('href')
+        return result
 
     @staticmethod
-    def get_all(limit=10, offset=0):
+    def get_all(limit=10, offset=0, client=None):
         """ return all the verifications for given offset, start, end
-            TODO: the proper usage of parameters when pagination is needed
+            use iter_all() to walk every page
         """
-        headers = authorization_header()
+        client = client if client else default_client()
+        return _call(client, 'GET', 'URL_VERIFICATIONS', query='?limit=' + str(limit) + '&offset=' + str(offset))
 
-        try:
-            url = g.config['URL_VERIFICATIONS'] + '?limit=' + str(limit) + '&offset=' + str(offset)
-
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                return result
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
+    @staticmethod
+    def iter_all(page_size=None, offset=0, prefetch=True, client=None):
+        """ lazily iterates over all the verifications, fetching the next page in the background while the current
+        one is consumed
+        :param page_size: items per request, defaults to the PAGE_SIZE config option
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return iter_items(partial(Verification.get_all, client=client), page_size=page_size, offset=offset,
+                          prefetch=prefetch)
 
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+    @staticmethod
+    def scan_all(page_size=None, workers=DEFAULT_SCAN_WORKERS, ordered=True, client=None):
+        """ iterates over all the verifications, fetching the pages on concurrent workers; meant for full account scans
+        :param ordered: False to yield the pages as they arrive instead of in listing order
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return scan(partial(Verification.get_all, client=client), page_size=page_size, workers=workers, ordered=ordered)
 
-    def step_one(self):
-        """ create verification and get instructions
+    def step_one(self, deadline=None):
+        """ create verification and get instructions; self.timeline records the stages of step_one and step_two
+        :param deadline: seconds step_one may take, every call gets the time left as its timeout
+        :raise DeadlineExceeded: when step_one failed to finish within deadline
         """
+        return _within(self, deadline, self._step_one)
+
+    def _step_one(self):
+        timeline = self.timeline = Timeline('verification', app_model_id=self.app_model_id,
+                                            consumer_id=self.consumer_id)
+        with timeline.span('token') as span:
+            span.record(authorization_header(client=self.client))
+
         # create a fresh work order for verification, here self.verification_id is set internally
-        verification_id = self.create()
-        print('step-1: create: put verification_id, model_id: self.enrollment_id ' + str(self.verification_id))
-        if not verification_id:
+        with timeline.span('create') as span:
+            verification_id = span.record(self.create())
+        log.debug('step-1: created verification %s', self.verification_id)
+        if not verification_id or isinstance(verification_id, tuple):
+            timeline.finish(error=True)
             return None
+        timeline.root.set(verification_id=self.verification_id)
 
         # get the instructions for as to how to proceed with the verification
-        instructions = self.get(self.verification_id)
-        print('Follow these instructions to do proper Verification: ' + str(instructions.get('instructions')))
-        if not instructions or type(instructions) == 'tuple':
+        with timeline.span('instructions') as span:
+            instructions = span.record(self.get(self.verification_id))
+        if not instructions or isinstance(instructions, tuple):
+            timeline.finish(error=True)
             return None
+        log.info('Follow these instructions to do proper Verification: %s', instructions.get('instructions'))
 
         return instructions.get('instructions')
 
-    def step_two(self, payload_update):
+    def step_two(self, payload_update, deadline=None):
         """ using the instructions from step one developer must create the appropriate payload and pass it to step_two
         :param payload_update: e.g.
             payload = {
@@ -193,29 +228,34 @@ class Verification(object):
                     { .... }
                 ]
             }
+        :param deadline: seconds step_two may take, the polling included
+        :raise DeadlineExceeded: when the verification did not complete within deadline
         """
-        # update the verification work order with the verification.wav and intervals payload
-        status_time_lapse = 0
-        status_timestamp = datetime.now()
-        _ = self.update(self.verification_id, payload_update=payload_update)
+        return _within(self, deadline, self._step_two, payload_update)
 
-        verify_result = None
-        try:
-            verify_result = self.get(self.verification_id)
-            verify_status = verify_result.get('status')
-            while unicode(verify_status) != u'completed' \
-                    and status_time_lapse < float(g.config['REATTEMPT_CALLS_FOR']):
-                time.sleep(0.01)
-                verify_result = self.get(self.verification_id)
-                verify_status = verify_result.get('status')
-                print('* verification status: ' + str(verify_status))
-                status_time_lapse = (datetime.now() - status_timestamp).total_seconds()
+    def _step_two(self, payload_update):
+        # continues the timeline of step_one for the same verification
+        timeline = self.timeline
+        if timeline is None or timeline.root.attributes.get('verification_id') != self.verification_id:
+            timeline = self.timeline = Timeline('verification', verification_id=self.verification_id)
 
-        except AttributeError as e:
-            print('Verification check status error {}'.format(e))
+        # update the verification work order with the verification.wav and intervals payload
+        with timeline.span('update') as span:
+            span.record(self.update(self.verification_id, payload_update=payload_update))
+
+        # poll with backoff until the verification is 'completed' or 'failed', limited by REATTEMPT_CALLS_FOR
+        verify_result, self.poll_metrics = self.client.poller.poll(
+            timeline.traced('poll', lambda: self.get(self.verification_id)),
+            is_done=work_order_done('status'),
+            operation='verification',
+            timeout=remaining(float(self.client.config['REATTEMPT_CALLS_FOR'])),
+            retry_hint=retry_after_hint)
 
         # finally, when the verification status is 'completed' return verification result
-        print('Final result of Verification: ' + str(verify_result))
+        status = outcome(verify_result)
+        timeline.mark('result', status=status)
+        timeline.finish(error=status != u'completed', status=status)
+        log.info('Final result of Verification: %s', verify_result)
         return verify_result
 
     def delete(self, verification_id):
@@ -223,37 +263,23 @@ class Verification(object):
         :param verification_id:
         :return: result of deletion
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_VERIFICATIONS'] + '/' + verification_id
-
-            response = requests.delete(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                if result.get('href'):
-                    self.verification_url = result.get('href')
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
+        result = _call(self.client, 'DELETE', 'URL_VERIFICATIONS', [verification_id])
+        if isinstance(result, dict) and result.get('href'):
+            self.verification_url = result.get('href')
         return result
 
 
 class Enrollment(object):
 
     # can leave app_model_id & consumer_id blank, for readonly objects
-    def __init__(self, token, app_model_id='', consumer_id=''):
+    def __init__(self, token, app_model_id='', consumer_id='', client=None):
         self.token = token
+        self.client = client if client else default_client()
         self.app_model_id = app_model_id
         self.consumer_id = consumer_id
         self.enrollment_url = None
+        self.poll_metrics = None
+        self.timeline = None    # Timeline of the last steps() call
 
     @property
     def enrollment_id(self):
@@ -270,22 +296,11 @@ class Enrollment(object):
     def create(self):
         """ create the enrollment using an app-model and consumer
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_ENROLLMENTS']
-
-            response = requests.post(url, json=self.payload, headers=headers)
-            if response.status_code == 201:
-                result = json.loads(response.content)
-                self.enrollment_url = result.get('href')
-                return self.enrollment_id
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_ENROLLMENTS', expect=201, payload=self.payload)
+        if not isinstance(result, dict):
+            return result
+        self.enrollment_url = result.get('href')
+        return self.enrollment_id
 
     def update(self, enrollment_id, payload_update):
         """ update existing enrollment work order with a payload containing wav_file and/or intervals
@@ -304,84 +319,80 @@ class Enrollment(object):
                 }
         """
         # TODO: could change this to use the consumer specific tokens in the future, with developer_id param
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_ENROLLMENTS'] + '/' + enrollment_id
-            response = requests.post(url, json=payload_update, headers=headers)
-            print(response)
-            print(response.content)
-            if response.status_code == 202:
-                result = json.loads(response.content)
-                self.enrollment_url = result.get('href')
-                return self.enrollment_id
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_ENROLLMENTS', [enrollment_id], expect=202, payload=payload_update)
+        if not isinstance(result, dict):
+            return result
+        self.enrollment_url = result.get('href')
+        return self.enrollment_id
 
     def get(self, enrollment_id):
         """ get enrollment for the given enrollment id
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_ENROLLMENTS'] + '/' + enrollment_id
-
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                self.enrollment_url = result.get('href')
-                return result
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'GET', 'URL_ENROLLMENTS', [enrollment_id])
+        if isinstance(result, dict):
+            self.enrollment_url = result.get('href')
+        return result
 
     @staticmethod
-    def get_all(limit=10, offset=0):
+    def get_all(limit=10, offset=0, client=None):
         """ return all the enrollments for given offset, start, end
-            TODO: the proper usage of parameters when pagination is needed
+            use iter_all() to walk every page
         """
-        headers = authorization_header()
+        client = client if client else default_client()
+        return _call(client, 'GET', 'URL_ENROLLMENTS', query='?limit=' + str(limit) + '&offset=' + str(offset))
 
-        try:
-            url = g.config['URL_ENROLLMENTS'] + '?limit=' + str(limit) + '&offset=' + str(offset)
+    @staticmethod
+    def iter_all(page_size=None, offset=0, prefetch=True, client=None):
+        """ lazily iterates over all the enrollments, fetching the next page in the background while the current
+        one is consumed
+        :param page_size: items per request, defaults to the PAGE_SIZE config option
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return iter_items(partial(Enrollment.get_all, client=client), page_size=page_size, offset=offset,
+                          prefetch=prefetch)
 
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                return result
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
+    @staticmethod
+    def scan_all(page_size=None, workers=DEFAULT_SCAN_WORKERS, ordered=True, client=None):
+        """ iterates over all the enrollments, fetching the pages on concurrent workers; meant for full account scans
+        :param ordered: False to yield the pages as they arrive instead of in listing order
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return scan(partial(Enrollment.get_all, client=client), page_size=page_size, workers=workers, ordered=ordered)
 
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+    def steps(self, payload_update, deadline=None):
+        """ creates the enrollment, posts the recording and waits for it to complete; self.timeline records the
+        stages of the call
+        :param deadline: seconds the whole enrollment may take, every call gets the time left as its timeout
+        :raise DeadlineExceeded: when the enrollment did not complete within deadline
+        """
+        return _within(self, deadline, self._steps, payload_update)
 
-    def steps(self, payload_update):
+    def _steps(self, payload_update):
+        timeline = self.timeline = Timeline('enrollment', app_model_id=self.app_model_id, consumer_id=self.consumer_id)
+        with timeline.span('token') as span:
+            span.record(authorization_header(client=self.client))
 
         # step-1: put consumer_id, model_id then the self.enrollment_id will be set automatically upon successful create
-        enrollment_id = self.create()
-        print('step-1: create: put consumer_id, model_id: self.enrollment_id ' + str(self.enrollment_id))
-        if not enrollment_id:
+        with timeline.span('create') as span:
+            enrollment_id = span.record(self.create())
+        log.debug('step-1: created enrollment %s', self.enrollment_id)
+        if not enrollment_id or isinstance(enrollment_id, tuple):
+            timeline.finish(error=True)
             return None
+        timeline.root.set(enrollment_id=self.enrollment_id)
 
         # step-2: get consumer token, to be used instead of the admin token in the header
         # consumer_token = self.consumer.get_token()
-        # print('step-2: get consumer token: consumer_token: ' + str(consumer_token))
+        # log.debug('step-2: got consumer token %s', consumer_token)
 
         # step-3: get enrollment instructions
-        instructions = self.get(self.enrollment_id)
-        print('Follow these instructions to do proper Enrollment: ' + str(instructions))
-        if not instructions or type(instructions) == 'tuple':
+        with timeline.span('instructions') as span:
+            instructions = span.record(self.get(self.enrollment_id))
+        log.info('Follow these instructions to do proper Enrollment: %s', instructions)
+        if not instructions or isinstance(instructions, tuple):
+            timeline.finish(error=True)
             return None
 
         # step-4: record the .wav file - this should now be the part of the payload_update passed to this method
@@ -404,27 +415,23 @@ class Enrollment(object):
 
         # step-6: post the .wav file along with the intervals, complete enrollment
 
-        status_time_lapse = 0
-        status_timestamp = datetime.now()
-        enrollment_id = self.update(self.enrollment_id, payload_update=payload_update)
+        with timeline.span('update') as span:
+            enrollment_id = span.record(self.update(self.enrollment_id, payload_update=payload_update))
         # make sure to send the enrollment id only after the status is changed to completed,
         # limited by config param REATTEMPT_CALLS_FOR
-
-        try:
-            enroll_status = self.get(self.enrollment_id).get('status')
-            while unicode(enroll_status) not in [u'completed', u'failed']\
-                    and status_time_lapse < float(g.config['REATTEMPT_CALLS_FOR']):
-
-                time.sleep(0.01)
-                enroll_status = self.get(self.enrollment_id).get('status')
-                print('* enrollment status: ' + str(enroll_status))
-                status_time_lapse = (datetime.now() - status_timestamp).total_seconds()
-
-                if unicode(enroll_status) == u'failed':
-                    return None
-
-        except AttributeError as e:
-            print('Enrollment check status error {}'.format(e))
+        result, self.poll_metrics = self.client.poller.poll(
+            timeline.traced('poll', lambda: self.get(self.enrollment_id)),
+            is_done=work_order_done('status'),
+            operation='enrollment',
+            timeout=remaining(float(self.client.config['REATTEMPT_CALLS_FOR'])),
+            retry_hint=retry_after_hint)
+        log.info('enrollment status: %s', result.get('status') if isinstance(result, dict) else result)
+
+        status = outcome(result)
+        timeline.mark('result', status=status)
+        timeline.finish(error=status != u'completed', status=status)
+        if isinstance(result, dict) and result.get('status') == u'failed':
+            return None
 
         # returns the enrollment_id after the enrollment status becomes 'completed'
         return enrollment_id
@@ -434,33 +441,17 @@ class Enrollment(object):
         :param enrollment_id:
         :return: result of deletion
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_ENROLLMENTS'] + '/' + enrollment_id
-
-            response = requests.delete(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                if result.get('href'):
-                    self.enrollment_url = result.get('href')
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
+        result = _call(self.client, 'DELETE', 'URL_ENROLLMENTS', [enrollment_id])
+        if isinstance(result, dict) and result.get('href'):
+            self.enrollment_url = result.get('href')
         return result
 
 
 class Analysis(object):
 
-    def __init__(self, token, app_model_id, consumer_id, payload=None):
+    def __init__(self, token, app_model_id, consumer_id, payload=None, client=None):
         self.token = token
+        self.client = client if client else default_client()
         self.app_model_id = app_model_id
         self.consumer_id = consumer_id
         if payload:
@@ -470,6 +461,8 @@ class Analysis(object):
         self.task_name = None
         self.task_status = None
         self.intervals = []
+        self.poll_metrics = None
+        self.timeline = None    # Timeline of the last steps() call
 
     def set_payload(self, kwargs):
         """ setter method for attribute payload which validates and stores parameters for creating Analysis Endpoint
@@ -484,7 +477,7 @@ class Analysis(object):
                 error_text = 'Must provide all mandatory fields: ' + str(mandatory_fields)
                 raise ImproperArgumentsException(error_text)
         except ImproperArgumentsException as e:
-            print('Error while creating app model. ' + str(e))
+            log.error('Invalid payload: %s', e)
             return None
 
         self.payload = kwargs
@@ -494,96 +487,92 @@ class Analysis(object):
         """ starts the analysis process on the supplied .wav file, and returns the task_name (unique-id)
         """
         # could change this to use the consumer specific tokens in the future, with developer_id param
-        headers = authorization_header()
-
-        try:
-            endpoint_analysis_url = g.config['URL_ANALYSIS']
-            response = requests.post(endpoint_analysis_url, json=self.payload, headers=headers)
-            if response and response.status_code == 200:
-                result = json.loads(response.content)
-                self.task_name = result.get('taskName')
-                self.task_name = result.get('taskStatus')
-                return result
-            else:
-                return response.status_code, response.content
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_ANALYSIS', payload=getattr(self, 'payload', None))
+        if isinstance(result, dict):
+            self.task_name = result.get('taskName')
+            self.task_name = result.get('taskStatus')
+        return result
 
     @staticmethod
-    def check_status(task_name):
+    def check_status(task_name, client=None):
         """ returns the current status of an already started task
         """
         # could change this to use the consumer specific tokens in the future, with developer_id param
-        headers = authorization_header()
-
-        try:
-            # for endpointAnalysis-id-get, the trailing word 'url' needs to be removed
-            endpoint_analysis_url = re.sub(r'url$', str(task_name), g.config['URL_ANALYSIS'])
-            response = requests.get(endpoint_analysis_url, headers=headers)
+        client = client if client else default_client()
+        # for endpointAnalysis-id-get, the trailing word 'url' needs to be removed
+        return _call(client, 'GET', lambda config: re.sub(r'url$', str(task_name), config['URL_ANALYSIS']))
 
-            if response and response.content:
-                result = json.loads(response.content)
-                return result
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
-    def steps(self, intervals_with_phrases=False):
+    def steps(self, intervals_with_phrases=False, deadline=None):
         """ combines both start_task and the check_status methods, if the status is not complete it re-attempts for
         n number of seconds indicated by REATTEMPT_CALLS_FOR config option
         ideally should return the task_name in the result with a task_status as 'completed'
+        self.timeline records the stages of the call
+        :param deadline: seconds the whole analysis may take, every call gets the time left as its timeout
+        :raise DeadlineExceeded: when the analysis did not complete within deadline
         """
+        return _within(self, deadline, self._steps, intervals_with_phrases)
+
+    def _steps(self, intervals_with_phrases):
+        timeline = self.timeline = Timeline('analysis', app_model_id=self.app_model_id, consumer_id=self.consumer_id)
+        with timeline.span('token') as span:
+            span.record(authorization_header(client=self.client))
+
         result = None
-        status_timestamp = None
-        status_time_lapse = 0
         try:
-            result = self.start_task()
+            with timeline.span('create') as span:
+                result = span.record(self.start_task(), 'taskStatus')
             self.task_name = result.get('taskName')
             self.task_status = result.get('taskStatus')
-            status_timestamp = datetime.now()
         except Exception as e:
-            print('Analysis start task error:'.format(e))
+            log.error('Analysis start task error: %s', e)
 
-        try:
-            print('task_name: ' + str(self.task_name))
-            print('task_status: ' + str(self.task_status))
-            print('float(g.configREATTEMPT_CALLS_FOR: ' + str(float(g.config['REATTEMPT_CALLS_FOR'])))
-            print('status_time_lapse: ' + str(status_time_lapse))
-
-            while unicode(self.task_status) not in [u'completed', u'failed']\
-                    and status_time_lapse < float(g.config['REATTEMPT_CALLS_FOR']):
-
-                time.sleep(0.01)
-                result = self.check_status(self.task_name)
+        log.debug('task_name: %s', self.task_name)
+        if not self.task_name:
+            timeline.finish(error=True)
+            return None
+        timeline.root.set(task_name=self.task_name)
+
+        log.debug('task_status: %s', self.task_status)
+
+        if self.task_status not in FINAL_STATUSES:
+            result, self.poll_metrics = self.client.poller.poll(
+                timeline.traced('poll', lambda: self.check_status(self.task_name, client=self.client), 'taskStatus'),
+                is_done=work_order_done('taskStatus'),
+                operation='analysis',
+                timeout=remaining(float(self.client.config['REATTEMPT_CALLS_FOR'])),
+                retry_hint=retry_after_hint)
+            if isinstance(result, dict):
                 self.task_status = result.get('taskStatus')
-                print('task_status: ' + str(self.task_status))
-                status_time_lapse = (datetime.now() - status_timestamp).total_seconds()
+            log.debug('task_status: %s', self.task_status)
 
-                if unicode(self.task_status) == u'failed':
-                    return None
+        timeline.mark('result', status=self.task_status)
+        if self.task_status == u'failed':
+            timeline.finish(error=True, status=self.task_status)
+            return None
 
+        try:
+            # set the member intervals to resulted intervals from end-point analysis
+            self.intervals = result.get('intervals')
         except AttributeError as e:
-            print('Analysis check status error {}'.format(e))
+            log.error('Analysis check status error: %s', e)
+            timeline.finish(error=True, status=self.task_status)
+            return None
 
-        # set the member intervals to resulted intervals from end-point analysis
-        self.intervals = result.get('intervals')
-        print('Intervals: ' + str(self.intervals))
+        log.debug('Intervals: %s', self.intervals)
         if intervals_with_phrases:
-            return self.intervals_with_phrases()
+            with timeline.span('phrases') as span:
+                result = span.record(self.intervals_with_phrases())
+            timeline.finish(error=result is None, status=self.task_status)
+            return result
 
+        timeline.finish(error=self.task_status != u'completed', status=self.task_status)
         return result
 
     def intervals_with_phrases(self):
 
         try:
-            tg = TokenGetter()
-            # a read only object of app model
-            am = AppModel(tg.get_token())
-            result = am.get(self.app_model_id)
+            # app models hardly ever change, read through the cache
+            result = AppModel.get_cached(self.app_model_id, client=self.client)
             repetitions = result.get('enrollmentRepeats')
             vocabulary = result.get('vocabulary')
 
@@ -591,15 +580,16 @@ class Analysis(object):
             return h.merge_intervals_with_phrases(vocabulary, repetitions, self.intervals)
 
         except Exception as e:
-            print("Could not generate intervals with phrases. " + str(e))
+            log.error('Could not generate intervals with phrases: %s', e)
 
         return None
 
 
 class Consumer(object):
 
-    def __init__(self, token, payload=None):
+    def __init__(self, token, payload=None, client=None):
         self.token = token
+        self.client = client if client else default_client()
         if payload:
             # read-only objects do not need to set the payload
             self.payload = self.set_payload(payload)
@@ -624,7 +614,7 @@ class Consumer(object):
                 error_text = 'Must provide all mandatory fields: ' + str(mandatory_fields)
                 raise ImproperArgumentsException(error_text)
         except ImproperArgumentsException as e:
-            print('Error while creating app model. ' + str(e))
+            log.error('Invalid payload: %s', e)
             return None
 
         self.payload = kwargs
@@ -642,26 +632,16 @@ class Consumer(object):
         consumer_id: an existing consumer_id
         :return: href for the created or updated consumer
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_CONSUMERS']
-
-            if not self.payload:
-                print('This seems to be a read-only object of Consumer, set the proper payload to create app model')
-                return None
-
-            response = requests.post(url, json=self.payload, headers=headers)
-            if response.status_code == 201:
-                self.consumer_url = json.loads(response.content).get('href')
-                return self.consumer_id
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
+        if not getattr(self, 'payload', None):
+            log.error('This seems to be a read-only object of Consumer, set the proper payload to create consumer')
             return None
 
+        result = _call(self.client, 'POST', 'URL_CONSUMERS', expect=201, payload=self.payload)
+        if not isinstance(result, dict):
+            return result
+        self.consumer_url = result.get('href')
+        return self.consumer_id
+
     def update(self, consumer_id, payload_override=None):
         """
         update the app model's password field. Note: username and the gender are non editable fields
@@ -672,109 +652,76 @@ class Consumer(object):
         consumer_id: an existing consumer_id
         :return: href for the created or updated consumer
         """
-        headers = authorization_header()
-        try:
-            url = g.config['URL_CONSUMERS'] + '/' + consumer_id
+        if payload_override:
+            self.payload = payload_override
 
-            if payload_override:
-                self.payload = payload_override
-
-            response = requests.post(url, json=self.payload, headers=headers)
-            if response.status_code == 202:
-                self.consumer_url = json.loads(response.content).get('href')
-                return self.consumer_id
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_CONSUMERS', [consumer_id], expect=202,
+                       payload=getattr(self, 'payload', None))
+        if not isinstance(result, dict):
+            return result
+        self.consumer_url = result.get('href')
+        return self.consumer_id
 
     def get(self, consumer_id):
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_CONSUMERS'] + '/' + consumer_id
-
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                if result.get('href'):
-                    self.consumer_url = result.get('href')
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
+        result = _call(self.client, 'GET', 'URL_CONSUMERS', [consumer_id])
+        if isinstance(result, dict) and result.get('href'):
+            self.consumer_url = result.get('href')
         return result
 
     @staticmethod
-    def get_all(limit=10, offset=0):
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_CONSUMERS'] + '?limit=' + str(limit) + '&offset=' + str(offset)
+    def get_all(limit=10, offset=0, client=None):
+        client = client if client else default_client()
+        return _call(client, 'GET', 'URL_CONSUMERS', query='?limit=' + str(limit) + '&offset=' + str(offset))
 
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                return result
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
-    def get_token(self):
-        """ returns consumer specific token based on the given user
+    @staticmethod
+    def iter_all(page_size=None, offset=0, prefetch=True, client=None):
+        """ lazily iterates over all the consumers, fetching the next page in the background while the current
+        one is consumed
+        :param page_size: items per request, defaults to the PAGE_SIZE config option
         """
-        headers = authorization_header()
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return iter_items(partial(Consumer.get_all, client=client), page_size=page_size, offset=offset,
+                          prefetch=prefetch)
 
-        try:
-            url = g.config['URL_CONSUMERS'] + '/token'
-
-            response = requests.post(url, json=self.payload, headers=headers)
-            self.consumer_token = json.loads(response.content).get('token')
+    @staticmethod
+    def scan_all(page_size=None, workers=DEFAULT_SCAN_WORKERS, ordered=True, client=None):
+        """ iterates over all the consumers, fetching the pages on concurrent workers; meant for full account scans
+        :param ordered: False to yield the pages as they arrive instead of in listing order
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return scan(partial(Consumer.get_all, client=client), page_size=page_size, workers=workers, ordered=ordered)
+
+    def get_token(self, refresh=False):
+        """ returns consumer specific token based on the given user; tokens are cached per consumer (username and
+        password) for CONSUMER_TOKEN_EXPIRES seconds, concurrent calls for the same consumer share one request
+        :param refresh: fetch a new token even if one is cached, e.g. after the API rejected it
+        """
+        payload = self.payload if getattr(self, 'payload', None) else {}
+        if not payload.get('username') or not payload.get('password'):
+            self.consumer_token = self._fetch_token()
             return self.consumer_token
 
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        cache = self.client.consumer_tokens
+        key = (payload['username'], hashlib.sha256(payload['password'].encode('utf-8')).hexdigest())
+        if refresh:
+            cache.delete(key)
+        self.consumer_token = cache.get_or_create(key, self._fetch_token)
+        return self.consumer_token
+
+    def _fetch_token(self):
+        result = _call(self.client, 'POST', 'URL_CONSUMERS', ['token'], payload=getattr(self, 'payload', None))
+        return result.get('token') if isinstance(result, dict) else None
 
     def delete(self, consumer_id):
         """ delete consumer with given id
         :param consumer_id:
         :return: result of deletion
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_CONSUMERS'] + '/' + consumer_id
-
-            response = requests.delete(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                if result.get('href'):
-                    self.consumer_url = result.get('href')
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
+        result = _call(self.client, 'DELETE', 'URL_CONSUMERS', [consumer_id])
+        if isinstance(result, dict) and result.get('href'):
+            self.consumer_url = result.get('href')
         return result
 
 
@@ -783,8 +730,9 @@ class AppModel(object):
     Endpoint: https://api.knurld.io/v1/app-models
     """
 
-    def __init__(self, token, payload=None):
+    def __init__(self, token, payload=None, client=None):
         self.token = token
+        self.client = client if client else default_client()
         if payload:
             # read-only objects do not need to set the payload
             self.payload = self.set_payload(payload)
@@ -807,7 +755,7 @@ class AppModel(object):
                 error_text = 'Must provide all mandatory fields: ' + str(mandatory_fields)
                 raise ImproperArgumentsException(error_text)
         except ImproperArgumentsException as e:
-            print('Error while creating app model. ' + str(e))
+            log.error('Invalid payload: %s', e)
             return None
 
         self.payload = kwargs
@@ -816,136 +764,130 @@ class AppModel(object):
     def create(self):
         """ create an app model using this method. Uses the payload dictionary set during object initialization
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_APP_MODELS']
-
-            if not self.payload:
-                print('This seems to be a read-only object of AppModel, set the proper payload to create app model')
-                return None
-
-            response = requests.post(url, json=self.payload, headers=headers)
-            if response.status_code == 201:
-                self.app_model_url = json.loads(response.content).get('href')
-                return self.app_model_id
-            else:
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
+        if not getattr(self, 'payload', None):
+            log.error('This seems to be a read-only object of AppModel, set the proper payload to create app model')
             return None
 
+        result = _call(self.client, 'POST', 'URL_APP_MODELS', expect=201, payload=self.payload)
+        if not isinstance(result, dict):
+            return result
+        self.app_model_url = result.get('href')
+        return self.app_model_id
+
     def update(self, app_model_id, payload_override=None):
         """ update an app model using this method. Uses the payload dictionary set during object initialization
         :param app_model_id: existing app model id
         :param payload_override: a complete new payload developer might want to set
         """
-        headers = authorization_header()
+        if payload_override:
+            self.payload = payload_override
 
-        try:
-            url = g.config['URL_APP_MODELS'] + '/' + app_model_id
-            if payload_override:
-                self.payload = payload_override
-
-            response = requests.post(url, json=self.payload, headers=headers)
-            if response.status_code == 202:
-                self.app_model_url = json.loads(response.content).get('href')
-                return self.app_model_id
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+        result = _call(self.client, 'POST', 'URL_APP_MODELS', [app_model_id], expect=202,
+                       payload=getattr(self, 'payload', None))
+        self.client.app_models.delete(app_model_id)
+        if not isinstance(result, dict):
+            return result
+        self.app_model_url = result.get('href')
+        return self.app_model_id
 
     def get(self, app_model_id):
         """ get an app model associated with a particular app_model_id.
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_APP_MODELS'] + '/' + app_model_id
-
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                if result.get('href'):
-                    self.app_model_url = result.get('href')
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
+        result = _call(self.client, 'GET', 'URL_APP_MODELS', [app_model_id])
+        if isinstance(result, dict):
+            if result.get('href'):
+                self.app_model_url = result.get('href')
+            self.client.app_models.set(app_model_id, result)
         return result
 
     @staticmethod
-    def get_all(limit=10, offset=0):
+    def get_all(limit=10, offset=0, client=None):
         """ get a range of available app models
-        TODO: provide pagination using offsets
+        use iter_all() to walk every page
         """
-        headers = authorization_header()
+        client = client if client else default_client()
+        return _call(client, 'GET', 'URL_APP_MODELS', query='?limit=' + str(limit) + '&offset=' + str(offset))
 
-        try:
-            url = g.config['URL_APP_MODELS'] + '?limit=' + str(limit) + '&offset=' + str(offset)
+    @staticmethod
+    def get_cached(app_model_id, client=None):
+        """ returns the app model from the cache of the client, fetching it on a miss (concurrent misses share one
+        request); records are kept for APP_MODEL_CACHE_TTL seconds and dropped by update() and delete()
+        """
+        client = client if client else default_client()
+        return client.app_models.get_or_create(app_model_id, lambda: AppModel(None, client=client).get(app_model_id),
+                                               should_cache=lambda result: isinstance(result, dict))
 
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-            else:
-                return response.status_code, response.content
+    @staticmethod
+    def prewarm(app_model_ids=None, client=None):
+        """ fills the app model cache at startup, so that the first analyses do not wait for their app model
+        :param app_model_ids: the app models to load, by default every app model of the account
+        :return: number of app models cached
+        """
+        client = client if client else default_client()
+        cache = client.app_models
+        if app_model_ids is None:
+            count = 0
+            for item in AppModel.iter_all(client=client):
+                if item.get('href'):
+                    cache.set(h.parse_id_from_href(item['href']), item)
+                    count += 1
+            return count
+
+        return len([i for i in app_model_ids if isinstance(AppModel.get_cached(i, client=client), dict)])
 
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
+    @staticmethod
+    def iter_all(page_size=None, offset=0, prefetch=True, client=None):
+        """ lazily iterates over all the app models, fetching the next page in the background while the current
+        one is consumed
+        :param page_size: items per request, defaults to the PAGE_SIZE config option
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return iter_items(partial(AppModel.get_all, client=client), page_size=page_size, offset=offset,
+                          prefetch=prefetch)
 
-        return result
+    @staticmethod
+    def scan_all(page_size=None, workers=DEFAULT_SCAN_WORKERS, ordered=True, client=None):
+        """ iterates over all the app models, fetching the pages on concurrent workers; meant for full account scans
+        :param ordered: False to yield the pages as they arrive instead of in listing order
+        """
+        client = client if client else default_client()
+        page_size = page_size_from_config(page_size, client.config)
+        return scan(partial(AppModel.get_all, client=client), page_size=page_size, workers=workers, ordered=ordered)
 
     def delete(self, app_model_id):
         """ delete app model with given id
         :param app_model_id:
         :return:
         """
-        headers = authorization_header()
-
-        try:
-            url = g.config['URL_APP_MODELS'] + '/' + app_model_id
-
-            response = requests.delete(url, headers=headers)
-            if response.status_code == 200:
-                result = json.loads(response.content)
-                if result.get('href'):
-                    self.app_model_url = result.get('href')
-            else:
-                # TODO: log errors
-                print(response.status_code)
-                print(response.content)
-                return response.status_code, response.content
-
-        except Exception as e:
-            print('Could not perform the operation: ' + str(e))
-            return None
-
+        result = _call(self.client, 'DELETE', 'URL_APP_MODELS', [app_model_id])
+        self.client.app_models.delete(app_model_id)
+        if isinstance(result, dict) and result.get('href'):
+            self.app_model_url = result.get('href')
         return result
 
 
 class TokenGetter(object):
     """
-    Makes sure you always get a valid token. Validates the current available token and renews it if it has expired
+    Makes sure you always get a valid token. Validates the current available token and renews it if it has expired.
+    All the TokenGetter objects of a client share its TokenManager, unless created with their own expires duration
     """
 
-    def __init__(self, token=None, expires=None):
+    def __init__(self, token=None, expires=None, client=None):
+        client = client if client else default_client()
+        self._manager = TokenManager(config=client.config, expires=expires) if expires else client.token_manager
         self._token = token
         self._token_timestamp = datetime.now()
-        self._token_expires = expires if expires else g.config['TOKEN_EXPIRES']
+        self._token_expires = expires if expires else client.config['TOKEN_EXPIRES']
+
+    def _sync(self):
+        """ mirrors the token and the time it was actually issued at from the manager
+        """
+        access = self._manager.current
+        if access is not None:
+            self._token = access.token
+            self._token_timestamp = datetime.fromtimestamp(access.issued_at)
+            self._token_expires = access.expires_in
 
     def _is_valid_token(self, token):
         """
@@ -953,39 +895,36 @@ class TokenGetter(object):
         """
         try:
             time_lapse = (datetime.now() - self._token_timestamp).total_seconds()
-            # print('time_lapse: ' + str(time_lapse))
             if time_lapse < self._token_expires:
                 return True
             else:
-                # print("Invalid token {} with timestamp {}".format(token, self._token_timestamp))
                 return False
         except ValueError as e:
-            print("Invalid token {} Details: {}".format(token, e))
+            log.warning('Invalid token, details: %s', e)
 
         return False
 
     def renew_access_token(self):
+        """ fetches a new token, replacing the current one for every user of the manager
+        """
+        self._manager.force_renew()
+        self._sync()
+        return self._token
 
-        headers = {'Content-Type': 'application/x-www-form-urlencoded',
-                   'Host': g.config['URL_HOST']
-                   }
-
-        payload = {'client_id': g.config['CLIENT_ID'],
-                   'client_secret': g.config['CLIENT_SECRET']
-                   }
-
-        response = requests.post(g.config['URL_ACCESS_TOKEN'], data=payload, headers=headers)
-        self._token = json.loads(response.content).get('access_token')
-        self._token_timestamp = datetime.now()
+    def start_background_refresh(self, margin=None):
+        """ keeps renewing the token in the background margin seconds (TOKEN_REFRESH_MARGIN by default) before it
+        expires, so that requests never wait for a renewal; enabled for every getter at once with the
+        TOKEN_BACKGROUND_REFRESH config option
+        """
+        self._manager.start_background_refresh(margin)
 
-        return self._token
+    def stop_background_refresh(self):
+        self._manager.stop_background_refresh()
 
     def get_token(self):
         """
-        caching the already fetched token for duration configed in TOKEN_EXPIRES before the token could be renewed again
+        returns the token cached by the manager while it is valid (for at most TOKEN_EXPIRES), renews it otherwise
         """
-        # check the cached version of the token first
-        self._token = g.region.get_or_create("this_hour_token", creator=self.renew_access_token,
-                                             expiration_time=self._token_expires,
-                                             should_cache_fn=self._is_valid_token)
+        self._manager.get_token()
+        self._sync()
         return self._token
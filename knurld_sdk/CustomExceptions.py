@@ -9,6 +9,44 @@
 class ImproperArgumentsException(Exception):
 
     def __init__(self, error_text=None):
-        error = Exception.__init__(self, error_text)
-        print(error)
+        Exception.__init__(self, error_text)
 
+
+class PollTimeoutException(Exception):
+    """ raised when a work order does not reach a final status within its polling time budget
+    """
+
+    def __init__(self, error_text=None):
+        Exception.__init__(self, error_text)
+
+
+class PageFetchException(Exception):
+    """ raised by the paginating iterators when a page of a listing could not be fetched
+    """
+
+    def __init__(self, error_text=None):
+        Exception.__init__(self, error_text)
+
+
+class TokenRenewalException(Exception):
+    """ raised when the oauth endpoint does not return an access token
+    """
+
+    def __init__(self, error_text=None):
+        Exception.__init__(self, error_text)
+
+
+class InvalidConfigurationException(Exception):
+    """ raised when config.cfg cannot be parsed or misses mandatory fields
+    """
+
+    def __init__(self, error_text=None):
+        Exception.__init__(self, error_text)
+
+
+class DeadlineExceeded(Exception):
+    """ raised when a call or a flow runs out of the time budget it was given
+    """
+
+    def __init__(self, error_text=None):
+        Exception.__init__(self, error_text)
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+from knurld_sdk.aio.client import AsyncClient, AsyncTokenGetter
+from knurld_sdk.aio.resources import AsyncAppModel, AsyncConsumer, AsyncEnrollment, AsyncAnalysis, \
+    AsyncVerification
+
+__all__ = ["AsyncClient", "AsyncTokenGetter", "AsyncAppModel", "AsyncConsumer", "AsyncEnrollment",
+           "AsyncAnalysis", "AsyncVerification"]
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+
+import aiohttp
+
+from knurld_sdk import helpers as h
+from knurld_sdk import metrics
+from knurld_sdk.polling import Poller, clock
+from knurld_sdk.tokens import TokenManager, parse_access_token
+
+log = logging.getLogger(__name__)
+
+# defaults used when the corresponding HTTP_* options are missing from the configuration
+DEFAULT_POOL_SIZE = 100         # total number of connections shared by every coroutine of the client
+DEFAULT_POOL_SIZE_PER_HOST = 0  # 0 means no per host limit other than DEFAULT_POOL_SIZE
+DEFAULT_CONNECT_TIMEOUT = 3.05  # seconds
+DEFAULT_READ_TIMEOUT = 30       # seconds
+
+# last Retry-After hint received by the current task, see retry_after_hint()
+_retry_after = contextvars.ContextVar('knurld_retry_after', default=None)
+
+
+def retry_after_hint():
+    """ coroutine counterpart of knurld_sdk.session.retry_after_hint: the delay (seconds) the server asked for in the
+    last response received by the current task, None if it did not send a Retry-After header
+    """
+    return _retry_after.get()
+
+
+class AsyncTokenGetter(object):
+    """
+    Coroutine counterpart of APIManager.TokenGetter. The token is held by a knurld_sdk.tokens.TokenManager, in the
+    token store of TOKEN_CACHE_BACKEND, so it is shared with the other clients and processes using that store. One
+    instance is shared by all the resources of an AsyncClient, so concurrent coroutines wait on a single renewal
+    instead of each fetching their own token
+    """
+
+    def __init__(self, client, expires=None, token_manager=None):
+        """
+        :param token_manager: the TokenManager holding the token, by default one fetching it through the client
+        """
+        self._client = client
+        self.token_manager = token_manager if token_manager is not None else TokenManager(
+            config=client.config, fetch=self._fetch, expires=expires)
+        self._loop = None
+        self._lock = None
+
+    async def request_access_token(self):
+        """ fetches a new admin token from the oauth endpoint through the client's connection pool
+        """
+        config = self._client.config
+        headers = {'Content-Type': 'application/x-www-form-urlencoded',
+                   'Host': config['URL_HOST']
+                   }
+
+        payload = {'client_id': config['CLIENT_ID'],
+                   'client_secret': config['CLIENT_SECRET']
+                   }
+
+        issued_at = time.time()
+        status, content = await self._client.request('POST', config['URL_ACCESS_TOKEN'], data=payload,
+                                                     headers=headers)
+        return parse_access_token(config, status, content, issued_at)
+
+    def _fetch(self, config):
+        # called by the manager on an executor thread while the event loop waits in _renew()
+        return asyncio.run_coroutine_threadsafe(self.request_access_token(), self._loop).result()
+
+    async def _renew(self, stale):
+        # created lazily so that the lock binds to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            current = self.token_manager.current
+            if current is not None and current is not stale and current.is_valid():
+                return current
+            # the manager may wait on the renewal lock of a store shared with other processes, which must not block
+            # the event loop
+            self._loop = asyncio.get_running_loop()
+            return await self._loop.run_in_executor(None, self.token_manager.renew, stale)
+
+    async def renew_access_token(self):
+        """ replaces the current token with a new one
+        """
+        access = await self._renew(self.token_manager.current)
+        return access.token
+
+    async def get_token(self):
+        """
+        returns the cached token while it is valid, otherwise renews it exactly once for all the waiting coroutines
+        """
+        current = self.token_manager.current
+        if current is not None and current.is_valid():
+            return current.token
+
+        access = await self._renew(current)
+        return access.token
+
+
+class AsyncClient(object):
+    """
+    Owns the aiohttp connection pool and the token cache used by the Async* resource classes. Create one per process
+    (or per event loop) and pass it to every resource, e.g.
+
+        async with AsyncClient() as client:
+            enrollment = AsyncEnrollment(client, app_model_id=..., consumer_id=...)
+            enrollment_id = await enrollment.steps(payload_update=p)
+    """
+
+    def __init__(self, config=None, pool_size=None, pool_size_per_host=None, timeout=None, poller=None,
+                 token_manager=None):
+        """
+        :param config: configuration mapping; defaults to the one loaded from config.cfg
+        :param pool_size: total number of simultaneous connections, defaults to HTTP_ASYNC_POOL_SIZE
+        :param pool_size_per_host: number of simultaneous connections to a single host, 0 for no limit
+        :param timeout: (connect, read) timeout in seconds
+        :param poller: knurld_sdk.polling.Poller scheduling the status polls of the multi-step flows
+        :param token_manager: knurld_sdk.tokens.TokenManager holding the admin token, see AsyncTokenGetter
+        """
+        if config is None:
+            from knurld_sdk import app_globals as g
+            config = g.config
+
+        self.config = config
+        self.pool_size = int(pool_size if pool_size is not None
+                             else config.get('HTTP_ASYNC_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.pool_size_per_host = int(pool_size_per_host if pool_size_per_host is not None
+                                      else config.get('HTTP_POOL_SIZE_PER_HOST', DEFAULT_POOL_SIZE_PER_HOST))
+        self.timeout = timeout if timeout else (float(config.get('HTTP_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+                                                float(config.get('HTTP_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)))
+        self.token_getter = AsyncTokenGetter(self, token_manager=token_manager)
+        self.poller = poller if poller is not None else Poller.from_config(config)
+        self._session = None
+
+    @property
+    def session(self):
+        """ the aiohttp.ClientSession shared by every request of this client, created on first use
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size_per_host)
+            timeout = aiohttp.ClientTimeout(connect=self.timeout[0], sock_read=self.timeout[1])
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def request(self, method, url, headers=None, json=None, data=None):
+        """ performs the request on the shared connection pool and returns (status_code, content); the Retry-After
+        hint of the response is kept for retry_after_hint()
+        """
+        start = clock()
+        status = 'error'
+        try:
+            async with self.session.request(method, url, headers=headers, json=json, data=data) as response:
+                content = await response.read()
+                status = response.status
+                _retry_after.set(h.parse_retry_after(response.headers.get('Retry-After')))
+                return response.status, content
+        finally:
+            metrics.record_request(method, url, status, clock() - start)
+
+    async def authorization_header(self, token=None, content_type='application/json', developer_id=None):
+
+        try:
+            token = token if token else await self.token_getter.get_token()
+
+            headers = {
+                'Content-Type': content_type,
+                'Authorization': 'Bearer ' + str(token),
+                'Developer-Id': self.config['DEVELOPER_ID']
+            }
+            # for a consumer the consumer token replaces the Developer-Id
+            if developer_id:
+                headers['Developer-Id'] = developer_id
+
+            return headers
+
+        except Exception as e:
+            log.error('Could not obtain Authorization header: %s', e)
+            return None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
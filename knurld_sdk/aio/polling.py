@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import asyncio
+
+from knurld_sdk.polling import PollMetrics, clock
+
+
+async def poll(poller, fetch, is_done, operation='default', timeout=None, retry_hint=None):
+    """ coroutine counterpart of knurld_sdk.polling.Poller.poll: awaits fetch() on the schedule of poller.delays()
+    until is_done(result) or until timeout seconds have passed
+    :param retry_hint: callable returning the delay (seconds) asked by the server for the last call, or None
+    :return: (last result, PollMetrics)
+    """
+    metrics = PollMetrics(operation)
+    schedule = poller.delays(metrics, is_done, timeout, retry_hint)
+
+    result = None
+    delay = next(schedule)
+    while delay is not None:
+        await asyncio.sleep(delay)
+        call_start = clock()
+        result = await fetch()
+        delay = schedule.send((result, clock() - call_start))
+    return result, metrics
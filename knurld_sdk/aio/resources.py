@@ -0,0 +1,659 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import json
+import logging
+import re
+
+from knurld_sdk import helpers as h
+from knurld_sdk.aio.client import retry_after_hint
+from knurld_sdk.aio.polling import poll
+from knurld_sdk.polling import FINAL_STATUSES, work_order_done
+from knurld_sdk.timeline import Timeline, outcome
+from knurld_sdk.CustomExceptions import ImproperArgumentsException
+
+log = logging.getLogger(__name__)
+
+
+def _validated_payload(kwargs, mandatory_fields, resource_name):
+    """ returns kwargs if all the mandatory fields are present, None otherwise
+    """
+    all_mandatory_fields_present = all([x in kwargs.keys() for x in mandatory_fields])
+
+    try:
+        if not all_mandatory_fields_present:
+            error_text = 'Must provide all mandatory fields: ' + str(mandatory_fields)
+            raise ImproperArgumentsException(error_text)
+    except ImproperArgumentsException as e:
+        log.error('Error while creating %s: %s', resource_name, e)
+        return None
+
+    return kwargs
+
+
+def _traced(timeline, name, fetch, status_key='status'):
+    """ coroutine counterpart of Timeline.traced: records each await of fetch() as a numbered stage
+    """
+    attempts = [0]
+
+    async def _fetch():
+        attempts[0] += 1
+        with timeline.span(name, attempt=attempts[0]) as span:
+            return span.record(await fetch(), status_key)
+
+    return _fetch
+
+
+class _AsyncResource(object):
+    """ common plumbing of the Async* resource classes: every call goes through the client's pool and token cache
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _call(self, method, url, payload=None):
+        """ returns (status_code, content) of the request, with the admin authorization header
+        """
+        headers = await self.client.authorization_header()
+        return await self.client.request(method, url, headers=headers, json=payload)
+
+    async def _get_all(self, url_key, limit, offset):
+        try:
+            url = self.client.config[url_key] + '?limit=' + str(limit) + '&offset=' + str(offset)
+
+            status, content = await self._call('GET', url)
+            if status == 200:
+                return json.loads(content)
+            else:
+                return status, content
+
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+
+class AsyncVerification(_AsyncResource):
+
+    # can leave app_model_id & consumer_id blank, for readonly objects
+    def __init__(self, client, app_model_id='', consumer_id=''):
+        super(AsyncVerification, self).__init__(client)
+        self.app_model_id = app_model_id
+        self.consumer_id = consumer_id
+        self.verification_url = None
+        self.poll_metrics = None
+        self.timeline = None    # Timeline of the last steps() call
+
+    @property
+    def verification_id(self):
+        return h.parse_id_from_href(self.verification_url)
+
+    @property
+    def payload(self):
+        p = {
+            "consumer": self.consumer_id,
+            "application": self.app_model_id
+        }
+        return p
+
+    async def create(self):
+        """ create or register the verification work order
+        """
+        try:
+            status, content = await self._call('POST', self.client.config['URL_VERIFICATIONS'], self.payload)
+            if status == 201:
+                self.verification_url = json.loads(content).get('href')
+                return self.verification_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def update(self, verification_id, payload_update):
+        """ update existing verification work order with a payload containing wav_file and/or intervals
+        """
+        try:
+            url = self.client.config['URL_VERIFICATIONS'] + '/' + verification_id
+            status, content = await self._call('POST', url, payload_update)
+            if status == 202:
+                self.verification_url = json.loads(content).get('href')
+                return self.verification_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get(self, verification_id):
+        """ get verification for the given verification id
+        """
+        try:
+            url = self.client.config['URL_VERIFICATIONS'] + '/' + verification_id
+            status, content = await self._call('GET', url)
+            if status == 200:
+                result = json.loads(content)
+                self.verification_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get_all(self, limit=10, offset=0):
+        """ return all the verifications for given offset, start, end
+        """
+        return await self._get_all('URL_VERIFICATIONS', limit, offset)
+
+    async def step_one(self):
+        """ create verification and get instructions; self.timeline records the stages of step_one and step_two
+        """
+        timeline = self.timeline = Timeline('verification', app_model_id=self.app_model_id,
+                                            consumer_id=self.consumer_id)
+        with timeline.span('token') as span:
+            span.record(await self.client.authorization_header())
+
+        with timeline.span('create') as span:
+            verification_id = span.record(await self.create())
+        if not verification_id or isinstance(verification_id, tuple):
+            timeline.finish(error=True)
+            return None
+        timeline.root.set(verification_id=self.verification_id)
+
+        with timeline.span('instructions') as span:
+            instructions = span.record(await self.get(self.verification_id))
+        if not instructions or isinstance(instructions, tuple):
+            timeline.finish(error=True)
+            return None
+
+        return instructions.get('instructions')
+
+    async def step_two(self, payload_update):
+        """ using the instructions from step one developer must create the appropriate payload and pass it to step_two
+        """
+        timeline = self.timeline
+        if timeline is None or timeline.root.attributes.get('verification_id') != self.verification_id:
+            timeline = self.timeline = Timeline('verification', verification_id=self.verification_id)
+
+        with timeline.span('update') as span:
+            span.record(await self.update(self.verification_id, payload_update=payload_update))
+
+        verify_result, self.poll_metrics = await poll(self.client.poller,
+                                                      _traced(timeline, 'poll', lambda: self.get(self.verification_id)),
+                                                      is_done=work_order_done('status'),
+                                                      operation='verification',
+                                                      timeout=float(self.client.config['REATTEMPT_CALLS_FOR']),
+                                                      retry_hint=retry_after_hint)
+        status = outcome(verify_result)
+        timeline.mark('result', status=status)
+        timeline.finish(error=status != u'completed', status=status)
+        return verify_result
+
+    async def delete(self, verification_id):
+        """ delete verification with given id
+        """
+        try:
+            url = self.client.config['URL_VERIFICATIONS'] + '/' + verification_id
+            status, content = await self._call('DELETE', url)
+            if status == 200:
+                result = json.loads(content)
+                if result.get('href'):
+                    self.verification_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+
+class AsyncEnrollment(_AsyncResource):
+
+    # can leave app_model_id & consumer_id blank, for readonly objects
+    def __init__(self, client, app_model_id='', consumer_id=''):
+        super(AsyncEnrollment, self).__init__(client)
+        self.app_model_id = app_model_id
+        self.consumer_id = consumer_id
+        self.enrollment_url = None
+        self.poll_metrics = None
+        self.timeline = None    # Timeline of the last steps() call
+
+    @property
+    def enrollment_id(self):
+        return h.parse_id_from_href(self.enrollment_url)
+
+    @property
+    def payload(self):
+        p = {
+            "application": self.app_model_id,
+            "consumer": self.consumer_id
+        }
+        return p
+
+    async def create(self):
+        """ create the enrollment using an app-model and consumer
+        """
+        try:
+            status, content = await self._call('POST', self.client.config['URL_ENROLLMENTS'], self.payload)
+            if status == 201:
+                self.enrollment_url = json.loads(content).get('href')
+                return self.enrollment_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def update(self, enrollment_id, payload_update):
+        """ update existing enrollment work order with a payload containing wav_file and/or intervals
+        """
+        try:
+            url = self.client.config['URL_ENROLLMENTS'] + '/' + enrollment_id
+            status, content = await self._call('POST', url, payload_update)
+            if status == 202:
+                self.enrollment_url = json.loads(content).get('href')
+                return self.enrollment_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get(self, enrollment_id):
+        """ get enrollment for the given enrollment id
+        """
+        try:
+            url = self.client.config['URL_ENROLLMENTS'] + '/' + enrollment_id
+            status, content = await self._call('GET', url)
+            if status == 200:
+                result = json.loads(content)
+                self.enrollment_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get_all(self, limit=10, offset=0):
+        """ return all the enrollments for given offset, start, end
+        """
+        return await self._get_all('URL_ENROLLMENTS', limit, offset)
+
+    async def steps(self, payload_update):
+        """ create the enrollment, fetch its instructions, post the recording and wait for it to complete;
+        returns the enrollment id once its status is 'completed'; self.timeline records the stages of the call
+        """
+        timeline = self.timeline = Timeline('enrollment', app_model_id=self.app_model_id, consumer_id=self.consumer_id)
+        with timeline.span('token') as span:
+            span.record(await self.client.authorization_header())
+
+        with timeline.span('create') as span:
+            enrollment_id = span.record(await self.create())
+        if not enrollment_id or isinstance(enrollment_id, tuple):
+            timeline.finish(error=True)
+            return None
+        timeline.root.set(enrollment_id=self.enrollment_id)
+
+        with timeline.span('instructions') as span:
+            instructions = span.record(await self.get(self.enrollment_id))
+        if not instructions or isinstance(instructions, tuple):
+            timeline.finish(error=True)
+            return None
+
+        with timeline.span('update') as span:
+            enrollment_id = span.record(await self.update(self.enrollment_id, payload_update=payload_update))
+
+        result, self.poll_metrics = await poll(self.client.poller,
+                                               _traced(timeline, 'poll', lambda: self.get(self.enrollment_id)),
+                                               is_done=work_order_done('status'),
+                                               operation='enrollment',
+                                               timeout=float(self.client.config['REATTEMPT_CALLS_FOR']),
+                                               retry_hint=retry_after_hint)
+        status = outcome(result)
+        timeline.mark('result', status=status)
+        timeline.finish(error=status != u'completed', status=status)
+        if isinstance(result, dict) and result.get('status') == u'failed':
+            return None
+
+        return enrollment_id
+
+    async def delete(self, enrollment_id):
+        """ delete enrollment with given id
+        """
+        try:
+            url = self.client.config['URL_ENROLLMENTS'] + '/' + enrollment_id
+            status, content = await self._call('DELETE', url)
+            if status == 200:
+                result = json.loads(content)
+                if result.get('href'):
+                    self.enrollment_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+
+class AsyncAnalysis(_AsyncResource):
+
+    def __init__(self, client, app_model_id, consumer_id, payload=None):
+        super(AsyncAnalysis, self).__init__(client)
+        self.app_model_id = app_model_id
+        self.consumer_id = consumer_id
+        self.payload = None
+        if payload:
+            # read-only objects do not need to set the payload
+            self.payload = self.set_payload(payload)
+        self.task_name = None
+        self.task_status = None
+        self.intervals = []
+        self.poll_metrics = None
+        self.timeline = None    # Timeline of the last steps() call
+
+    def set_payload(self, kwargs):
+        """ setter method for attribute payload which validates and stores parameters for creating Analysis Endpoint
+        """
+        self.payload = _validated_payload(kwargs, ['audioUrl'], 'analysis')
+        return self.payload
+
+    async def start_task(self):
+        """ starts the analysis process on the supplied .wav file, and returns the task_name (unique-id)
+        """
+        try:
+            status, content = await self._call('POST', self.client.config['URL_ANALYSIS'], self.payload)
+            if status == 200:
+                result = json.loads(content)
+                self.task_name = result.get('taskName')
+                self.task_status = result.get('taskStatus')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def check_status(self, task_name):
+        """ returns the current status of an already started task
+        """
+        try:
+            # for endpointAnalysis-id-get, the trailing word 'url' needs to be removed
+            url = re.sub(r'url$', str(task_name), self.client.config['URL_ANALYSIS'])
+            status, content = await self._call('GET', url)
+            if content:
+                return json.loads(content)
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def steps(self, intervals_with_phrases=False):
+        """ combines both start_task and the check_status methods, if the status is not complete it re-attempts for
+        n number of seconds indicated by REATTEMPT_CALLS_FOR config option; self.timeline records the stages of the call
+        """
+        timeline = self.timeline = Timeline('analysis', app_model_id=self.app_model_id, consumer_id=self.consumer_id)
+        with timeline.span('token') as span:
+            span.record(await self.client.authorization_header())
+
+        with timeline.span('create') as span:
+            result = span.record(await self.start_task(), 'taskStatus')
+        if not result or isinstance(result, tuple):
+            timeline.finish(error=True)
+            return None
+        timeline.root.set(task_name=self.task_name)
+
+        if self.task_status not in FINAL_STATUSES:
+            result, self.poll_metrics = await poll(self.client.poller,
+                                                   _traced(timeline, 'poll', lambda: self.check_status(self.task_name),
+                                                           'taskStatus'),
+                                                   is_done=work_order_done('taskStatus'),
+                                                   operation='analysis',
+                                                   timeout=float(self.client.config['REATTEMPT_CALLS_FOR']),
+                                                   retry_hint=retry_after_hint)
+            if not isinstance(result, dict):
+                timeline.finish(error=True)
+                return None
+            self.task_status = result.get('taskStatus')
+
+        timeline.mark('result', status=self.task_status)
+        if self.task_status == u'failed':
+            timeline.finish(error=True, status=self.task_status)
+            return None
+
+        self.intervals = result.get('intervals')
+        if intervals_with_phrases:
+            with timeline.span('phrases') as span:
+                result = span.record(await self.intervals_with_phrases())
+            timeline.finish(error=result is None, status=self.task_status)
+            return result
+
+        timeline.finish(error=self.task_status != u'completed', status=self.task_status)
+        return result
+
+    async def intervals_with_phrases(self):
+
+        try:
+            result = await AsyncAppModel(self.client).get(self.app_model_id)
+            repetitions = result.get('enrollmentRepeats')
+            vocabulary = result.get('vocabulary')
+
+            return h.merge_intervals_with_phrases(vocabulary, repetitions, self.intervals)
+
+        except Exception as e:
+            log.error('Could not generate intervals with phrases: %s', e)
+
+        return None
+
+
+class AsyncConsumer(_AsyncResource):
+
+    def __init__(self, client, payload=None):
+        super(AsyncConsumer, self).__init__(client)
+        self.payload = None
+        if payload:
+            # read-only objects do not need to set the payload
+            self.payload = self.set_payload(payload)
+        self.consumer_url = None
+        self.consumer_token = None
+
+    @property
+    def consumer_id(self):
+        if self.consumer_url:
+            return h.parse_id_from_href(self.consumer_url)
+
+    def set_payload(self, kwargs):
+        """ setter method for attribute payload which validates and stores parameters while creating the consumer
+        """
+        self.payload = _validated_payload(kwargs, ['username', 'password', 'gender'], 'consumer')
+        return self.payload
+
+    async def create(self):
+        """ create the consumer from the payload set during object initialization
+        """
+        try:
+            if not self.payload:
+                log.error('This seems to be a read-only object of Consumer, set the proper payload to create consumer')
+                return None
+
+            status, content = await self._call('POST', self.client.config['URL_CONSUMERS'], self.payload)
+            if status == 201:
+                self.consumer_url = json.loads(content).get('href')
+                return self.consumer_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def update(self, consumer_id, payload_override=None):
+        """ update the consumer's password field. Note: username and the gender are non editable fields
+        """
+        try:
+            url = self.client.config['URL_CONSUMERS'] + '/' + consumer_id
+            if payload_override:
+                self.payload = payload_override
+
+            status, content = await self._call('POST', url, self.payload)
+            if status == 202:
+                self.consumer_url = json.loads(content).get('href')
+                return self.consumer_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get(self, consumer_id):
+        try:
+            url = self.client.config['URL_CONSUMERS'] + '/' + consumer_id
+            status, content = await self._call('GET', url)
+            if status == 200:
+                result = json.loads(content)
+                if result.get('href'):
+                    self.consumer_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get_all(self, limit=10, offset=0):
+        return await self._get_all('URL_CONSUMERS', limit, offset)
+
+    async def get_token(self):
+        """ returns consumer specific token based on the given user
+        """
+        try:
+            url = self.client.config['URL_CONSUMERS'] + '/token'
+            _, content = await self._call('POST', url, self.payload)
+            self.consumer_token = json.loads(content).get('token')
+            return self.consumer_token
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def delete(self, consumer_id):
+        """ delete consumer with given id
+        """
+        try:
+            url = self.client.config['URL_CONSUMERS'] + '/' + consumer_id
+            status, content = await self._call('DELETE', url)
+            if status == 200:
+                result = json.loads(content)
+                if result.get('href'):
+                    self.consumer_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+
+class AsyncAppModel(_AsyncResource):
+    """ Coroutine counterpart of APIManager.AppModel
+    Endpoint: https://api.knurld.io/v1/app-models
+    """
+
+    def __init__(self, client, payload=None):
+        super(AsyncAppModel, self).__init__(client)
+        self.payload = None
+        if payload:
+            # read-only objects do not need to set the payload
+            self.payload = self.set_payload(payload)
+        self.app_model_url = None
+
+    @property
+    def app_model_id(self):
+        if self.app_model_url:
+            return h.parse_id_from_href(self.app_model_url)
+
+    def set_payload(self, kwargs):
+        """ setter method for attribute payload which validates and stores parameters for app model creation
+        """
+        self.payload = _validated_payload(kwargs, ['vocabulary', 'verificationLength', 'enrollmentRepeats'],
+                                          'app model')
+        return self.payload
+
+    async def create(self):
+        """ create an app model using the payload dictionary set during object initialization
+        """
+        try:
+            if not self.payload:
+                log.error('This seems to be a read-only object of AppModel, set the proper payload to create app model')
+                return None
+
+            status, content = await self._call('POST', self.client.config['URL_APP_MODELS'], self.payload)
+            if status == 201:
+                self.app_model_url = json.loads(content).get('href')
+                return self.app_model_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def update(self, app_model_id, payload_override=None):
+        """ update an app model using the payload dictionary set during object initialization
+        """
+        try:
+            url = self.client.config['URL_APP_MODELS'] + '/' + app_model_id
+            if payload_override:
+                self.payload = payload_override
+
+            status, content = await self._call('POST', url, self.payload)
+            if status == 202:
+                self.app_model_url = json.loads(content).get('href')
+                return self.app_model_id
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get(self, app_model_id):
+        """ get an app model associated with a particular app_model_id.
+        """
+        try:
+            url = self.client.config['URL_APP_MODELS'] + '/' + app_model_id
+            status, content = await self._call('GET', url)
+            if status == 200:
+                result = json.loads(content)
+                if result.get('href'):
+                    self.app_model_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
+
+    async def get_all(self, limit=10, offset=0):
+        """ get a range of available app models
+        """
+        return await self._get_all('URL_APP_MODELS', limit, offset)
+
+    async def delete(self, app_model_id):
+        """ delete app model with given id
+        """
+        try:
+            url = self.client.config['URL_APP_MODELS'] + '/' + app_model_id
+            status, content = await self._call('DELETE', url)
+            if status == 200:
+                result = json.loads(content)
+                if result.get('href'):
+                    self.app_model_url = result.get('href')
+                return result
+            else:
+                return status, content
+        except Exception as e:
+            log.error('Could not perform the operation: %s', e)
+            return None
@@ -6,14 +6,47 @@
 # license that can be found in the LICENSE file
 """
 
-from dogpile.cache import make_region
+import threading
 
-from knurld_sdk.config import Configuration
+from knurld_sdk.config import Configuration, LiveConfig
 
-c = Configuration()
-config = c.config
+# nothing is read nor built at import time: config.cfg is loaded on the first access to config and the cache region
+# on the first use of region
+c = Configuration(auto_watch=True)
+config = LiveConfig(c)  # always the latest snapshot, see Configuration.reload()
 app_root = str(c.app_root)
 
-region = make_region().configure('dogpile.cache.memory',
-                                 expiration_time=config['TOKEN_EXPIRES'],
-                                 )
+
+def _make_region():
+    from dogpile.cache import make_region
+
+    # backed by the dogpile.cache backend named by TOKEN_CACHE_BACKEND (e.g. 'dogpile.cache.memcached') if any, like
+    # the token store of the default client, see knurld_sdk.token_stores.store_from_config
+    backend = config.get('TOKEN_CACHE_BACKEND', '')
+    if backend.startswith('dogpile.cache.'):
+        return make_region().configure(backend,
+                                       expiration_time=config['TOKEN_EXPIRES'],
+                                       arguments=dict(config.get('TOKEN_CACHE_ARGUMENTS', {})),
+                                       )
+    return make_region().configure('dogpile.cache.memory',
+                                   expiration_time=config['TOKEN_EXPIRES'],
+                                   )
+
+
+class _LazyRegion(object):
+    """ stands for the dogpile.cache region, which is configured on first use
+    """
+
+    def __init__(self):
+        self._region = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._region is None:
+            with self._lock:
+                if self._region is None:
+                    self._region = _make_region()
+        return getattr(self._region, name)
+
+
+region = _LazyRegion()
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import random
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from knurld_sdk import helpers as h
+from knurld_sdk.client import default_client
+from knurld_sdk.polling import FINAL_STATUSES, OUTCOME_TIMEOUT, clock, work_order_done
+
+DEFAULT_MAX_WORKERS = 8
+
+# one consumer to enroll: the wav_url recording must follow the app model's enrollment instructions
+EnrollmentRecord = namedtuple('EnrollmentRecord', ['consumer_id', 'app_model_id', 'wav_url', 'intervals'])
+
+# outcome of one record; status is 'completed', 'failed', 'timeout' or 'error' (the API call failed, see error)
+EnrollmentResult = namedtuple('EnrollmentResult', ['record', 'enrollment_id', 'status', 'error', 'seconds'])
+
+# one recording to verify a consumer against an app model
+VerificationRecord = namedtuple('VerificationRecord', ['consumer_id', 'app_model_id', 'wav_url', 'intervals'])
+
+# outcome of one record: status as in EnrollmentResult, result is the final verification resource and timings maps
+# each stage reached ('create', 'instructions', 'update', 'poll') to its duration in seconds
+VerificationResult = namedtuple('VerificationResult', ['record', 'verification_id', 'status', 'result', 'error',
+                                                       'timings', 'seconds'])
+
+
+def bounded_map(fn, iterable, max_workers=DEFAULT_MAX_WORKERS, max_pending=None, limiter=None):
+    """ applies fn to every item of iterable on a pool of max_workers threads and yields the results as they finish
+    (not in input order). At most max_pending items are in flight at a time, so the iterable is consumed only as
+    fast as the pool keeps up with it. Closing the generator early cancels the items not started yet.
+    :param limiter: knurld_sdk.concurrency.AdaptiveLimiter whose current limit further bounds the items in flight
+    """
+    max_pending = max_pending if max_pending else 2 * max_workers
+    items = iter(iterable)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = set()
+    try:
+        exhausted = False
+        while True:
+            window = min(max_pending, max(1, limiter.limit)) if limiter is not None else max_pending
+            while not exhausted and len(pending) < window:
+                try:
+                    pending.add(executor.submit(fn, next(items)))
+                except StopIteration:
+                    exhausted = True
+            if not pending:
+                return
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+def _max_workers(limiter):
+    return limiter.max_limit if limiter is not None else DEFAULT_MAX_WORKERS
+
+
+class BulkStats(object):
+    """ running counters of a bulk run
+    """
+
+    def __init__(self):
+        self.started = clock()
+        self.finished = None
+        self.completed = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    @property
+    def elapsed(self):
+        return (self.finished if self.finished is not None else clock()) - self.started
+
+    @property
+    def throughput(self):
+        """ records finished per second
+        """
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def add(self, succeeded):
+        self.completed += 1
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def __repr__(self):
+        return 'BulkStats(completed={}, succeeded={}, failed={}, elapsed={:.3f}s, throughput={:.2f}/s)'.format(
+            self.completed, self.succeeded, self.failed, self.elapsed, self.throughput)
+
+
+class BulkEnroller(object):
+    """
+    Enrolls many consumers concurrently through Enrollment.create / update / get, e.g.
+
+        enroller = BulkEnroller(max_workers=16)
+        for result in enroller.run(records):
+            if result.status != 'completed':
+                retry_later(result.record)
+        print(enroller.stats)
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None, poller=None, client=None, limiter=None):
+        """
+        :param max_workers: number of enrollments processed at the same time, defaults to DEFAULT_MAX_WORKERS, or
+                            with an adaptive limiter to the most it lets in flight
+        :param max_pending: number of records read ahead of the workers, defaults to 2 * max_workers
+        :param timeout: seconds to wait for each enrollment to complete, defaults to REATTEMPT_CALLS_FOR
+        :param poller: knurld_sdk.polling.Poller for the status polls, defaults to the one of the client
+        :param client: knurld_sdk.client.KnurldClient to work with, defaults to default_client()
+        :param limiter: knurld_sdk.concurrency.AdaptiveLimiter adapting the number of records worked on at a time,
+                        defaults to the 'concurrency' stage of the client's pipeline (CONCURRENCY_ADAPTIVE)
+        """
+        self.client = client if client else default_client()
+        self.limiter = limiter if limiter is not None else self.client.pipeline.get('concurrency')
+        self.max_workers = max_workers if max_workers else _max_workers(self.limiter)
+        self.max_pending = max_pending
+        self.timeout = timeout if timeout is not None else float(self.client.config['REATTEMPT_CALLS_FOR'])
+        self.poller = poller if poller is not None else self.client.poller
+        self.stats = BulkStats()
+
+    def enroll(self, record):
+        """ enrolls a single record and returns its EnrollmentResult, never raises
+        """
+        from knurld_sdk.APIManager import Enrollment
+        from knurld_sdk.session import retry_after_hint
+
+        record = EnrollmentRecord(*record)
+        started = clock()
+        enrollment_id = None
+
+        def _result(enrollment_id, status, error=None):
+            return EnrollmentResult(record, enrollment_id, status, error, clock() - started)
+
+        try:
+            e = Enrollment(None, app_model_id=record.app_model_id, consumer_id=record.consumer_id, client=self.client)
+            created = e.create()
+            if not created or isinstance(created, tuple):
+                return _result(None, 'error', created)
+            enrollment_id = created
+
+            updated = e.update(enrollment_id, payload_update={"enrollment.wav": record.wav_url,
+                                                              "intervals": record.intervals})
+            if not updated or isinstance(updated, tuple):
+                return _result(enrollment_id, 'error', updated)
+
+            result, polled = self.poller.poll(lambda: e.get(enrollment_id), is_done=work_order_done('status'),
+                                              operation='enrollment', timeout=self.timeout,
+                                              retry_hint=retry_after_hint)
+            if polled.outcome == OUTCOME_TIMEOUT:
+                return _result(enrollment_id, 'timeout', result)
+            if isinstance(result, dict) and result.get('status') in FINAL_STATUSES:
+                return _result(enrollment_id, result.get('status'))
+            return _result(enrollment_id, 'error', result)
+
+        except Exception as e:
+            return _result(enrollment_id, 'error', e)
+
+    def run(self, records):
+        """ enrolls every record of the iterable and yields their EnrollmentResult as they finish
+        :param records: iterable of EnrollmentRecord or (consumer_id, app_model_id, wav_url, intervals) tuples
+        """
+        self.stats = BulkStats()
+        try:
+            for result in bounded_map(self.enroll, records, self.max_workers, self.max_pending, self.limiter):
+                self.stats.add(result.status == u'completed')
+                yield result
+        finally:
+            self.stats.finished = clock()
+
+
+class LatencySummary(object):
+    """ collects per stage latencies and reports their p50 / p95 / p99; keeps a uniform sample of at most
+    max_samples values per stage so that arbitrarily long runs use bounded memory
+    """
+
+    def __init__(self, max_samples=100000):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._counts = {}
+
+    def add(self, stage, seconds):
+        samples = self._samples.setdefault(stage, [])
+        count = self._counts[stage] = self._counts.get(stage, 0) + 1
+        if len(samples) < self.max_samples:
+            samples.append(seconds)
+        else:
+            # reservoir sampling
+            i = random.randint(0, count - 1)
+            if i < self.max_samples:
+                samples[i] = seconds
+
+    def summary(self, quantiles=(0.5, 0.95, 0.99)):
+        """ returns {stage: {'count': n, 'p50': s, 'p95': s, 'p99': s}}
+        """
+        result = {}
+        for stage, samples in self._samples.items():
+            ordered = sorted(samples)
+            result[stage] = {'count': self._counts[stage]}
+            for q in quantiles:
+                result[stage]['p' + str(int(round(q * 100)))] = h.percentile(ordered, q)
+        return result
+
+
+class BulkVerifier(object):
+    """
+    Runs Verification create / instructions fetch / update / poll for many recordings concurrently, timing every
+    stage of every item, e.g.
+
+        verifier = BulkVerifier(max_workers=16)
+        for result in verifier.run(records):
+            report(result.record, result.status, result.result, result.timings)
+        print(verifier.latencies.summary())
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, timeout=None, poller=None, client=None, limiter=None):
+        """
+        :param max_workers: maximum number of verifications in flight, defaults to DEFAULT_MAX_WORKERS, or with an
+                            adaptive limiter to the most it lets in flight
+        :param max_pending: number of records read ahead of the workers, defaults to 2 * max_workers
+        :param timeout: seconds to wait for each verification to complete, defaults to REATTEMPT_CALLS_FOR
+        :param poller: knurld_sdk.polling.Poller for the status polls, defaults to the one of the client
+        :param client: knurld_sdk.client.KnurldClient to work with, defaults to default_client()
+        :param limiter: knurld_sdk.concurrency.AdaptiveLimiter adapting the number of records worked on at a time,
+                        defaults to the 'concurrency' stage of the client's pipeline (CONCURRENCY_ADAPTIVE)
+        """
+        self.client = client if client else default_client()
+        self.limiter = limiter if limiter is not None else self.client.pipeline.get('concurrency')
+        self.max_workers = max_workers if max_workers else _max_workers(self.limiter)
+        self.max_pending = max_pending
+        self.timeout = timeout if timeout is not None else float(self.client.config['REATTEMPT_CALLS_FOR'])
+        self.poller = poller if poller is not None else self.client.poller
+        self.stats = BulkStats()
+        self.latencies = LatencySummary()
+
+    def verify(self, record):
+        """ verifies a single record and returns its VerificationResult, never raises
+        """
+        from knurld_sdk.APIManager import Verification
+        from knurld_sdk.session import retry_after_hint
+
+        record = VerificationRecord(*record)
+        started = clock()
+        timings = {}
+        verification_id = None
+
+        def _timed(stage, fn):
+            stage_start = clock()
+            try:
+                return fn()
+            finally:
+                timings[stage] = clock() - stage_start
+
+        def _result(status, result=None, error=None):
+            return VerificationResult(record, verification_id, status, result, error, timings, clock() - started)
+
+        try:
+            v = Verification(None, app_model_id=record.app_model_id, consumer_id=record.consumer_id,
+                             client=self.client)
+            verification_id = _timed('create', v.create)
+            if not verification_id or isinstance(verification_id, tuple):
+                verification_id, error = None, verification_id
+                return _result('error', error=error)
+
+            instructions = _timed('instructions', lambda: v.get(verification_id))
+            if not instructions or isinstance(instructions, tuple):
+                return _result('error', error=instructions)
+
+            updated = _timed('update', lambda: v.update(verification_id, payload_update={
+                "verification.wav": record.wav_url,
+                "intervals": record.intervals
+            }))
+            if not updated or isinstance(updated, tuple):
+                return _result('error', error=updated)
+
+            result, polled = _timed('poll', lambda: self.poller.poll(lambda: v.get(verification_id),
+                                                                     is_done=work_order_done('status'),
+                                                                     operation='verification', timeout=self.timeout,
+                                                                     retry_hint=retry_after_hint))
+            if polled.outcome == OUTCOME_TIMEOUT:
+                return _result('timeout', result=result)
+            if isinstance(result, dict) and result.get('status') in FINAL_STATUSES:
+                return _result(result.get('status'), result=result)
+            return _result('error', error=result)
+
+        except Exception as e:
+            return _result('error', error=e)
+
+    def run(self, records):
+        """ verifies every record of the iterable and yields their VerificationResult as they finish
+        :param records: iterable of VerificationRecord or (consumer_id, app_model_id, wav_url, intervals) tuples
+        """
+        self.stats = BulkStats()
+        self.latencies = LatencySummary()
+        try:
+            for result in bounded_map(self.verify, records, self.max_workers, self.max_pending, self.limiter):
+                self.stats.add(result.status == u'completed')
+                for stage, seconds in result.timings.items():
+                    self.latencies.add(stage, seconds)
+                self.latencies.add('total', result.seconds)
+                yield result
+        finally:
+            self.stats.finished = clock()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+from collections import OrderedDict
+
+from knurld_sdk.metrics import registry
+from knurld_sdk.polling import clock
+
+DEFAULT_CONSUMER_TOKEN_CACHE_SIZE = 100000  # consumer tokens kept at most, the least recently used ones go first
+DEFAULT_APP_MODEL_CACHE_SIZE = 1000         # app model records kept at most
+DEFAULT_APP_MODEL_CACHE_TTL = 3600          # seconds an app model record is served from the cache
+
+_MISSING = object()
+
+
+class _Flight(object):
+    """ a value being created by one thread for the others waiting on the same key
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache(object):
+    """
+    Thread safe cache holding at most maxsize entries, each for at most ttl seconds. Once full, the least recently
+    used entry makes room for a new one; expired entries are dropped when they are looked up or reach the LRU end.
+    The hits, misses, evictions (of live entries, to stay within maxsize) and expirations are counted.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        """
+        :param maxsize: maximum number of entries
+        :param ttl: default lifetime of an entry in seconds, None to keep entries until they are evicted
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (value, expires_at), least recently used first
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key, now):
+        """ returns the live value of key or _MISSING; to be called with the lock held
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            self.expirations += 1
+            return _MISSING
+        self._entries[key] = entry  # back to the most recently used end
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key, clock())
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """ stores value under key for ttl seconds (the cache's ttl when not given)
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        now = clock()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, now + ttl if ttl is not None else None)
+            while len(self._entries) > self.maxsize:
+                _, (_, expires_at) = self._entries.popitem(last=False)
+                if expires_at is not None and expires_at <= now:
+                    self.expirations += 1
+                else:
+                    self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self):
+        """ the keys stored, expired or not, least recently used first
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_create(self, key, creator, ttl=None, should_cache=None):
+        """ returns the cached value of key, or calls creator() to make it. Concurrent callers missing the same key
+        wait for the one creator call instead of making their own.
+        :param ttl: lifetime of the created value, or a callable(value) returning it; defaults to the cache's ttl
+        :param should_cache: predicate on the created value, by default every value but None is cached
+        """
+        with self._lock:
+            value = self._lookup(key, clock())
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = creator()
+            if should_cache(flight.value) if should_cache else flight.value is not None:
+                self.set(key, flight.value, ttl=ttl(flight.value) if callable(ttl) else ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations}
+
+
+_consumer_tokens = None
+_consumer_tokens_lock = threading.Lock()
+
+
+def consumer_token_cache():
+    """ returns the process wide cache of consumer tokens, bounded by CONSUMER_TOKEN_CACHE_SIZE; a token is kept for
+    CONSUMER_TOKEN_EXPIRES seconds (TOKEN_EXPIRES by default)
+    """
+    global _consumer_tokens
+
+    if _consumer_tokens is None:
+        with _consumer_tokens_lock:
+            if _consumer_tokens is None:
+                from knurld_sdk import app_globals as g
+                _consumer_tokens = LRUCache(
+                    int(g.config.get('CONSUMER_TOKEN_CACHE_SIZE', DEFAULT_CONSUMER_TOKEN_CACHE_SIZE)),
+                    ttl=float(g.config.get('CONSUMER_TOKEN_EXPIRES', g.config['TOKEN_EXPIRES'])))
+                registry.track_cache('consumer_tokens', _consumer_tokens)
+    return _consumer_tokens
+
+
+_app_models = None
+_app_models_lock = threading.Lock()
+
+
+def app_model_cache():
+    """ returns the process wide cache of app model records by app model id, bounded by APP_MODEL_CACHE_SIZE; a record
+    is kept for APP_MODEL_CACHE_TTL seconds
+    """
+    global _app_models
+
+    if _app_models is None:
+        with _app_models_lock:
+            if _app_models is None:
+                from knurld_sdk import app_globals as g
+                _app_models = LRUCache(int(g.config.get('APP_MODEL_CACHE_SIZE', DEFAULT_APP_MODEL_CACHE_SIZE)),
+                                       ttl=float(g.config.get('APP_MODEL_CACHE_TTL', DEFAULT_APP_MODEL_CACHE_TTL)))
+                registry.track_cache('app_models', _app_models)
+    return _app_models
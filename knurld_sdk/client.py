@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+
+from knurld_sdk.cache import (DEFAULT_APP_MODEL_CACHE_SIZE, DEFAULT_APP_MODEL_CACHE_TTL,
+                              DEFAULT_CONSUMER_TOKEN_CACHE_SIZE, LRUCache)
+from knurld_sdk.metrics import registry
+
+
+def _tracked(name, cache):
+    registry.track_cache(name, cache)
+    return cache
+
+
+class KnurldClient(object):
+    """
+    Everything needed to call the API on behalf of one developer account: its configuration, connection pool, admin
+    token and caches. Resource classes take a client, so that a process can work with several accounts side by side,
+    each with its own pool and token, e.g.
+
+        client = KnurldClient(config={'CLIENT_ID': ..., 'CLIENT_SECRET': ..., 'DEVELOPER_ID': ..., 'URL_...': ...})
+        consumers = Consumer.get_all(client=client)
+        Enrollment(None, app_model_id, consumer_id, client=client).steps(payload)
+
+    The pieces are built on first use. Resource objects created without a client use default_client(), which is
+    backed by config.cfg and the process wide session, token manager and caches.
+    """
+
+    def __init__(self, config=None, session=None, token_manager=None, poller=None, pipeline=None):
+        """
+        :param config: configuration mapping with the same fields as config.cfg, defaults to config.cfg
+        :param session: a KnurldSession, by default one is built from the HTTP_* options of config
+        :param token_manager: a knurld_sdk.tokens.TokenManager, by default one is made for config
+        :param poller: a knurld_sdk.polling.Poller, by default one is built from the POLL_* options of config
+        :param pipeline: a knurld_sdk.pipeline.Pipeline the resource calls go through, by default the standard one
+        """
+        if config is None:
+            from knurld_sdk import app_globals as g
+            config = g.config
+        self.config = config
+        self._session = session
+        self._token_manager = token_manager
+        self._poller = poller
+        self._pipeline = pipeline
+        self._rate_limiter = None
+        self._consumer_tokens = None
+        self._app_models = None
+        self._lock = threading.Lock()
+
+    def _lazy(self, name, factory):
+        """ returns the attribute name, building it with factory() on first use
+        """
+        value = getattr(self, name)
+        if value is None:
+            with self._lock:
+                value = getattr(self, name)
+                if value is None:
+                    value = factory()
+                    setattr(self, name, value)
+        return value
+
+    @property
+    def session(self):
+        def _build():
+            from knurld_sdk.session import session_options
+            from knurld_sdk.transport import KnurldSession
+            return KnurldSession(**session_options(self.config))
+        return self._lazy('_session', _build)
+
+    @property
+    def token_manager(self):
+        if self._token_manager is not None:     # read on every call, skip the imports
+            return self._token_manager
+        from knurld_sdk.tokens import TokenManager, request_access_token
+        return self._lazy('_token_manager', lambda: TokenManager(
+            config=self.config,
+            fetch=lambda config: request_access_token(config, session=self.session, pipeline=self.pipeline)))
+
+    @property
+    def poller(self):
+        from knurld_sdk.polling import Poller
+        return self._lazy('_poller', lambda: Poller.from_config(self.config))
+
+    @property
+    def pipeline(self):
+        """ the stages the calls of the resource classes go through, see knurld_sdk.pipeline.Pipeline
+        """
+        if self._pipeline is not None:
+            return self._pipeline
+        from knurld_sdk.pipeline import Pipeline
+        rate_limiter = self.rate_limiter    # built outside of the lock _lazy holds
+        return self._lazy('_pipeline', lambda: Pipeline.from_config(self.config, rate_limiter=rate_limiter))
+
+    @property
+    def rate_limiter(self):
+        """ token buckets per endpoint family shared by the calls of this client, see knurld_sdk.ratelimit
+        """
+        from knurld_sdk.ratelimit import RateLimiter
+        return self._lazy('_rate_limiter', lambda: RateLimiter.from_config(self.config))
+
+    @property
+    def consumer_tokens(self):
+        """ cache of the consumer tokens, see Consumer.get_token
+        """
+        return self._lazy('_consumer_tokens', lambda: _tracked('consumer_tokens', LRUCache(
+            int(self.config.get('CONSUMER_TOKEN_CACHE_SIZE', DEFAULT_CONSUMER_TOKEN_CACHE_SIZE)),
+            ttl=float(self.config.get('CONSUMER_TOKEN_EXPIRES', self.config['TOKEN_EXPIRES'])))))
+
+    @property
+    def app_models(self):
+        """ cache of the app model records, see AppModel.get_cached
+        """
+        return self._lazy('_app_models', lambda: _tracked('app_models', LRUCache(
+            int(self.config.get('APP_MODEL_CACHE_SIZE', DEFAULT_APP_MODEL_CACHE_SIZE)),
+            ttl=float(self.config.get('APP_MODEL_CACHE_TTL', DEFAULT_APP_MODEL_CACHE_TTL)))))
+
+    def headers(self, content_type='application/json', developer_id=None):
+        """ authorization headers carrying the admin token of this client
+        """
+        return self.token_manager.headers(content_type=content_type, developer_id=developer_id)
+
+    def close(self):
+        """ closes the connection pool and stops the background token refresh, if any
+        """
+        if self._token_manager is not None:
+            self._token_manager.stop_background_refresh()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _DefaultClient(KnurldClient):
+    """ the client of config.cfg, sharing the process wide session, token manager, poller and caches
+    """
+
+    def __init__(self):
+        super(_DefaultClient, self).__init__()
+
+    @property
+    def session(self):
+        from knurld_sdk.session import get_session
+        return get_session()
+
+    @property
+    def token_manager(self):
+        from knurld_sdk.tokens import default_token_manager
+        return default_token_manager()
+
+    @property
+    def poller(self):
+        from knurld_sdk.polling import default_poller
+        return default_poller()
+
+    @property
+    def consumer_tokens(self):
+        from knurld_sdk.cache import consumer_token_cache
+        return consumer_token_cache()
+
+    @property
+    def app_models(self):
+        from knurld_sdk.cache import app_model_cache
+        return app_model_cache()
+
+    def close(self):
+        from knurld_sdk.session import reset_session
+        reset_session()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    """ returns the client used by the resource objects created without one
+    """
+    global _default_client
+
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = _DefaultClient()
+    return _default_client
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+from collections import deque
+
+from knurld_sdk import metrics
+from knurld_sdk.CustomExceptions import DeadlineExceeded
+from knurld_sdk.http_cache import auth_scope
+from knurld_sdk.polling import clock
+from knurld_sdk.session import record_retry_after
+
+DEFAULT_COALESCE_WINDOW = 0     # seconds a finished GET keeps answering identical requests, 0 for in-flight only
+
+
+class _Call(object):
+    """ one GET whose response is shared by every identical request made meanwhile
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+        self.finished = None
+
+
+class RequestCoalescer(object):
+    """
+    Merges identical GET requests (same URL and auth scope) made at the same time, e.g. many threads polling the
+    status of the same enrollment: the first one goes to the network and the others wait for its response instead of
+    sending their own. With a window, the response also answers the identical requests made up to window seconds
+    after it arrived. The waiters get the same response object, which they must not modify.
+    """
+
+    def __init__(self, window=DEFAULT_COALESCE_WINDOW):
+        self.window = window
+        self._calls = {}
+        self._finished = deque()    # (finished, key, call) of the calls kept for the window, oldest first
+        self._lock = threading.Lock()
+        self.requests = 0           # requests sent
+        self.coalesced = 0          # requests answered with the response of another one
+
+    @classmethod
+    def from_config(cls, config):
+        """ builds a RequestCoalescer from the HTTP_COALESCE_WINDOW option of the given configuration
+        """
+        return cls(window=float(config.get('HTTP_COALESCE_WINDOW', DEFAULT_COALESCE_WINDOW)))
+
+    def _expire(self, now):
+        """ drops the calls whose window is over; to be called with the lock held
+        """
+        while self._finished and now - self._finished[0][0] >= self.window:
+            _, key, call = self._finished.popleft()
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def send(self, send, url, headers, deadline=None):
+        """ performs a GET through the coalescer
+        :param send: callable(headers) sending the request, returns a requests.Response
+        :param deadline: knurld_sdk.deadline.Deadline of the request, DeadlineExceeded is raised when the identical
+                         request it waits for is not answered before it
+        """
+        key = (url, auth_scope(headers))
+        with self._lock:
+            self._expire(clock())
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.requests += 1
+            else:
+                self.coalesced += 1
+                metrics.COALESCED.inc((metrics.endpoint(url),))
+
+        if not leader:
+            if not call.done.wait(deadline.remaining() if deadline is not None else None):
+                raise DeadlineExceeded('GET {} was not answered before the deadline'.format(url))
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = send(headers)
+            return call.response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            call.finished = clock()
+            with self._lock:
+                if self.window and call.error is None:
+                    self._finished.append((call.finished, key, call))
+                elif self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def __call__(self, call, send):
+        """ the 'coalesce' stage of a knurld_sdk.pipeline.Pipeline, merging the GETs without a body
+        """
+        if call.method != 'GET' or call.json is not None:
+            return send(call)
+        response = self.send(lambda headers: send(call), call.url, call.headers, call.deadline)
+        # the response hooks only ran in the thread that sent the request
+        record_retry_after(response)
+        return response
+
+    def stats(self):
+        return {'requests': self.requests, 'coalesced': self.coalesced}
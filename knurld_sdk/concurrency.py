@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import logging
+import threading
+
+from knurld_sdk import metrics
+from knurld_sdk.CustomExceptions import DeadlineExceeded
+from knurld_sdk.polling import RETRYABLE_STATUS_CODES, clock
+
+log = logging.getLogger(__name__)
+
+# defaults used when the corresponding CONCURRENCY_* options are missing from config.cfg
+DEFAULT_INITIAL_LIMIT = 4       # calls allowed in flight before any response came back
+DEFAULT_MIN_LIMIT = 1           # the limit is never cut below this many calls
+DEFAULT_MAX_LIMIT = 64          # nor grown above this many
+DEFAULT_DECREASE = 0.5          # factor applied to the limit when the service shows signs of overload
+DEFAULT_LATENCY_TOLERANCE = 3.0  # a response this many times slower than the average one counts as overload
+
+# responses averaged before latencies are judged, and the weight of each new one in the average
+_LATENCY_WARMUP = 10
+_LATENCY_WEIGHT = 0.1
+
+
+class AdaptiveLimiter(object):
+    """
+    Limits the number of calls in flight with additive increase / multiplicative decrease (AIMD), the way TCP sizes
+    its congestion window: every healthy response adds 1 / limit to the limit, so that it grows by one call per round
+    of calls, while a dropped connection, a timeout, a throttling or 5xx response or a response much slower than the
+    usual ones multiplies it by decrease. Bulk jobs thus settle near the concurrency the service sustains instead of
+    a fixed worker count.
+
+    A limiter is the 'concurrency' stage of a knurld_sdk.pipeline.Pipeline, where each call waits for a free slot,
+    and knurld_sdk.bulk.bounded_map consults its limit to decide how many records to work on at a time.
+    """
+
+    def __init__(self, initial=DEFAULT_INITIAL_LIMIT, min_limit=DEFAULT_MIN_LIMIT, max_limit=DEFAULT_MAX_LIMIT,
+                 decrease=DEFAULT_DECREASE, latency_tolerance=DEFAULT_LATENCY_TOLERANCE, latency_target=None):
+        """
+        :param latency_tolerance: slowdown relative to the average latency treated as overload, None to ignore it
+        :param latency_target: seconds above which a response counts as overload, whatever the baseline
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.latency_target = latency_target
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._latency = None
+        self._samples = 0
+        self._last_cut = None
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """ builds an AdaptiveLimiter from the CONCURRENCY_* options of the given configuration
+        """
+        target = config.get('CONCURRENCY_LATENCY_TARGET')
+        return cls(initial=int(config.get('CONCURRENCY_INITIAL', DEFAULT_INITIAL_LIMIT)),
+                   min_limit=int(config.get('CONCURRENCY_MIN', DEFAULT_MIN_LIMIT)),
+                   max_limit=int(config.get('CONCURRENCY_MAX', DEFAULT_MAX_LIMIT)),
+                   decrease=float(config.get('CONCURRENCY_DECREASE', DEFAULT_DECREASE)),
+                   latency_target=float(target) if target else None, **kwargs)
+
+    @property
+    def limit(self):
+        """ the number of calls currently allowed in flight
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, deadline=None):
+        """ waits for a free slot and takes it
+        :param deadline: knurld_sdk.deadline.Deadline of the call, DeadlineExceeded is raised when no slot frees up
+                         before it
+        :return: the clock() time the slot was taken, to hand back to release()
+        """
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    raise DeadlineExceeded('no concurrency slot freed up before the deadline')
+                self._cond.wait(remaining)
+            self._in_flight += 1
+            return clock()
+
+    def release(self, started, overloaded=False):
+        """ frees a slot and adapts the limit to how the call went
+        :param started: what acquire() returned for the call
+        :param overloaded: True when the call failed in a way that means the service is overloaded
+        """
+        now = clock()
+        latency = now - started
+        with self._cond:
+            self._in_flight -= 1
+            if not overloaded:
+                overloaded = self._too_slow(latency)
+            if overloaded:
+                # the calls sent before the last cut were already in flight when it was decided, they do not
+                # cut the limit again
+                if self._last_cut is None or started >= self._last_cut:
+                    self._limit = max(float(self.min_limit), self._limit * self.decrease)
+                    self._last_cut = now
+                    log.info('Concurrency limit cut to %d', self.limit)
+            elif self._limit < self.max_limit:
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            metrics.CONCURRENCY_LIMIT.set(value=self.limit)
+            self._cond.notify_all()
+
+    def _too_slow(self, latency):
+        if self.latency_target is not None and latency > self.latency_target:
+            return True
+        if self.latency_tolerance is None:
+            return False
+        if self._samples >= _LATENCY_WARMUP and latency > self._latency * self.latency_tolerance:
+            return True
+        # the outliers stay out of the average, which still follows a service that becomes slower gradually
+        self._samples += 1
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += (latency - self._latency) * _LATENCY_WEIGHT
+        return False
+
+    def __call__(self, call, send):
+        """ the 'concurrency' stage of a knurld_sdk.pipeline.Pipeline
+        """
+        started = self.acquire(call.deadline)
+        try:
+            response = send(call)
+        except IOError:     # requests' connection errors and timeouts are IOErrors
+            self.release(started, overloaded=True)
+            raise
+        except Exception:
+            self.release(started)
+            raise
+        self.release(started, overloaded=response.status_code in RETRYABLE_STATUS_CODES)
+        return response
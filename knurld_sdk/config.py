@@ -7,40 +7,196 @@
 """
 
 import json
+import logging
 import os
+import threading
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # python 2
+    from collections import Mapping
+
+from knurld_sdk.CustomExceptions import InvalidConfigurationException
+
+log = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ('CLIENT_ID', 'CLIENT_SECRET', 'DEVELOPER_ID', 'TOKEN_EXPIRES')
+
+# types of the optional fields, converted once when config.cfg is loaded
+FLOAT_FIELDS = ('TOKEN_EXPIRES', 'REATTEMPT_CALLS_FOR', 'HTTP_CONNECT_TIMEOUT', 'HTTP_READ_TIMEOUT', 'HTTP_CACHE_TTL',
+                'HTTP_COALESCE_WINDOW', 'POLL_INITIAL_DELAY', 'POLL_MAX_DELAY', 'POLL_BACKOFF_FACTOR', 'POLL_JITTER',
+                'TOKEN_REFRESH_MARGIN', 'CONSUMER_TOKEN_EXPIRES', 'APP_MODEL_CACHE_TTL', 'CONFIG_RELOAD_INTERVAL',
+                'HTTP_RETRY_BACKOFF', 'HTTP_RETRY_MAX_DELAY', 'RATE_LIMIT_DEFAULT', 'RATE_LIMIT_BURST',
+                'RATE_LIMIT_DECREASE', 'RATE_LIMIT_RECOVERY', 'RATE_LIMIT_MIN_RATE', 'CONCURRENCY_DECREASE',
+                'CONCURRENCY_LATENCY_TARGET')
+INT_FIELDS = ('HTTP_POOL_CONNECTIONS', 'HTTP_POOL_MAXSIZE', 'HTTP_POOL_SIZE_PER_HOST', 'HTTP_CACHE_SIZE', 'PAGE_SIZE',
+              'CONSUMER_TOKEN_CACHE_SIZE', 'APP_MODEL_CACHE_SIZE', 'HTTP_RETRIES', 'CONCURRENCY_INITIAL',
+              'CONCURRENCY_MIN', 'CONCURRENCY_MAX', 'HTTP_ASYNC_POOL_SIZE')
+BOOL_FIELDS = ('HTTP_POOL_BLOCK', 'HTTP_CACHE_ENABLED', 'HTTP_COALESCE_ENABLED', 'TOKEN_BACKGROUND_REFRESH',
+               'CONCURRENCY_ADAPTIVE')
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ('true', '1', 'yes', 'on'):
+        return True
+    if str(value).strip().lower() in ('false', '0', 'no', 'off', ''):
+        return False
+    raise ValueError('not a boolean: {}'.format(value))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return ConfigSnapshot(value)
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class ConfigSnapshot(Mapping):
+    """ a read-only view of a parsed configuration; nested objects are read-only as well
+    """
+
+    def __init__(self, values, stamp=None):
+        self._values = dict((k, _freeze(v)) for k, v in values.items())
+        self.stamp = stamp  # (modification time, size) of the file it was read from
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return 'ConfigSnapshot({})'.format(sorted(self._values))
+
+
+def parse_config(content, max_expiration_time=3599, stamp=None):
+    """ parses and validates the content of config.cfg, returns a ConfigSnapshot with typed values
+    """
+    try:
+        values = json.loads(content.replace('\r\n', ''))
+    except ValueError as e:
+        raise InvalidConfigurationException('Could not load the configuration! {}'.format(e))
+
+    missing = [field for field in REQUIRED_FIELDS if field not in values]
+    if missing:
+        raise InvalidConfigurationException('Must provide all mandatory fields: ' + str(missing))
+
+    for fields, cast in ((FLOAT_FIELDS, float), (INT_FIELDS, int), (BOOL_FIELDS, _to_bool)):
+        for field in fields:
+            if field in values:
+                try:
+                    values[field] = cast(values[field])
+                except (TypeError, ValueError) as e:
+                    raise InvalidConfigurationException('Invalid value for {}: {}'.format(field, e))
+
+    # if the Token Expire time is greater than max allowable duration then reset it to max
+    values['TOKEN_EXPIRES'] = min(values['TOKEN_EXPIRES'], max_expiration_time)
+    return ConfigSnapshot(values, stamp=stamp)
 
 
 class Configuration(object):
+    """
+    Loads config.cfg once into an immutable ConfigSnapshot. reload() (or a watch() thread) swaps in a new snapshot
+    when the file changes, so that long running services pick up changes without reading the file on every access.
+    """
 
-    def __init__(self, max_expiration_time=3599):  # as per the APIs after every 3599 seconds current token expires
-        self._config = None
+    # as per the APIs after every 3599 seconds current token expires
+    def __init__(self, max_expiration_time=3599, path=None, auto_watch=False):
+        """
+        :param path: the configuration file, config.cfg of the package by default
+        :param auto_watch: once loaded, watch() the file if it sets CONFIG_RELOAD_INTERVAL
+        """
         self._max_expiration_time = max_expiration_time
-        self._app_root = None
+        self._auto_watch = auto_watch
+        self._app_root = os.path.dirname(os.path.abspath(__file__))
+        self.path = path if path else os.path.join(self._app_root, 'config.cfg')
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
 
     @property
     def app_root(self):
-        try:
-            self._app_root = os.path.dirname(os.path.abspath(__file__))
-        except IOError as e:
-            print('Unable to set APP_ROOT {}'.format(e))
-
         return self._app_root
 
     @property
     def config(self):
-        try:
-            with open(str(self.app_root) + '/config.cfg', 'r+') as cf:
-                content = cf.read().replace('\r\n', '')
-                self._config = json.loads(content)
+        """ the current ConfigSnapshot, loaded on first access
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load()
+                    if self._auto_watch and self._snapshot.get('CONFIG_RELOAD_INTERVAL'):
+                        self.watch(self._snapshot['CONFIG_RELOAD_INTERVAL'])
+                snapshot = self._snapshot
+        return snapshot
+
+    def _stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime, stat.st_size
+
+    def _load(self):
+        stamp = self._stamp()
+        with open(self.path, 'r') as cf:
+            return parse_config(cf.read(), self._max_expiration_time, stamp=stamp)
+
+    def reload(self, force=False):
+        """ re-reads config.cfg if it changed since it was loaded; an invalid file is reported and the current
+        snapshot kept
+        :return: True when a new snapshot was swapped in
+        """
+        with self._lock:
+            current = self._snapshot
+            try:
+                if not force and current is not None and self._stamp() == current.stamp:
+                    return False
+                self._snapshot = self._load()
+                return True
+            except (IOError, OSError, InvalidConfigurationException) as e:
+                log.warning('Could not reload the configuration, keeping the current one: %s', e)
+                return False
+
+    def watch(self, interval=5.0):
+        """ checks the modification time and size of config.cfg every interval seconds in a daemon thread and
+        reloads it when they change
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        def _watch():
+            while not self._stop_watching.wait(interval):
+                self.reload()
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=_watch, name='knurld-config-watcher')
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop_watching.set()
+        self._watcher = None
+
+
+class LiveConfig(Mapping):
+    """ a mapping always reading from the latest snapshot of a Configuration, i.e. it follows the reloads
+    """
 
-                # Do the type checks and set appropriate types
-                self._config['TOKEN_EXPIRES'] = float(self._config['TOKEN_EXPIRES'])
+    def __init__(self, configuration):
+        self._configuration = configuration
 
-                # if the Token Expire time is greater than max allowable duration then reset it to max
-                if self._config['TOKEN_EXPIRES'] > self._max_expiration_time:
-                    self._config['TOKEN_EXPIRES'] = self._max_expiration_time
+    def __getitem__(self, key):
+        return self._configuration.config[key]
 
-        except ValueError as e:
-            print('Could not load the configuration! {}'.format(e))
+    def __iter__(self):
+        return iter(self._configuration.config)
 
-        return self._config
+    def __len__(self):
+        return len(self._configuration.config)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+from contextlib import contextmanager
+
+from knurld_sdk.polling import clock
+
+# Deadline the current thread works under, see current_deadline()
+_active = threading.local()
+
+
+class Deadline(object):
+    """ the point in time (monotonic clock) by which a flow must be done
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        """ seconds left, 0 once the deadline has passed
+        """
+        return max(0.0, self.expires - clock())
+
+    @property
+    def expired(self):
+        return self.expires <= clock()
+
+    def __repr__(self):
+        return 'Deadline({}s, remaining={:.3f}s)'.format(self.seconds, self.remaining())
+
+
+def current_deadline():
+    """ the Deadline of the budget the calling thread is in, None outside of a budget
+    """
+    return getattr(_active, 'deadline', None)
+
+
+@contextmanager
+def budget(seconds):
+    """ runs the enclosed block under a deadline of seconds from now: the calls it makes get the remaining time as
+    their timeout (see knurld_sdk.pipeline.send_with_session). Within an outer budget the earlier deadline applies.
+    Yields the Deadline, or None when seconds is None and there is no outer budget.
+    """
+    outer = current_deadline()
+    if seconds is None:
+        yield outer
+        return
+
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires < deadline.expires:
+        deadline = outer
+    _active.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _active.deadline = outer
+
+
+def remaining(default=None):
+    """ the time left in the current budget, at most default; default outside of a budget
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    if default is None:
+        return deadline.remaining()
+    return min(default, deadline.remaining())
@@ -6,6 +6,17 @@
 # license that can be found in the LICENSE file
 """
 
+import errno
+import json
+import logging
+import math
+import os
+import stat
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
 
 class DummyData(object):
 
@@ -160,7 +171,7 @@ def merge_intervals_with_phrases(vocabulary, repetitions, intervals):
         for interval, word in zip(intervals, words_per_interval):
             interval["phrase"] = word
     except ValueError as e:
-        print("Unmatched number of intervals vs phrases." + str(e))
+        log.error('Unmatched number of intervals vs phrases: %s', e)
 
     return intervals
 
@@ -182,3 +193,98 @@ def regx_pattern_id(count=32):
 def regx_pattern_url():
     # pattern that matches a typical url returned in the response json
     return r'https:.*'
+
+
+def parse_retry_after(value):
+    """ returns the number of seconds asked by a Retry-After header (delta-seconds or HTTP-date), None if invalid
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    # HTTP-dates are rare, email.utils is only imported when one shows up
+    from email.utils import mktime_tz, parsedate_tz
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+def response_retry_after(response):
+    """ the Retry-After delay (seconds) of a response, None if it has none
+    """
+    return parse_retry_after((getattr(response, 'headers', None) or {}).get('Retry-After'))
+
+
+def percentile(ordered_values, q):
+    """ nearest-rank q-quantile (0 <= q <= 1) of an already sorted list, None for an empty list
+    """
+    if not ordered_values:
+        return None
+    rank = int(math.ceil(q * len(ordered_values))) - 1
+    return ordered_values[min(max(rank, 0), len(ordered_values) - 1)]
+
+
+def _owned_by_user(st):
+    return not hasattr(os, 'getuid') or st.st_uid == os.getuid()
+
+
+def private_dir():
+    """ a directory of the temp directory that only the current user can access, created on first use, for the files
+    the processes of the user share (admin token, rate limit buckets); raises OSError when it exists but is not a
+    directory private to the user
+    """
+    user = str(os.getuid()) if hasattr(os, 'getuid') else os.environ.get('USERNAME', '')
+    path = os.path.join(tempfile.gettempdir(), 'knurld_sdk-' + user)
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or not _owned_by_user(st) or (hasattr(os, 'getuid') and st.st_mode & 0o077):
+        raise OSError('{} is not a directory private to the current user'.format(path))
+    return path
+
+
+def read_private_json(path):
+    """ the json content of a file written by write_private_json(), None when it is missing, unreadable or belongs to
+    another user
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except OSError:
+        return None
+    with os.fdopen(fd, 'r') as f:
+        if not _owned_by_user(os.fstat(fd)):
+            log.warning('Ignoring %s, it belongs to another user', path)
+            return None
+        try:
+            return json.load(f)
+        except ValueError:
+            return None
+
+
+def write_private_json(path, data):
+    """ replaces the file with the json of data, readable by the current user only; the content is written to a new
+    temporary file aside and renamed, so readers never see a partial file
+    """
+    directory, name = os.path.split(path)
+    fd, tmp = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory or '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def open_lock_file(path):
+    """ opens (creating it) the lock file of path, without following a symbolic link planted in its place
+    :return: the file descriptor, to flock and close
+    """
+    return os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
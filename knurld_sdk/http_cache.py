@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import hashlib
+import re
+import threading
+
+from knurld_sdk import metrics
+from knurld_sdk.cache import LRUCache
+from knurld_sdk.polling import clock
+
+DEFAULT_HTTP_CACHE_SIZE = 1000  # URLs whose responses are kept at most
+DEFAULT_HTTP_CACHE_TTL = 0      # seconds a response without validators is reused, 0 to never reuse it
+
+_max_age = re.compile(r'max-age=(\d+)')
+
+
+class CachedResponse(object):
+    """ a stored 200 response along with its validators
+    """
+
+    def __init__(self, response, ttl):
+        self.content = response.content
+        self.headers = dict(response.headers)
+        self.encoding = response.encoding
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        self.stored_at = clock()
+
+        # a max-age sent by the server wins over the configured ttl
+        match = _max_age.search(response.headers.get('Cache-Control', ''))
+        self.ttl = float(match.group(1)) if match else ttl
+
+    @property
+    def validated(self):
+        """ whether the server supports conditional requests for this resource
+        """
+        return bool(self.etag or self.last_modified)
+
+    @property
+    def fresh(self):
+        return self.ttl > 0 and clock() - self.stored_at < self.ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_response(self, url):
+        """ builds a requests.Response out of the stored one, flagged with from_cache
+        """
+        import requests
+        from requests.structures import CaseInsensitiveDict
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.content
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response.url = url
+        response.from_cache = True
+        return response
+
+
+def auth_scope(headers):
+    """ the part of the request headers selecting whose view of a resource is returned: the Developer-Id, i.e. the
+    application or, with a consumer token, the consumer. The admin token itself rotates and is left out
+    """
+    scope = (headers or {}).get('Developer-Id') or ''
+    return hashlib.sha1(scope.encode('utf-8')).hexdigest()
+
+
+class HTTPCache(object):
+    """
+    Response cache for the GET requests of a client, the 'cache' stage of its pipeline. A stored response carrying an
+    ETag or Last-Modified validator is revalidated with a conditional request on each read, so an unchanged resource
+    costs a 304 without a body; responses without validators are reused for ttl seconds, if ttl is set. Any other
+    request to a URL drops what is stored for it, for the resources under it and for the listings of its collection.
+    Entries are keyed by URL and auth scope, at most maxsize URLs are kept (LRU).
+    """
+
+    def __init__(self, maxsize=DEFAULT_HTTP_CACHE_SIZE, ttl=DEFAULT_HTTP_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = LRUCache(maxsize)    # url -> {auth scope: CachedResponse}
+        self._lock = threading.Lock()
+        self.fresh_hits = 0      # served without a request
+        self.revalidations = 0   # served after a 304
+        self.misses = 0          # full responses downloaded
+
+    @classmethod
+    def from_config(cls, config):
+        """ builds an HTTPCache from the HTTP_CACHE_* options of the given configuration
+        """
+        return cls(maxsize=int(config.get('HTTP_CACHE_SIZE', DEFAULT_HTTP_CACHE_SIZE)),
+                   ttl=float(config.get('HTTP_CACHE_TTL', DEFAULT_HTTP_CACHE_TTL)))
+
+    def lookup(self, url, headers):
+        """ returns the stored CachedResponse for the request, or None
+        """
+        scopes = self._entries.get(url)
+        return scopes.get(auth_scope(headers)) if scopes else None
+
+    def store(self, url, headers, response):
+        if response.status_code != 200 or 'no-store' in response.headers.get('Cache-Control', ''):
+            return
+        cached = CachedResponse(response, self.ttl)
+        if not cached.validated and cached.ttl <= 0:
+            return
+        with self._lock:
+            scopes = self._entries.get(url) or {}
+            scopes = dict(scopes, **{auth_scope(headers): cached})
+            self._entries.set(url, scopes)
+
+    def invalidate(self, url):
+        """ drops what is stored for the resource at url, for the resources under it and for the listings of its
+        collection, whatever their query string (e.g. GET /v1/consumers?offset=0 after a write to /v1/consumers/abc)
+        """
+        path = url.split('?')[0].rstrip('/')
+        collection = path.rsplit('/', 1)[0]
+        for key in self._entries.keys():
+            base = key.split('?')[0].rstrip('/')
+            if base in (path, collection) or base.startswith(path + '/'):
+                self._entries.delete(key)
+
+    def send(self, send, method, url, headers):
+        """ performs a request through the cache
+        :param send: callable(headers) sending the request with the given headers, returns a requests.Response
+        """
+        if method.upper() != 'GET':
+            response = send(headers)
+            self.invalidate(url)
+            return response
+
+        cached = self.lookup(url, headers)
+        if cached is not None and cached.fresh:
+            self.fresh_hits += 1
+            metrics.HTTP_CACHE_HITS.inc((metrics.endpoint(url), 'fresh'))
+            return cached.to_response(url)
+
+        if cached is not None and cached.validated:
+            response = send(dict(headers or {}, **cached.conditional_headers()))
+            if response.status_code == 304:
+                self.revalidations += 1
+                metrics.HTTP_CACHE_HITS.inc((metrics.endpoint(url), 'revalidated'))
+                cached.stored_at = clock()
+                return cached.to_response(url)
+        else:
+            response = send(headers)
+
+        self.misses += 1
+        self.store(url, headers, response)
+        return response
+
+    def __call__(self, call, send):
+        """ the 'cache' stage of a knurld_sdk.pipeline.Pipeline
+        """
+        def _send(headers):
+            call.headers = headers
+            return send(call)
+        return self.send(_send, call.method, call.url, call.headers)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'maxsize': self._entries.maxsize, 'evictions': self._entries.evictions,
+                'fresh_hits': self.fresh_hits, 'revalidations': self.revalidations, 'misses': self.misses}
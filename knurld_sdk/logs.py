@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import logging
+
+# every module logs to logging.getLogger(__name__) under 'knurld_sdk'; configure logging in the application to see
+# more than the warnings and errors, e.g. logging.basicConfig(level=logging.INFO)
+
+# request and response bodies are only logged through this logger, which stays at INFO even when the application
+# turns on DEBUG for the SDK: call trace_payloads() to log them
+PAYLOAD_LOGGER = 'knurld_sdk.payloads'
+payload_log = logging.getLogger(PAYLOAD_LOGGER)
+payload_log.setLevel(logging.INFO)
+
+
+def trace_payloads(enabled=True):
+    """ turns the logging of the response bodies (at DEBUG level, on the knurld_sdk.payloads logger) on or off
+    """
+    payload_log.setLevel(logging.DEBUG if enabled else logging.INFO)
+
+
+def _describe(response):
+    request = getattr(response, 'request', None)
+    return getattr(request, 'method', None) or 'request', getattr(response, 'url', None) or ''
+
+
+def log_response(response):
+    """ logs the status and the body of a response when payload tracing is on, costs a level check otherwise
+    """
+    if payload_log.isEnabledFor(logging.DEBUG):
+        method, url = _describe(response)
+        payload_log.debug('%s %s -> %s %s', method, url, response.status_code, response.content)
+
+
+def log_failure(log, response):
+    """ reports a response with an unexpected status on log, and its body when payload tracing is on
+    """
+    if log.isEnabledFor(logging.WARNING):
+        method, url = _describe(response)
+        log.warning('%s %s failed with status %s', method, url, response.status_code)
+    log_response(response)
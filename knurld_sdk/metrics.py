@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import re
+import threading
+import weakref
+from bisect import bisect_left
+
+try:
+    from urllib.parse import urlparse
+except ImportError:  # python 2
+    from urlparse import urlparse
+
+# upper bounds (seconds) of the request latency buckets
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# upper bounds of the polls per completed work order buckets
+DEFAULT_POLL_BUCKETS = (1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50)
+
+# path segments that identify a single resource, replaced by ':id' so that endpoints make a small set of labels
+_ID_SEGMENT = re.compile(r'^(?:[0-9a-fA-F]{16,}|[0-9]+)$')
+
+
+def endpoint(url):
+    """ the endpoint family of a url, e.g. '/v1/enrollments/:id' for any enrollment
+    """
+    path = urlparse(url).path
+    return '/'.join(':id' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/')) or '/'
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(n, _escape(v)) for n, v in zip(names, values)) + '}'
+
+
+class Counter(object):
+    """ a monotonically increasing count per combination of label values
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        """ :param labels: tuple of label values, in the order of labelnames
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        """ [(labels, value)] sorted by labels
+        """
+        with self._lock:
+            return sorted(self._values.items())
+
+    def to_dict(self):
+        return [{'labels': dict(zip(self.labelnames, labels)), 'value': value} for labels, value in self.samples()]
+
+    def to_prometheus(self):
+        return ['{}{} {}'.format(self.name, _labels_text(self.labelnames, labels), _format(value))
+                for labels, value in self.samples()]
+
+
+class Gauge(Counter):
+    """ a value that can go up and down, e.g. the size of a cache
+    """
+
+    type = 'gauge'
+
+    def set(self, labels=(), value=0):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(object):
+    """ counts observations into buckets per combination of label values, along with their count and sum
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}   # labels -> [count per bucket (the last one is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    def samples(self):
+        """ [(labels, {'buckets': [(upper bound, cumulative count)], 'count': n, 'sum': s})] sorted by labels
+        """
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        result = []
+        for labels, counts in values:
+            cumulative, total = [], 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                total += count
+                cumulative.append((bound, total))
+            result.append((labels, {'buckets': cumulative, 'count': total, 'sum': counts[-1]}))
+        return result
+
+    def to_dict(self):
+        return [{'labels': dict(zip(self.labelnames, labels)),
+                 'value': {'count': value['count'], 'sum': value['sum'],
+                           'buckets': dict((_format(bound), count) for bound, count in value['buckets'])}}
+                for labels, value in self.samples()]
+
+    def to_prometheus(self):
+        lines = []
+        for labels, value in self.samples():
+            for bound, count in value['buckets']:
+                lines.append('{}_bucket{} {}'.format(self.name, _labels_text(self.labelnames + ('le',),
+                                                                              labels + (_format(bound),)), count))
+            lines.append('{}_sum{} {}'.format(self.name, _labels_text(self.labelnames, labels), _format(value['sum'])))
+            lines.append('{}_count{} {}'.format(self.name, _labels_text(self.labelnames, labels), value['count']))
+        return lines
+
+
+class _CacheCollector(object):
+    """ reads the statistics of the tracked caches when the metrics are exported, so that cache lookups cost nothing
+    extra; caches are held weakly and several caches tracked under one name are summed. The sums drop when a cache
+    is collected or cleared, so they are all exported as gauges
+    """
+
+    def __init__(self):
+        self._caches = []
+        self._lock = threading.Lock()
+
+    def track(self, name, cache):
+        with self._lock:
+            self._caches.append((name, weakref.ref(cache)))
+
+    def collect(self):
+        metrics = [Gauge('knurld_cache_hits', 'Cache lookups answered from the live caches', ('cache',)),
+                   Gauge('knurld_cache_misses', 'Cache lookups of the live caches that had to fetch', ('cache',)),
+                   Gauge('knurld_cache_evictions', 'Entries the live caches dropped to make room', ('cache',)),
+                   Gauge('knurld_cache_size', 'Entries currently cached', ('cache',))]
+        with self._lock:
+            self._caches = [(name, ref) for name, ref in self._caches if ref() is not None]
+            caches = [(name, ref()) for name, ref in self._caches]
+
+        for name, cache in caches:
+            if cache is None:   # collected meanwhile
+                continue
+            stats = cache.stats()
+            # the http cache reports fresh hits and revalidated (304) hits apart
+            hits = stats.get('hits', stats.get('fresh_hits', 0) + stats.get('revalidations', 0))
+            for metric, value in zip(metrics, (hits, stats.get('misses', 0), stats.get('evictions', 0),
+                                               stats.get('size', 0))):
+                metric.inc((name,), value)
+        return metrics
+
+
+class MetricsRegistry(object):
+    """
+    Holds the SDK metrics and exports them as a Prometheus text snapshot or a dict. Recording a value is a dict
+    update under a per metric lock, cheap enough to stay on permanently, e.g. for a Prometheus scrape endpoint:
+
+        from knurld_sdk.metrics import registry
+        body = registry.to_prometheus()
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._caches = _CacheCollector()
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, labelnames=()):
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def track_cache(self, name, cache):
+        """ exports the hits, misses, evictions and size of cache (anything with a stats() dict) under name
+        """
+        self._caches.track(name, cache)
+
+    def collect(self):
+        return self._metrics + self._caches.collect()
+
+    def to_dict(self):
+        """ {metric name: [{'labels': {...}, 'value': counter value or histogram {'count', 'sum', 'buckets'}}]}
+        """
+        return dict((metric.name, metric.to_dict()) for metric in self.collect())
+
+    def to_prometheus(self):
+        """ the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        for metric in self.collect():
+            lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            lines.extend(metric.to_prometheus())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter('knurld_requests_total', 'API requests sent, by method, endpoint and status',
+                            ('method', 'endpoint', 'status'))
+REQUEST_SECONDS = registry.histogram('knurld_request_duration_seconds', 'API request latency',
+                                     ('method', 'endpoint'))
+TOKEN_RENEWALS = registry.counter('knurld_token_renewals_total', 'Admin token fetches by result', ('result',))
+POLLS = registry.histogram('knurld_polls_per_work_order', 'Status polls per completed work order', ('operation',),
+                           buckets=DEFAULT_POLL_BUCKETS)
+POLL_ERRORS = registry.counter('knurld_poll_errors_total', 'Work orders whose status polls ended with a non '
+                               'retryable error', ('operation',))
+UPLOADED_BYTES = registry.counter('knurld_uploaded_bytes_total', 'Bytes of audio uploaded')
+THROTTLED = registry.counter('knurld_throttled_responses_total', 'Throttling (429) responses by endpoint family',
+                             ('family',))
+RATE_LIMIT_WAITS = registry.histogram('knurld_rate_limit_wait_seconds', 'Time calls waited for the client side rate '
+                                      'limiter', ('family',))
+COALESCED = registry.counter('knurld_coalesced_requests_total', 'GET calls answered with the response of an '
+                             'identical request instead of being sent', ('endpoint',))
+HTTP_CACHE_HITS = registry.counter('knurld_http_cache_hits_total', 'GET calls answered by the HTTP cache, without a '
+                                   'request when fresh, after a 304 when revalidated', ('endpoint', 'kind'))
+CONCURRENCY_LIMIT = registry.gauge('knurld_concurrency_limit', 'Calls the adaptive concurrency limiter lets in flight')
+
+
+def record_request(method, url, status, seconds):
+    """ counts a request by endpoint and status ('error' when it raised) and observes its latency
+    """
+    labels = (method.upper(), endpoint(url))
+    REQUESTS.inc(labels + (str(status),))
+    REQUEST_SECONDS.observe(seconds, labels)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from knurld_sdk.CustomExceptions import PageFetchException
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_SCAN_WORKERS = 8
+
+
+def page_size_from_config(page_size=None, config=None):
+    """ returns page_size, or the PAGE_SIZE option of config (config.cfg by default) when not given
+    """
+    if page_size:
+        return int(page_size)
+    if config is None:
+        from knurld_sdk import app_globals as g
+        config = g.config
+    return int(config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE))
+
+
+def page_items(page, offset):
+    """ returns the 'items' of a get_all result, raises PageFetchException when the call failed
+    """
+    if not isinstance(page, dict):
+        raise PageFetchException('Could not fetch the page at offset {}: {}'.format(offset, page))
+    return page.get('items') or []
+
+
+def has_next_page(page, offset, page_size):
+    """ whether more items follow the given page of the listing: the 'total' of the page tells when it has one, as
+    the server may return fewer items than page_size (e.g. when it caps the limit); a short page ends the listing
+    otherwise
+    """
+    items = page.get('items') or []
+    total = page.get('total')
+    if total is not None:
+        return bool(items) and offset + len(items) < int(total)
+    return len(items) >= page_size
+
+
+def iter_pages(get_all, page_size=None, offset=0, prefetch=True):
+    """ walks a listing page by page, yielding the 'items' list of each page
+    :param get_all: the get_all(limit, offset) function of a resource class, e.g. Verification.get_all
+    :param page_size: items per request, defaults to the PAGE_SIZE config option
+    :param offset: offset of the first item
+    :param prefetch: fetch the next page in the background while the caller consumes the current one
+    """
+    page_size = page_size_from_config(page_size)
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        fetch = (lambda o: executor.submit(get_all, page_size, o)) if prefetch else (lambda o: get_all(page_size, o))
+        pending = fetch(offset)
+        while pending is not None:
+            page = pending.result() if prefetch else pending
+            items = page_items(page, offset)
+
+            pending = None
+            if has_next_page(page, offset, page_size):
+                pending = fetch(offset + len(items))
+
+            yield items
+            offset += len(items)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def iter_items(get_all, page_size=None, offset=0, prefetch=True):
+    """ walks a listing lazily, one item at a time; at most the current and the prefetched page are held in memory
+    """
+    for items in iter_pages(get_all, page_size=page_size, offset=offset, prefetch=prefetch):
+        for item in items:
+            yield item
+
+
+def _fetch_pages(get_all, page_size, offsets, workers, ordered):
+    """ fetches the pages at the given offsets on a pool of workers, yielding (offset, items) either in offset order
+    or as they arrive; at most 2 * workers pages are requested ahead of the consumer
+    """
+    offsets = iter(offsets)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    in_flight = deque() if ordered else set()
+    try:
+        def _submit():
+            for offset in offsets:
+                future = executor.submit(get_all, page_size, offset)
+                future.offset = offset
+                if ordered:
+                    in_flight.append(future)
+                else:
+                    in_flight.add(future)
+                return True
+            return False
+
+        while len(in_flight) < 2 * workers and _submit():
+            pass
+
+        while in_flight:
+            if ordered:
+                done = [in_flight.popleft()]
+            else:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.difference_update(done)
+            for future in done:
+                _submit()
+                yield future.offset, page_items(future.result(), future.offset)
+    finally:
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def scan(get_all, page_size=None, workers=DEFAULT_SCAN_WORKERS, ordered=True, dedup_key='href'):
+    """ walks a whole listing with concurrent requests: the total count read from the first page is split into
+    offset ranges the size of the first page, which are fetched on a pool of workers
+    :param get_all: the get_all(limit, offset) function of a resource class, e.g. Verification.get_all
+    :param page_size: items per request, defaults to the PAGE_SIZE config option
+    :param workers: number of pages fetched at the same time
+    :param ordered: yield the items in listing order; otherwise in the order the pages arrive, which never waits
+                    on a slow page
+    :param dedup_key: item field used to drop the duplicates seen when records shift between pages while the scan
+                      runs (the keys of all the items yielded so far are kept); None to disable
+    """
+    page_size = page_size_from_config(page_size)
+    seen = set()
+
+    def _new(items):
+        if dedup_key is None:
+            return items
+        fresh = [item for item in items if item.get(dedup_key) not in seen]
+        seen.update(item.get(dedup_key) for item in fresh)
+        return fresh
+
+    first = get_all(page_size, 0)
+    for item in _new(page_items(first, 0)):
+        yield item
+    if not has_next_page(first, 0, page_size):
+        return
+
+    if first.get('total') is None:
+        # nothing to partition, fall back to a sequential walk
+        for item in iter_items(get_all, page_size=page_size, offset=page_size):
+            if _new([item]):
+                yield item
+        return
+
+    # the server may cap the limit below page_size, the partitions follow the size of the pages it actually returns
+    total = int(first['total'])
+    step = len(page_items(first, 0))
+    end = step
+    last_page_full = True
+    for offset, items in _fetch_pages(get_all, step, range(step, total, step), workers, ordered):
+        count = len(items)
+        for item in _new(items):
+            yield item
+        if count < min(step, total - offset):
+            # a page shorter than the others would leave a gap before the next partition, its range is completed
+            # page by page
+            for items in _fill(get_all, step, offset + count, offset + step):
+                count += len(items)
+                for item in _new(items):
+                    yield item
+        if offset + step >= end:
+            end, last_page_full = offset + step, count == step
+
+    # records added while scanning push the listing past the total read at first
+    if last_page_full:
+        for items in iter_pages(get_all, page_size=step, offset=end, prefetch=False):
+            for item in _new(items):
+                yield item
+
+
+def _fill(get_all, page_size, start, stop):
+    """ yields the items of the offsets start to stop (excluded) of the listing, page by page, until a page is empty
+    """
+    offset = start
+    while offset < stop:
+        items = page_items(get_all(min(page_size, stop - offset), offset), offset)[:stop - offset]
+        if not items:
+            return
+        yield items
+        offset += len(items)
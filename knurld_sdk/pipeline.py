@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import logging
+import threading
+import time
+
+from knurld_sdk import helpers as h
+from knurld_sdk import metrics
+from knurld_sdk.coalesce import RequestCoalescer
+from knurld_sdk.concurrency import AdaptiveLimiter
+from knurld_sdk.CustomExceptions import DeadlineExceeded
+from knurld_sdk.http_cache import HTTPCache
+from knurld_sdk.polling import RETRYABLE_STATUS_CODES, clock
+from knurld_sdk.timeline import current_span
+
+log = logging.getLogger(__name__)
+
+# defaults used when the corresponding HTTP_RETRY* options are missing from config.cfg
+DEFAULT_RETRIES = 0             # extra attempts of an idempotent call after a dropped connection or a 429 / 5xx
+DEFAULT_RETRY_BACKOFF = 0.5     # seconds before the first retry, doubled for every further one
+DEFAULT_RETRY_MAX_DELAY = 10.0  # upper bound of a single wait, Retry-After hints included
+
+# methods that can be sent again without changing their effect; updates are POSTs and are never repeated
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class Call(object):
+    """ one API call on its way through the pipeline, any stage may change its fields
+    """
+
+    __slots__ = ('method', 'url', 'client', 'json', 'headers', 'attempt', 'deadline')
+
+    def __init__(self, method, url, client, json=None, headers=None, deadline=None):
+        """
+        :param method: upper case HTTP method
+        :param client: the KnurldClient the call is made for
+        :param json: request body, None for none
+        :param headers: request headers, None to have the auth stage add the admin token headers
+        :param deadline: knurld_sdk.deadline.Deadline the call must be done by, None to use the session's timeouts
+        """
+        self.method = method
+        self.url = url
+        self.client = client
+        self.json = json
+        self.headers = headers
+        self.attempt = 1
+        self.deadline = deadline
+
+    def __repr__(self):
+        return 'Call({!r}, {!r}, attempt={})'.format(self.method, self.url, self.attempt)
+
+
+def auth(call, send):
+    """ adds the headers of the client's admin token, unless the call brings its own
+    """
+    if call.headers is None:
+        try:
+            call.headers = call.client.headers()
+        except Exception as e:
+            log.error('Could not obtain Authorization header: %s', e)
+    return send(call)
+
+
+def trace(call, send):
+    """ when the thread is in a stage of a flow timeline (see knurld_sdk.timeline), propagates its span as a W3C
+    traceparent header and records the request on it
+    """
+    active = current_span()
+    if active is None:
+        return send(call)
+
+    timeline, span = active
+    # the prebuilt token headers are shared, never modify them in place
+    call.headers = dict(call.headers or {}, traceparent='00-{}-{}-01'.format(timeline.trace_id, span.span_id))
+    span.attributes['http.method'] = call.method
+    response = send(call)
+    span.attributes['http.status_code'] = response.status_code
+    return response
+
+
+def measure(call, send):
+    """ counts the request by endpoint and status ('error' when it raised) and observes its latency
+    """
+    start = clock()
+    status = 'error'
+    try:
+        response = send(call)
+        status = response.status_code
+        return response
+    finally:
+        metrics.record_request(call.method, call.url, status, clock() - start)
+
+
+class Retry(object):
+    """ sends an idempotent call again after a dropped connection or a retryable error status (429, 5xx), waiting
+    for the Retry-After delay when the server gives one and an exponential backoff otherwise
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_RETRY_BACKOFF, max_delay=DEFAULT_RETRY_MAX_DELAY,
+                 sleep=time.sleep):
+        """
+        :param retries: attempts made after the first one, 0 disables retrying
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """ builds a Retry stage from the HTTP_RETRY* options of the given configuration
+        """
+        return cls(retries=int(config.get('HTTP_RETRIES', DEFAULT_RETRIES)),
+                   backoff=float(config.get('HTTP_RETRY_BACKOFF', DEFAULT_RETRY_BACKOFF)),
+                   max_delay=float(config.get('HTTP_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)),
+                   **kwargs)
+
+    def delay(self, attempt, hint=None):
+        """ seconds to wait before attempt number attempt + 1, or the server's hint when it gave one
+        """
+        if hint is None:
+            hint = self.backoff * (2 ** (attempt - 1))
+        return min(hint, self.max_delay)
+
+    def _can_retry(self, call, delay):
+        """ whether the call has attempts left and, under a deadline, the time to wait delay and make another one
+        """
+        if call.attempt > self.retries:
+            return False
+        return call.deadline is None or delay < call.deadline.remaining()
+
+    def __call__(self, call, send):
+        if not self.retries or call.method not in IDEMPOTENT_METHODS:
+            return send(call)
+
+        while True:
+            try:
+                response = send(call)
+            except IOError as e:    # requests' connection errors and timeouts are IOErrors
+                delay = self.delay(call.attempt)
+                if not self._can_retry(call, delay):
+                    raise
+                reason = e
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                delay = self.delay(call.attempt, h.response_retry_after(response))
+                if not self._can_retry(call, delay):
+                    return response
+                reason = response.status_code
+
+            log.info('Retrying %s %s in %.2fs (attempt %d failed: %s)', call.method, call.url, delay, call.attempt,
+                     reason)
+            self._sleep(delay)
+            call.attempt += 1
+
+
+def send_with_session(call):
+    """ the end of the pipeline: sends the call with the client's session, with the time left before its deadline
+    as connect and read timeout
+    """
+    send = getattr(call.client.session, call.method.lower())
+    kwargs = {'headers': call.headers}
+    if call.json is not None:
+        kwargs['json'] = call.json
+    if call.deadline is not None:
+        timeout = call.deadline.remaining()
+        if timeout <= 0:
+            raise DeadlineExceeded('{} {} not sent, its deadline has passed'.format(call.method, call.url))
+        kwargs['timeout'] = timeout
+    return send(call.url, **kwargs)
+
+
+def _bind(stage, send):
+    return lambda call: stage(call, send)
+
+
+class Pipeline(object):
+    """
+    The chain of stages every call of the resource classes goes through. A stage is a callable(call, send) that gets
+    a Call, passes it on with send(call) and returns the response, so it can change the call, answer it itself, repeat
+    it or look at the response, e.g.
+
+        def tenant(call, send):
+            call.headers = dict(call.headers or {}, **{'X-Tenant': 'acme'})
+            return send(call)
+
+        client.pipeline.add('tenant', tenant, after='auth')
+
+    The default stages are, in order, 'auth' (admin token headers), 'retry' (HTTP_RETRIES), 'ratelimit' (RATE_LIMITS,
+    see knurld_sdk.ratelimit), 'concurrency' (CONCURRENCY_ADAPTIVE, see knurld_sdk.concurrency), 'trace' (timeline
+    spans), 'coalesce' (identical concurrent GETs share one request, see knurld_sdk.coalesce), 'cache' (HTTP cache,
+    HTTP_CACHE_ENABLED) and 'metrics' (request counts and latencies, for the requests actually sent). After the last
+    stage the call is sent by the client's session.
+    The chain is composed whenever the stages change, a call pays one function call per stage.
+    """
+
+    def __init__(self, stages=(), transport=send_with_session):
+        """
+        :param stages: [(name, stage)] in the order the calls go through them
+        :param transport: callable(call) sending the call at the end of the chain
+        """
+        self._stages = list(stages)
+        self._transport = transport
+        self._lock = threading.Lock()
+        self._send = self._compose()
+
+    @classmethod
+    def from_config(cls, config, rate_limiter=None, **kwargs):
+        """ the default pipeline of a client with the given configuration
+        :param rate_limiter: knurld_sdk.ratelimit.RateLimiter pacing every attempt of a call, if it has limits
+        """
+        stages = [('auth', auth), ('retry', Retry.from_config(config))]
+        if rate_limiter is not None and rate_limiter.enabled:
+            stages.append(('ratelimit', rate_limiter))
+        if config.get('CONCURRENCY_ADAPTIVE'):
+            stages.append(('concurrency', AdaptiveLimiter.from_config(config)))
+        stages.append(('trace', trace))
+        if config.get('HTTP_COALESCE_ENABLED', True):
+            stages.append(('coalesce', RequestCoalescer.from_config(config)))
+        if config.get('HTTP_CACHE_ENABLED'):
+            cache = HTTPCache.from_config(config)
+            metrics.registry.track_cache('http', cache)
+            stages.append(('cache', cache))
+        stages.append(('metrics', measure))
+        return cls(stages, **kwargs)
+
+    def _compose(self):
+        send = self._transport
+        for _, stage in reversed(self._stages):
+            send = _bind(stage, send)
+        return send
+
+    def names(self):
+        return [name for name, _ in self._stages]
+
+    def get(self, name):
+        """ the stage registered under name, None if there is none
+        """
+        return dict(self._stages).get(name)
+
+    def add(self, name, stage, before=None, after=None):
+        """ inserts a stage, by default as the last one before the call is sent
+        :param before: name of the stage the new one goes in front of
+        :param after: name of the stage the new one follows
+        """
+        with self._lock:
+            names = self.names()
+            if name in names:
+                raise ValueError('pipeline stage {!r} already exists'.format(name))
+            if before is not None:
+                index = names.index(before)
+            elif after is not None:
+                index = names.index(after) + 1
+            else:
+                index = len(names)
+            self._stages.insert(index, (name, stage))
+            self._send = self._compose()
+
+    def replace(self, name, stage):
+        with self._lock:
+            index = self.names().index(name)
+            self._stages[index] = (name, stage)
+            self._send = self._compose()
+
+    def remove(self, name):
+        with self._lock:
+            index = self.names().index(name)
+            del self._stages[index]
+            self._send = self._compose()
+
+    def send(self, call):
+        """ runs the call through the stages and returns the response
+        """
+        return self._send(call)
+
+    def __repr__(self):
+        return 'Pipeline({})'.format(' -> '.join(self.names() + ['session']))
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+from knurld_sdk import metrics as sdk_metrics
+
+# monotonic clock where available (py3), wall clock otherwise
+clock = getattr(time, 'monotonic', time.time)
+
+# defaults used when the corresponding POLL_* options are missing from config.cfg
+DEFAULT_INITIAL_DELAY = 0.25    # seconds before the first poll when nothing has been observed yet
+DEFAULT_MAX_DELAY = 5.0         # upper bound of a single backoff step
+DEFAULT_BACKOFF_FACTOR = 2.0
+DEFAULT_JITTER = 0.5            # fraction of each delay that is randomized
+DEFAULT_FIRST_POLL_QUANTILE = 0.5
+
+# the states after which a work order (enrollment, verification, analysis task) does not change anymore
+FINAL_STATUSES = (u'completed', u'failed')
+
+# error responses after which a status poll is worth repeating
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# how a poll loop ended, see PollMetrics.outcome
+OUTCOME_FINAL = 'final'         # the work order reached one of FINAL_STATUSES
+OUTCOME_ERROR = 'error'         # a status call failed with a non retryable error
+OUTCOME_TIMEOUT = 'timeout'     # the time budget ran out first
+
+
+def work_order_done(status_key='status'):
+    """ returns a predicate telling whether a polled result needs no further polling: either the work order reached
+    one of FINAL_STATUSES or the call failed with a non retryable error
+    :param status_key: 'status' for enrollments and verifications, 'taskStatus' for endpoint analysis
+    """
+
+    def is_done(result):
+        if isinstance(result, dict):
+            return result.get(status_key) in FINAL_STATUSES
+        if isinstance(result, tuple) and result:
+            return result[0] not in RETRYABLE_STATUS_CODES
+        # None: the call raised (e.g. a dropped connection), worth another attempt
+        return False
+
+    return is_done
+
+
+class CompletionStats(object):
+    """ keeps a bounded window of observed completion times per operation type (e.g. 'enrollment'), used to pick
+    the first poll delay of the next operation of the same type
+    """
+
+    def __init__(self, window=200):
+        self._window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, seconds):
+        with self._lock:
+            samples = self._samples.get(operation)
+            if samples is None:
+                samples = self._samples[operation] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def quantile(self, operation, q):
+        """ returns the q-quantile (0 <= q <= 1) of the observed completion times, None if nothing was observed
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(operation, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class PollMetrics(object):
+    """ per invocation record of a Poller.poll call
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.polls = []         # one dict per poll: delay slept before it, latency of the call, hint used
+        self.outcome = None     # OUTCOME_FINAL, OUTCOME_ERROR or OUTCOME_TIMEOUT once the loop is over
+        self.elapsed = 0.0
+
+    @property
+    def completed(self):
+        """ whether the work order reached its final status
+        """
+        return self.outcome == OUTCOME_FINAL
+
+    @property
+    def count(self):
+        return len(self.polls)
+
+    @property
+    def hinted(self):
+        return len([p for p in self.polls if p['hinted']])
+
+    def record(self, delay, latency, hinted):
+        self.polls.append({'delay': delay, 'latency': latency, 'hinted': hinted})
+
+    def __repr__(self):
+        return 'PollMetrics(operation={!r}, polls={}, outcome={}, elapsed={:.3f})'.format(
+            self.operation, self.count, self.outcome, self.elapsed)
+
+
+class Poller(object):
+    """
+    Repeats a status call with exponential backoff and jitter until the result is final. The first poll is delayed
+    by the typical completion time observed so far for the same operation type, and a retry hint from the server
+    (e.g. a Retry-After header) overrides the computed backoff step
+    """
+
+    def __init__(self, initial_delay=DEFAULT_INITIAL_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 factor=DEFAULT_BACKOFF_FACTOR, jitter=DEFAULT_JITTER, first_poll_quantile=DEFAULT_FIRST_POLL_QUANTILE,
+                 stats=None, sleep=time.sleep):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.jitter = jitter
+        self.first_poll_quantile = first_poll_quantile
+        self.stats = stats if stats is not None else CompletionStats()
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """ builds a Poller from the POLL_* options of the given configuration
+        """
+        return cls(initial_delay=float(config.get('POLL_INITIAL_DELAY', DEFAULT_INITIAL_DELAY)),
+                   max_delay=float(config.get('POLL_MAX_DELAY', DEFAULT_MAX_DELAY)),
+                   factor=float(config.get('POLL_BACKOFF_FACTOR', DEFAULT_BACKOFF_FACTOR)),
+                   jitter=float(config.get('POLL_JITTER', DEFAULT_JITTER)),
+                   **kwargs)
+
+    def _jittered(self, delay):
+        return delay * (1 - self.jitter * random.random())
+
+    def first_delay(self, operation):
+        """ delay before the first poll: the typical completion time of this operation type if known
+        """
+        observed = self.stats.quantile(operation, self.first_poll_quantile)
+        if observed is None:
+            return self.initial_delay
+        return min(max(observed, self.initial_delay), self.max_delay)
+
+    def next_delay(self, attempt, hint=None):
+        """ delay before poll number attempt + 1 (attempt counts from 0), or the server's hint when it gave one
+        """
+        if hint is not None:
+            return hint
+        return self._jittered(min(self.max_delay, self.initial_delay * (self.factor ** attempt)))
+
+    def done(self, operation, result, elapsed, polls):
+        """ records a poll loop that ended with is_done(result): the completion time and the number of polls of a
+        work order that reached its final status (a dict result), an error otherwise, which must not skew the
+        completion times the first poll delay is picked from
+        :return: OUTCOME_FINAL or OUTCOME_ERROR
+        """
+        if isinstance(result, dict):
+            self.stats.record(operation, elapsed)
+            sdk_metrics.POLLS.observe(polls, (operation,))
+            return OUTCOME_FINAL
+        sdk_metrics.POLL_ERRORS.inc((operation,))
+        return OUTCOME_ERROR
+
+    def delays(self, metrics, is_done, timeout=None, retry_hint=None):
+        """ the poll schedule of metrics.operation, shared by poll() and its asyncio counterpart: yields the delay to
+        wait before each fetch and must be sent (result, latency) of that fetch; yields None once is_done(result) or
+        once the timeout ran out, leaving the outcome and the elapsed time in metrics
+        """
+        operation = metrics.operation
+        start = clock()
+        deadline = start + timeout if timeout is not None else None
+
+        delay = self.first_delay(operation)
+        hinted = False
+        attempt = 0
+        while True:
+            if deadline is not None:
+                remaining = deadline - clock()
+                if remaining <= 0:
+                    metrics.outcome = OUTCOME_TIMEOUT
+                    break
+                delay = min(delay, remaining)
+
+            result, latency = yield delay
+            metrics.record(delay, latency, hinted)
+
+            if is_done(result):
+                metrics.outcome = self.done(operation, result, clock() - start, metrics.count)
+                break
+
+            hint = retry_hint() if retry_hint else None
+            hinted = hint is not None
+            delay = self.next_delay(attempt, hint)
+            attempt += 1
+
+        metrics.elapsed = clock() - start
+        yield None
+
+    def poll(self, fetch, is_done, operation='default', timeout=None, retry_hint=None):
+        """ calls fetch() until is_done(result) or until timeout seconds have passed
+        :param fetch: callable returning the current state of the operation
+        :param is_done: predicate on the result of fetch(), e.g. work_order_done()
+        :param operation: operation type, completion times are tracked per type
+        :param timeout: overall time budget in seconds, None to poll until done
+        :param retry_hint: callable returning the delay (seconds) asked by the server for the last call, or None
+        :return: (last result, PollMetrics)
+        """
+        metrics = PollMetrics(operation)
+        schedule = self.delays(metrics, is_done, timeout, retry_hint)
+
+        result = None
+        delay = next(schedule)
+        while delay is not None:
+            self._sleep(delay)
+            call_start = clock()
+            result = fetch()
+            delay = schedule.send((result, clock() - call_start))
+        return result, metrics
+
+
+_default_poller = None
+_default_poller_lock = threading.Lock()
+
+
+def default_poller():
+    """ returns the process wide Poller configured from config.cfg, shared so that completion times observed by
+    one flow improve the first poll delay of the next
+    """
+    global _default_poller
+
+    if _default_poller is None:
+        with _default_poller_lock:
+            if _default_poller is None:
+                from knurld_sdk import app_globals as g
+                _default_poller = Poller.from_config(g.config)
+    return _default_poller
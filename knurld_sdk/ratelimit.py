@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the file store then only locks within the process
+    fcntl = None
+
+from knurld_sdk import helpers as h
+from knurld_sdk import metrics
+from knurld_sdk.CustomExceptions import DeadlineExceeded
+from knurld_sdk.polling import clock
+
+log = logging.getLogger(__name__)
+
+# defaults used when the corresponding RATE_LIMIT_* options are missing from config.cfg
+DEFAULT_BURST = 1.0             # seconds worth of requests a family may send at once after being idle
+DEFAULT_DECREASE = 0.5          # factor applied to the rate of a family on each throttling response
+DEFAULT_RECOVERY = 0.05         # fraction of the configured rate won back on each successful response
+DEFAULT_MIN_RATE = 0.1          # requests per second a throttled family is never slowed down below
+DEFAULT_THROTTLE_DELAY = 1.0    # seconds a family pauses after a throttling response without Retry-After
+
+# the endpoint families the limits are configured for
+FAMILIES = ('app-models', 'consumers', 'enrollments', 'verifications', 'endpointAnalysis', 'oauth')
+
+# responses telling the client to slow down
+THROTTLING_STATUS_CODES = (429,)
+
+_FAMILY = re.compile(r'/v1/([^/?#]+)')
+
+
+def endpoint_family(url):
+    """ the family a url belongs to, e.g. 'enrollments' for any enrollment url and 'oauth' for the token endpoint
+    """
+    if '/oauth/' in url:
+        return 'oauth'
+    match = _FAMILY.search(url)
+    return match.group(1) if match else 'other'
+
+
+class MemoryBucketStore(object):
+    """
+    Keeps the buckets in the process, shared by its threads. A bucket store holds the state dict of every family;
+    update(family, change) calls change(state, now) with the lock held, stores the state it modified in place and
+    returns what change returned.
+    """
+
+    now = staticmethod(clock)
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, family, change):
+        with self._lock:
+            state = self._states.setdefault(family, {})
+            return change(state, self.now())
+
+
+class FileBucketStore(object):
+    """
+    Shares the buckets between the processes of a host through a json file, read and rewritten under an flock on a
+    sibling '.lock' file; times are taken from the wall clock, the one clock all the processes agree on. Like the
+    FileTokenStore, the file is only readable by its owner and a file belonging to another user is ignored.
+    """
+
+    now = staticmethod(time.time)
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            fd = h.open_lock_file(self.lock_path)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)    # releases the flock
+
+    def update(self, family, change):
+        with self._locked():
+            states = h.read_private_json(self.path)
+            if not isinstance(states, dict):
+                states = {}
+            state = states.setdefault(family, {})
+            result = change(state, self.now())
+            h.write_private_json(self.path, states)
+            return result
+
+
+class Limit(object):
+    """ the configured rate (requests per second) and burst of a family
+    """
+
+    def __init__(self, rate, burst=DEFAULT_BURST):
+        self.rate = float(rate)
+        self.burst = burst
+
+    def capacity(self, rate):
+        return max(1.0, rate * self.burst)
+
+
+class RateLimiter(object):
+    """
+    Client side token buckets, one per endpoint family, so that bulk jobs stay under the rate limits of the service
+    instead of running into 429s. acquire() takes a token from the bucket of a call's family, waiting for it when the
+    bucket is empty; the calls reserve their tokens in turn, so waiting threads are served in order.
+
+    The rates adapt to the responses: a throttling response (429) divides the rate of its family by 1 / decrease and
+    pauses the family for the Retry-After delay, and every successful response wins back a fraction of the configured
+    rate. A family without a configured rate is not limited, but still pauses after a throttling response.
+    """
+
+    def __init__(self, limits=None, store=None, decrease=DEFAULT_DECREASE, recovery=DEFAULT_RECOVERY,
+                 min_rate=DEFAULT_MIN_RATE, sleep=time.sleep):
+        """
+        :param limits: {family: Limit}, the key None holds the limit of the families that are not listed
+        :param store: where the buckets are kept, a MemoryBucketStore by default
+        """
+        self.limits = dict(limits or {})
+        self.store = store if store is not None else MemoryBucketStore()
+        self.decrease = decrease
+        self.recovery = recovery
+        self.min_rate = min_rate
+        self._sleep = sleep
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """ builds a RateLimiter from the RATE_LIMIT* options: RATE_LIMITS maps endpoint families to requests per
+        second, RATE_LIMIT_DEFAULT applies to the other families and RATE_LIMIT_BACKEND 'file' shares the buckets
+        between the processes of the host through RATE_LIMIT_PATH
+        """
+        burst = float(config.get('RATE_LIMIT_BURST', DEFAULT_BURST))
+        limits = dict((family, Limit(rate, burst)) for family, rate in (config.get('RATE_LIMITS') or {}).items())
+        if config.get('RATE_LIMIT_DEFAULT'):
+            limits[None] = Limit(config['RATE_LIMIT_DEFAULT'], burst)
+
+        store = None
+        if config.get('RATE_LIMIT_BACKEND') == 'file':
+            path = config.get('RATE_LIMIT_PATH')
+            if not path:
+                key = hashlib.sha1(str(config.get('CLIENT_ID', '')).encode('utf-8')).hexdigest()[:16]
+                path = os.path.join(h.private_dir(), 'ratelimit_{}.json'.format(key))
+            store = FileBucketStore(path)
+
+        return cls(limits, store=store, decrease=float(config.get('RATE_LIMIT_DECREASE', DEFAULT_DECREASE)),
+                   recovery=float(config.get('RATE_LIMIT_RECOVERY', DEFAULT_RECOVERY)),
+                   min_rate=float(config.get('RATE_LIMIT_MIN_RATE', DEFAULT_MIN_RATE)), **kwargs)
+
+    @property
+    def enabled(self):
+        return bool(self.limits)
+
+    def limit(self, family):
+        return self.limits.get(family, self.limits.get(None))
+
+    def _reserve(self, limit, budget=None):
+        def change(state, now):
+            wait = max(0.0, state.get('paused_until', 0.0) - now)
+            if limit is None:
+                return wait
+            rate = state.get('rate', limit.rate)
+            elapsed = max(0.0, now - state.get('stamp', now))
+            tokens = min(limit.capacity(rate), state.get('tokens', limit.capacity(rate)) + elapsed * rate) - 1
+            wait = max(wait, -tokens / rate)
+            if budget is not None and wait > budget:
+                # the caller gives up, the token is left to the next calls
+                return wait
+            state.update(tokens=tokens, stamp=now, rate=rate)
+            return wait
+        return change
+
+    def acquire(self, family, deadline=None):
+        """ takes a token of the family, sleeping until it is available
+        :param deadline: knurld_sdk.deadline.Deadline of the call; DeadlineExceeded is raised, without taking a
+                         token, when the token would only be available after it
+        :return: seconds waited
+        """
+        budget = deadline.remaining() if deadline is not None else None
+        wait = self.store.update(family, self._reserve(self.limit(family), budget))
+        if budget is not None and wait > budget:
+            raise DeadlineExceeded('{} calls are paced for {:.3f}s, past the deadline'.format(family, wait))
+        if wait > 0:
+            metrics.RATE_LIMIT_WAITS.observe(wait, (family,))
+            self._sleep(wait)
+        return wait
+
+    def feedback(self, family, status_code, retry_after=None):
+        """ adapts the rate of the family to a response
+        :param retry_after: seconds the server asked to wait, if it said so
+        """
+        limit = self.limit(family)
+        throttled = status_code in THROTTLING_STATUS_CODES
+        if not throttled and (limit is None or not self.recovery):
+            return
+
+        def change(state, now):
+            if not throttled:
+                if state.get('rate', limit.rate) < limit.rate:
+                    state['rate'] = min(limit.rate, state['rate'] + limit.rate * self.recovery)
+                return
+            delay = retry_after if retry_after is not None else DEFAULT_THROTTLE_DELAY
+            state['paused_until'] = max(state.get('paused_until', 0.0), now + delay)
+            if limit is not None:
+                state['rate'] = max(self.min_rate, state.get('rate', limit.rate) * self.decrease)
+                state['tokens'] = min(state.get('tokens', 0.0), 0.0)
+            log.info('Throttled on %s, pausing it for %.2fs at %s requests/s', family, delay, state.get('rate'))
+
+        self.store.update(family, change)
+        if throttled:
+            metrics.THROTTLED.inc((family,))
+
+    def rate(self, family):
+        """ the current rate of the family, None if it is not limited
+        """
+        limit = self.limit(family)
+        if limit is None:
+            return None
+        return self.store.update(family, lambda state, now: state.get('rate', limit.rate))
+
+    def __call__(self, call, send):
+        """ the 'ratelimit' stage of a knurld_sdk.pipeline.Pipeline
+        """
+        family = endpoint_family(call.url)
+        self.acquire(family, call.deadline)
+        response = send(call)
+        self.feedback(family, response.status_code, h.response_retry_after(response))
+        return response
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+
+from knurld_sdk import helpers as h
+
+# defaults used when the corresponding HTTP_* options are missing from config.cfg
+DEFAULT_POOL_CONNECTIONS = 10   # number of distinct hosts we keep a connection pool for
+DEFAULT_POOL_MAXSIZE = 20       # number of keep-alive connections kept per host
+DEFAULT_POOL_BLOCK = False      # when True, never open more than HTTP_POOL_MAXSIZE connections to a host
+DEFAULT_CONNECT_TIMEOUT = 3.05  # seconds
+DEFAULT_READ_TIMEOUT = 30       # seconds
+
+# last Retry-After hint received by the current thread, see retry_after_hint()
+_hints = threading.local()
+
+
+def record_retry_after(response, *args, **kwargs):
+    """ response hook of the KnurldSession, keeps the Retry-After hint of the response for the calling thread
+    """
+    _hints.retry_after = h.parse_retry_after(response.headers.get('Retry-After'))
+
+
+def retry_after_hint():
+    """ returns the delay (seconds) the server asked for in the last response received by the calling thread,
+    None if it did not send a Retry-After header
+    """
+    return getattr(_hints, 'retry_after', None)
+
+
+def session_options(config):
+    """ builds the KnurldSession keyword arguments from the HTTP_* options of the given configuration
+    """
+    return {
+        'pool_connections': int(config.get('HTTP_POOL_CONNECTIONS', DEFAULT_POOL_CONNECTIONS)),
+        'pool_maxsize': int(config.get('HTTP_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE)),
+        'pool_block': bool(config.get('HTTP_POOL_BLOCK', DEFAULT_POOL_BLOCK)),
+        'timeout': (float(config.get('HTTP_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+                    float(config.get('HTTP_READ_TIMEOUT', DEFAULT_READ_TIMEOUT))),
+    }
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """ returns the process wide KnurldSession, creating it on first use
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                # requests is only imported once the first call is made
+                from knurld_sdk import app_globals as g
+                from knurld_sdk.transport import KnurldSession
+                _session = KnurldSession(**session_options(g.config))
+    return _session
+
+
+def reset_session():
+    """ closes the shared session, e.g. after a fork or a change of the HTTP_* options;
+    the next get_session() call builds a fresh one
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import json
+
+from knurld_sdk.client import KnurldClient
+from knurld_sdk.tokens import AccessToken, TokenManager
+
+API = 'https://api.knurld.io'
+
+CONFIG = {'CLIENT_ID': 'id', 'CLIENT_SECRET': 'secret', 'DEVELOPER_ID': 'Bearer: developer', 'TOKEN_EXPIRES': 3599,
+          'REATTEMPT_CALLS_FOR': 5, 'URL_HOST': 'api.knurld.io',
+          'URL_ACCESS_TOKEN': API + '/oauth/client_credential/accesstoken',
+          'URL_APP_MODELS': API + '/v1/app-models',
+          'URL_CONSUMERS': API + '/v1/consumers',
+          'URL_ENROLLMENTS': API + '/v1/enrollments',
+          'URL_VERIFICATIONS': API + '/v1/verifications',
+          'URL_ANALYSIS': API + '/v1/endpointAnalysis/url'}
+
+
+class FakeResponse(object):
+    """ stands in for a requests.Response; body is sent as json unless the raw content is given
+    """
+
+    def __init__(self, status_code, body=None, headers=None, content=None, url=None):
+        self.status_code = status_code
+        self.content = content if content is not None else json.dumps(body)
+        self.headers = headers or {}
+        self.encoding = 'utf-8'
+        self.url = url
+
+
+class FakeSession(object):
+    """ stands in for a KnurldSession: records the requests as (method, url, headers), their other keyword arguments
+    in options, and answers them with respond(), by default with the given responses in turn
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.options = []
+        self.closed = False
+
+    def respond(self, method, url, **kwargs):
+        return self.responses.pop(0)
+
+    def _request(self, method, url, headers=None, **kwargs):
+        self.requests.append((method, url, headers))
+        self.options.append(kwargs)
+        return self.respond(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self._request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._request('POST', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._request('DELETE', url, **kwargs)
+
+    def close(self):
+        self.closed = True
+
+
+def static_token_manager(config=CONFIG, token='token'):
+    """ a TokenManager whose token never expires, so that no oauth request is made
+    """
+    return TokenManager(config=config, fetch=lambda config: AccessToken(token, 0, 1e10))
+
+
+def make_client(session, config=CONFIG, **kwargs):
+    """ a KnurldClient sending its calls to session, with a static admin token unless token_manager is given
+    """
+    kwargs.setdefault('token_manager', static_token_manager(config))
+    return KnurldClient(config=config, session=session, **kwargs)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from aiohttp import web
+
+from knurld_sdk import helpers as h
+from knurld_sdk.aio import AsyncClient, AsyncAppModel, AsyncEnrollment, AsyncVerification
+from knurld_sdk.polling import Poller
+from knurld_sdk.tests.fakes import CONFIG
+from knurld_sdk.token_stores import FileTokenStore
+from knurld_sdk.tokens import AccessToken, TokenManager
+
+
+class StandInServer(object):
+    """ a local stand-in for the knurld API: work orders complete after a couple of status polls
+    """
+
+    polls_until_complete = 2
+
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after      # Retry-After header of the pending work order statuses
+        self.token_requests = 0
+        self.polls = {}
+        self.app = web.Application()
+        self.app.router.add_post('/oauth/client_credential/accesstoken', self.access_token)
+        self.app.router.add_get('/v1/app-models/{id}', self.get_app_model)
+        self.app.router.add_post('/v1/{resource}', self.create)
+        self.app.router.add_post('/v1/{resource}/{id}', self.update)
+        self.app.router.add_get('/v1/{resource}/{id}', self.get)
+        self.runner = None
+        self.base_url = None
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = 'http://127.0.0.1:' + str(port)
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    @property
+    def config(self):
+        return {
+            'URL_HOST': '127.0.0.1',
+            'URL_ACCESS_TOKEN': self.base_url + '/oauth/client_credential/accesstoken',
+            'URL_APP_MODELS': self.base_url + '/v1/app-models',
+            'URL_ENROLLMENTS': self.base_url + '/v1/enrollments',
+            'URL_VERIFICATIONS': self.base_url + '/v1/verifications',
+            'CLIENT_ID': 'client',
+            'CLIENT_SECRET': 'secret',
+            'DEVELOPER_ID': 'Bearer: developer',
+            'TOKEN_EXPIRES': 3599,
+            'REATTEMPT_CALLS_FOR': 5,
+        }
+
+    async def access_token(self, request):
+        self.token_requests += 1
+        await asyncio.sleep(0.05)
+        return web.json_response({'access_token': 'token-' + str(self.token_requests)})
+
+    async def get_app_model(self, request):
+        return web.json_response({'href': self.base_url + request.path, 'vocabulary': ['boston'],
+                                  'enrollmentRepeats': 3})
+
+    async def create(self, request):
+        work_order_id = 'a' * 32
+        return web.json_response({'href': self.base_url + request.path + '/' + work_order_id}, status=201)
+
+    async def update(self, request):
+        return web.json_response({'href': self.base_url + request.path}, status=202)
+
+    async def get(self, request):
+        self.polls[request.path] = self.polls.get(request.path, 0) + 1
+        status = 'completed' if self.polls[request.path] > self.polls_until_complete else 'initialized'
+        headers = {'Retry-After': self.retry_after} if self.retry_after and status != 'completed' else None
+        return web.json_response({'href': self.base_url + request.path, 'status': status,
+                                  'instructions': {'data': {'phrases': ['boston']}}}, headers=headers)
+
+
+class TestAsyncClient(unittest.TestCase):
+
+    def run_with_server(self, scenario, server=None, **config):
+
+        async def _run():
+            await server.start()
+            try:
+                async with AsyncClient(config=dict(server.config, **config)) as client:
+                    return await scenario(server, client)
+            finally:
+                await server.stop()
+
+        server = server if server is not None else StandInServer()
+        return asyncio.run(_run())
+
+    def test_get_app_model(self):
+
+        async def scenario(server, client):
+            return await AsyncAppModel(client).get('5571c3a5c203f17826740e901903cafb')
+
+        result = self.run_with_server(scenario)
+        self.assertEqual(result.get('vocabulary'), ['boston'])
+
+    def test_enrollment_steps(self):
+
+        async def scenario(server, client):
+            e = AsyncEnrollment(client, app_model_id='model', consumer_id='consumer')
+            return await e.steps(payload_update={"enrollment.wav": h.DummyData.enrollment_wav,
+                                                 "intervals": h.DummyData.enrollment_intervals})
+
+        enrollment_id = self.run_with_server(scenario)
+        self.assertRegex(enrollment_id, h.regx_pattern_id())
+
+    def test_concurrent_verifications_share_one_token(self):
+
+        async def scenario(server, client):
+            verifications = [AsyncVerification(client, app_model_id='model', consumer_id='consumer')
+                             for _ in range(50)]
+            instructions = await asyncio.gather(*[v.step_one() for v in verifications])
+            return server.token_requests, instructions
+
+        token_requests, instructions = self.run_with_server(scenario)
+        self.assertEqual(token_requests, 1)
+        self.assertTrue(all(instructions))
+
+    def test_pool_size_has_its_own_option(self):
+        config = dict(CONFIG, HTTP_POOL_MAXSIZE=10)
+        self.assertEqual(AsyncClient(config=config).pool_size, 100)
+        self.assertEqual(AsyncClient(config=dict(config, HTTP_ASYNC_POOL_SIZE=50)).pool_size, 50)
+
+    def test_token_is_shared_through_the_token_store(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'token.json')
+        config = {'TOKEN_CACHE_BACKEND': 'file', 'TOKEN_CACHE_PATH': path}
+        FileTokenStore(path).save(AccessToken('shared', time.time(), 3600))
+
+        async def scenario(server, client):
+            await AsyncAppModel(client).get('5571c3a5c203f17826740e901903cafb')
+            return server.token_requests, await client.token_getter.get_token()
+
+        self.assertEqual(self.run_with_server(scenario, **config), (0, 'shared'))
+
+        # a token renewed by the async client is picked up by the other managers of the store
+        FileTokenStore(path).clear()
+        self.assertEqual(self.run_with_server(scenario, **config), (1, 'token-1'))
+        manager = TokenManager(config=dict(CONFIG, **config), fetch=None)
+        self.assertEqual(manager.get_token(), 'token-1')
+
+    def test_polls_follow_the_retry_after_hint(self):
+
+        async def scenario(server, client):
+            client.poller = Poller(initial_delay=0.01, max_delay=0.01, jitter=0)
+            e = AsyncEnrollment(client, app_model_id='model', consumer_id='consumer')
+            await e.steps(payload_update={"enrollment.wav": h.DummyData.enrollment_wav,
+                                          "intervals": h.DummyData.enrollment_intervals})
+            return e.poll_metrics
+
+        metrics = self.run_with_server(scenario, server=StandInServer(retry_after='0'))
+        self.assertTrue(metrics.completed)
+        self.assertEqual(metrics.hinted, metrics.count - 1)
+        self.assertEqual(metrics.polls[-1]['delay'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk.bulk import BulkEnroller, BulkStats, BulkVerifier, LatencySummary, bounded_map
+from knurld_sdk.polling import OUTCOME_ERROR, OUTCOME_TIMEOUT, PollMetrics
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+
+ID = '0123456789abcdef0123456789abcdef'
+
+
+class WorkOrderServer(FakeSession):
+    """ creates the enrollments and verifications, accepts their recordings and reports them completed
+    """
+
+    def respond(self, method, url, **kwargs):
+        if method == 'POST' and url in (CONFIG['URL_ENROLLMENTS'], CONFIG['URL_VERIFICATIONS']):
+            return FakeResponse(201, {'href': url + '/' + ID})
+        if method == 'POST':
+            return FakeResponse(202, {'href': url})
+        return FakeResponse(200, {'href': url, 'status': 'completed', 'instructions': {}})
+
+
+class BrokenPoller(object):
+
+    def poll(self, *args, **kwargs):
+        raise RuntimeError('poller down')
+
+
+class StubPoller(object):
+    """ ends every poll loop with the given result and outcome
+    """
+
+    def __init__(self, result, outcome):
+        self.result = result
+        self.outcome = outcome
+
+    def poll(self, *args, **kwargs):
+        metrics = PollMetrics(kwargs.get('operation'))
+        metrics.outcome = self.outcome
+        return self.result, metrics
+
+
+class TestBoundedMap(unittest.TestCase):
+
+    def test_results_and_backpressure(self):
+        lock = threading.Lock()
+        state = {'read': 0, 'running': 0, 'max_running': 0, 'max_read_ahead': 0, 'done': 0}
+
+        def records():
+            for i in range(100):
+                with lock:
+                    state['read'] += 1
+                    state['max_read_ahead'] = max(state['max_read_ahead'], state['read'] - state['done'])
+                yield i
+
+        def work(i):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+            time.sleep(0.001)
+            with lock:
+                state['running'] -= 1
+                state['done'] += 1
+            return i * 2
+
+        results = list(bounded_map(work, records(), max_workers=4, max_pending=6))
+
+        self.assertEqual(sorted(results), [i * 2 for i in range(100)])
+        self.assertLessEqual(state['max_running'], 4)
+        self.assertLessEqual(state['max_read_ahead'], 6)
+
+    def test_closing_early_stops_reading(self):
+        read = []
+
+        def records():
+            for i in range(1000):
+                read.append(i)
+                yield i
+
+        results = bounded_map(lambda i: i, records(), max_workers=2, max_pending=2)
+        next(results)
+        results.close()
+        self.assertLess(len(read), 10)
+
+    def test_stats(self):
+        stats = BulkStats()
+        stats.add(True)
+        stats.add(False)
+        self.assertEqual((stats.completed, stats.succeeded, stats.failed), (2, 1, 1))
+        self.assertGreater(stats.throughput, 0)
+
+
+class TestLatencySummary(unittest.TestCase):
+
+    def test_percentiles(self):
+        latencies = LatencySummary()
+        for i in range(1, 101):
+            latencies.add('poll', i / 100.0)
+        summary = latencies.summary()['poll']
+        self.assertEqual(summary, {'count': 100, 'p50': 0.5, 'p95': 0.95, 'p99': 0.99})
+
+    def test_bounded_samples(self):
+        latencies = LatencySummary(max_samples=10)
+        for i in range(1000):
+            latencies.add('create', 1.0)
+        self.assertEqual(latencies.summary()['create']['count'], 1000)
+        self.assertEqual(len(latencies._samples['create']), 10)
+
+
+class TestBulkWorkOrders(unittest.TestCase):
+
+    record = ('consumer', 'model', 'https://recordings/x.wav', [])
+
+    def test_single_records_outside_of_run(self):
+        client = make_client(WorkOrderServer(), config=dict(CONFIG, REATTEMPT_CALLS_FOR=2))
+        enroller = BulkEnroller(client=client)
+        self.assertEqual((enroller.poller, enroller.timeout), (client.poller, 2.0))
+        result = enroller.enroll(self.record)
+        self.assertEqual((result.enrollment_id, result.status, result.error), (ID, 'completed', None))
+
+        result = BulkVerifier(client=client).verify(self.record)
+        self.assertEqual((result.verification_id, result.status), (ID, 'completed'))
+        self.assertEqual(sorted(result.timings), ['create', 'instructions', 'poll', 'update'])
+
+    def test_errors_keep_the_created_work_order_id(self):
+        client = make_client(WorkOrderServer())
+        result = BulkEnroller(client=client, poller=BrokenPoller()).enroll(self.record)
+        self.assertEqual((result.enrollment_id, result.status), (ID, 'error'))
+        self.assertIsInstance(result.error, RuntimeError)
+
+        result = BulkVerifier(client=client, poller=BrokenPoller()).verify(self.record)
+        self.assertEqual((result.verification_id, result.status), (ID, 'error'))
+
+        result = BulkEnroller(client=make_client(FakeSession(FakeResponse(500)))).enroll(self.record)
+        self.assertEqual((result.enrollment_id, result.status, result.error[0]), (None, 'error', 500))
+
+    def test_enrollment_timeouts_are_told_from_errors(self):
+        client = make_client(WorkOrderServer())
+        for result, outcome, status in [(None, OUTCOME_ERROR, 'error'), ((404, b'not found'), OUTCOME_ERROR, 'error'),
+                                        ({'status': 'started'}, OUTCOME_TIMEOUT, 'timeout'),
+                                        (None, OUTCOME_TIMEOUT, 'timeout')]:
+            enroller = BulkEnroller(client=client, poller=StubPoller(result, outcome))
+            self.assertEqual(enroller.enroll(self.record).status, status)
+
+    def test_verification_timeouts_are_told_from_errors(self):
+        client = make_client(WorkOrderServer())
+        result = BulkVerifier(client=client, poller=StubPoller(None, OUTCOME_ERROR)).verify(self.record)
+        self.assertEqual((result.status, result.error), ('error', None))
+        self.assertIn('poll', result.timings)
+
+        started = {'status': 'started'}
+        result = BulkVerifier(client=client, poller=StubPoller(started, OUTCOME_TIMEOUT)).verify(self.record)
+        self.assertEqual((result.status, result.result), ('timeout', started))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk.APIManager import Analysis, AppModel
+from knurld_sdk.cache import LRUCache
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+
+MODEL = {'href': CONFIG['URL_APP_MODELS'] + '/model', 'vocabulary': ['Boston', 'Chicago'], 'enrollmentRepeats': 2}
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)     # 'b' is now the least recently used
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+
+    def test_entries_expire(self):
+        cache = LRUCache(10, ttl=0.05)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=10)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.expirations, 1)
+
+    def test_get_or_create_is_single_flight(self):
+        cache = LRUCache(10)
+        calls = []
+
+        def create():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_create('key', create)))
+                   for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 10)
+        self.assertEqual(cache.get_or_create('key', create), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_failures_are_not_cached(self):
+        cache = LRUCache(10)
+        self.assertIsNone(cache.get_or_create('key', lambda: None))
+        self.assertEqual(len(cache), 0)
+
+        def fail():
+            raise IOError('down')
+
+        self.assertRaises(IOError, cache.get_or_create, 'key', fail)
+        self.assertEqual(cache.get_or_create('key', lambda: 'value', ttl=lambda value: 10), 'value')
+
+    def test_bounded_size(self):
+        cache = LRUCache(100)
+        for i in range(10000):
+            cache.set(i, i)
+        self.assertEqual(len(cache), 100)
+        self.assertEqual(cache.evictions, 9900)
+
+
+class TestAppModelCache(unittest.TestCase):
+
+    def test_update_and_delete_drop_the_record(self):
+        session = FakeSession(FakeResponse(200, MODEL), FakeResponse(202, MODEL), FakeResponse(200, MODEL),
+                              FakeResponse(200, MODEL))
+        client = make_client(session)
+        self.assertEqual(AppModel.get_cached('model', client=client), MODEL)
+        self.assertEqual(AppModel.get_cached('model', client=client), MODEL)
+        self.assertEqual(len(session.requests), 1)
+
+        AppModel(None, client=client).update('model', dict(MODEL, enrollmentRepeats=3))
+        self.assertIsNone(client.app_models.get('model'))
+        AppModel.get_cached('model', client=client)
+        AppModel(None, client=client).delete('model')
+        self.assertIsNone(client.app_models.get('model'))
+        self.assertEqual([method for method, _, _ in session.requests], ['GET', 'POST', 'GET', 'DELETE'])
+
+    def test_prewarm(self):
+        other = dict(MODEL, href=CONFIG['URL_APP_MODELS'] + '/other')
+        client = make_client(FakeSession(FakeResponse(200, {'items': [MODEL, other], 'total': 2})))
+        self.assertEqual(AppModel.prewarm(client=client), 2)
+        self.assertEqual(client.app_models.get('other'), other)
+
+        # only the given app models, failures are not cached
+        session = FakeSession(FakeResponse(200, MODEL), FakeResponse(404))
+        client = make_client(session)
+        self.assertEqual(AppModel.prewarm(['model', 'missing'], client=client), 1)
+        self.assertEqual(client.app_models.get('model'), MODEL)
+        self.assertEqual(len(client.app_models), 1)
+        self.assertEqual([url for _, url, _ in session.requests],
+                         [CONFIG['URL_APP_MODELS'] + '/model', CONFIG['URL_APP_MODELS'] + '/missing'])
+
+    def test_intervals_with_phrases_read_the_warm_cache(self):
+        session = FakeSession(FakeResponse(200, MODEL))
+        client = make_client(session)
+        AppModel.prewarm(['model'], client=client)
+
+        for _ in range(3):
+            analysis = Analysis(None, 'model', 'consumer', client=client)
+            analysis.intervals = [{'start': 0, 'stop': 1}, {'start': 2, 'stop': 3}]
+            self.assertEqual([i['phrase'] for i in analysis.intervals_with_phrases()], ['Boston', 'Boston'])
+        self.assertEqual(len(session.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
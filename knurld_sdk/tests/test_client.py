@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import unittest
+
+from knurld_sdk.APIManager import AppModel, Consumer
+from knurld_sdk.client import KnurldClient
+from knurld_sdk.tests.fakes import FakeResponse, FakeSession
+
+
+def _config(account):
+    return {'CLIENT_ID': account, 'CLIENT_SECRET': 'secret', 'DEVELOPER_ID': 'Bearer: ' + account,
+            'TOKEN_EXPIRES': 3599, 'URL_HOST': account + '.knurld.io',
+            'URL_ACCESS_TOKEN': 'https://' + account + '.knurld.io/oauth/client_credential/accesstoken',
+            'URL_APP_MODELS': 'https://' + account + '.knurld.io/v1/app-models',
+            'URL_CONSUMERS': 'https://' + account + '.knurld.io/v1/consumers'}
+
+
+class AccountSession(FakeSession):
+    """ answers the oauth and app model requests of one account
+    """
+
+    def __init__(self, account):
+        super(AccountSession, self).__init__()
+        self.account = account
+
+    def respond(self, method, url, **kwargs):
+        if method == 'POST':
+            return FakeResponse(200, {'access_token': self.account + '-token', 'expires_in': 3599})
+        return FakeResponse(200, {'href': url, 'account': self.account})
+
+
+class TestKnurldClient(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = [AccountSession('one'), AccountSession('two')]
+        self.clients = [KnurldClient(config=_config(s.account), session=s) for s in self.sessions]
+
+    def test_clients_use_their_own_config_token_and_pool(self):
+        for client, session in zip(self.clients, self.sessions):
+            result = AppModel(None, client=client).get('abc')
+            self.assertEqual(result['account'], session.account)
+
+            # the token was fetched through the client's own session, with its own credentials
+            (_, token_url, _), (_, url, headers) = session.requests
+            self.assertEqual(token_url, client.config['URL_ACCESS_TOKEN'])
+            self.assertEqual(url, client.config['URL_APP_MODELS'] + '/abc')
+            self.assertEqual(headers['Authorization'], 'Bearer ' + session.account + '-token')
+            self.assertEqual(headers['Developer-Id'], client.config['DEVELOPER_ID'])
+
+        self.assertIsNot(self.clients[0].token_manager, self.clients[1].token_manager)
+
+    def test_caches_are_per_client(self):
+        one, two = self.clients
+        AppModel.get_cached('abc', client=one)
+        AppModel.get_cached('abc', client=one)
+        self.assertEqual(len(self.sessions[0].requests), 2)  # token + one app model fetch
+
+        self.assertIsNone(two.app_models.get('abc'))
+        self.assertEqual(AppModel.get_cached('abc', client=two)['account'], 'two')
+        self.assertIsNot(one.consumer_tokens, two.consumer_tokens)
+
+    def test_static_methods_take_the_client(self):
+        Consumer.get_all(limit=5, client=self.clients[1])
+        self.assertEqual(self.sessions[1].requests[-1][1], _config('two')['URL_CONSUMERS'] + '?limit=5&offset=0')
+        self.assertEqual(self.sessions[0].requests, [])
+
+    def test_close(self):
+        with self.clients[0] as client:
+            client.headers()
+        self.assertTrue(self.sessions[0].closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk.coalesce import RequestCoalescer
+
+URL = 'https://api.knurld.io/v1/enrollments/abc'
+ADMIN = {'Developer-Id': 'Bearer: developer'}
+
+
+class SlowServer(object):
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def send(self, headers):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return 'response-' + str(calls)
+
+
+def _concurrently(fn, n=10):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+class TestRequestCoalescer(unittest.TestCase):
+
+    def test_concurrent_gets_share_one_request(self):
+        coalescer, server = RequestCoalescer(), SlowServer()
+        results, _ = _concurrently(lambda: coalescer.send(server.send, URL, ADMIN))
+
+        self.assertEqual(server.calls, 1)
+        self.assertEqual(results, ['response-1'] * 10)
+        self.assertEqual(coalescer.stats(), {'requests': 1, 'coalesced': 9})
+
+        # without a window the next request goes out again
+        self.assertEqual(coalescer.send(server.send, URL, ADMIN), 'response-2')
+
+    def test_different_urls_and_scopes_are_not_merged(self):
+        coalescer, server = RequestCoalescer(), SlowServer()
+        _concurrently(lambda: coalescer.send(server.send, URL, ADMIN), n=1)
+        _concurrently(lambda: coalescer.send(server.send, URL + 'x', ADMIN), n=1)
+        _concurrently(lambda: coalescer.send(server.send, URL, {'Developer-Id': 'consumer'}), n=1)
+        self.assertEqual(server.calls, 3)
+
+    def test_window_shares_finished_responses(self):
+        coalescer, server = RequestCoalescer(window=0.1), SlowServer(delay=0)
+        self.assertEqual(coalescer.send(server.send, URL, ADMIN), 'response-1')
+        self.assertEqual(coalescer.send(server.send, URL, ADMIN), 'response-1')
+        time.sleep(0.15)
+        self.assertEqual(coalescer.send(server.send, URL, ADMIN), 'response-2')
+
+    def test_errors_reach_every_waiter_and_are_not_kept(self):
+        coalescer, server = RequestCoalescer(window=10), SlowServer(error=IOError('reset'))
+        results, errors = _concurrently(lambda: coalescer.send(server.send, URL, ADMIN))
+        self.assertEqual((len(results), len(errors)), (0, 10))
+        self.assertEqual(server.calls, 1)
+
+        server.error = None
+        self.assertEqual(coalescer.send(server.send, URL, ADMIN), 'response-2')
+
+
+if __name__ == '__main__':
+    unittest.main()
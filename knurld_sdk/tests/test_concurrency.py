@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk.APIManager import Consumer
+from knurld_sdk.bulk import bounded_map
+from knurld_sdk.concurrency import AdaptiveLimiter
+from knurld_sdk.pipeline import Pipeline
+from knurld_sdk.polling import clock
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(initial=2, max_limit=4, latency_tolerance=None)
+        # about one more call per round of calls
+        for _ in range(3):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 3)
+        for _ in range(100):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_multiplicative_decrease_once_per_round(self):
+        limiter = AdaptiveLimiter(initial=8, latency_tolerance=None)
+        calls = [limiter.acquire() for _ in range(3)]
+        for started in calls:
+            limiter.release(started, overloaded=True)
+        # the calls already in flight when the limit was cut do not cut it again
+        self.assertEqual(limiter.limit, 4)
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+        for _ in range(5):
+            limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_slow_responses_count_as_overload(self):
+        limiter = AdaptiveLimiter(initial=8, max_limit=8, latency_tolerance=3.0)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(clock() - 0.1)
+        limiter.acquire()
+        limiter.release(clock() - 0.25)
+        self.assertEqual(limiter.limit, 8)
+        limiter.acquire()
+        limiter.release(clock() - 0.5)
+        self.assertEqual(limiter.limit, 4)
+
+        limiter = AdaptiveLimiter(initial=8, latency_tolerance=None, latency_target=1.0)
+        limiter.release(clock() - 2.0)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_acquire_waits_for_a_free_slot(self):
+        limiter = AdaptiveLimiter(initial=1, latency_tolerance=None)
+        started = limiter.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(limiter.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertEqual(acquired, [])
+        limiter.release(started)
+        waiter.join(1)
+        self.assertEqual(len(acquired), 1)
+
+    def test_stage_cuts_the_limit_on_overload_responses(self):
+        session = FakeSession(FakeResponse(200, {'items': []}), FakeResponse(503), FakeResponse(429))
+        config = dict(CONFIG, CONCURRENCY_ADAPTIVE=True, CONCURRENCY_INITIAL=8)
+        client = make_client(session, config=config, pipeline=Pipeline.from_config(config))
+        self.assertEqual(client.pipeline.names(), ['auth', 'retry', 'concurrency', 'trace', 'coalesce', 'metrics'])
+        limiter = client.pipeline.get('concurrency')
+        limiter.latency_tolerance = None
+
+        Consumer.get_all(client=client)
+        self.assertEqual(limiter.limit, 8)
+        self.assertEqual(Consumer.get_all(client=client)[0], 503)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(Consumer.get_all(client=client)[0], 429)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+        self.assertNotIn('concurrency', Pipeline.from_config(CONFIG).names())
+
+    def test_bounded_map_follows_the_limit(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'max_running': 0, 'over_limit': False}
+
+        def work(limiter, i):
+            with lock:
+                state['running'] += 1
+                state['max_running'] = max(state['max_running'], state['running'])
+                state['over_limit'] |= state['running'] > limiter.limit
+            limiter.release(limiter.acquire())
+            time.sleep(0.001)
+            with lock:
+                state['running'] -= 1
+            return i
+
+        limiter = AdaptiveLimiter(initial=2, max_limit=6, latency_tolerance=None)
+        results = list(bounded_map(lambda i: work(limiter, i), range(20), max_workers=6, limiter=limiter))
+        self.assertEqual(sorted(results), list(range(20)))
+        self.assertFalse(state['over_limit'])
+        self.assertGreater(limiter.limit, 2)
+
+        state['max_running'] = 0
+        limiter = AdaptiveLimiter(initial=1, max_limit=1, latency_tolerance=None)
+        list(bounded_map(lambda i: work(limiter, i), range(10), max_workers=6, limiter=limiter))
+        self.assertEqual(state['max_running'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
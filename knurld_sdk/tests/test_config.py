@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from knurld_sdk.config import Configuration, LiveConfig, parse_config
+from knurld_sdk.CustomExceptions import InvalidConfigurationException
+
+CONFIG = {'CLIENT_ID': 'client', 'CLIENT_SECRET': 'secret', 'DEVELOPER_ID': 'Bearer: developer',
+          'TOKEN_EXPIRES': '3599', 'REATTEMPT_CALLS_FOR': '5', 'HTTP_CACHE_ENABLED': 'false',
+          'DROPBOX': {'ACCESS_TOKEN': 'x'}}
+
+
+class TestConfiguration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'config.cfg')
+        self._write(CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _write(self, values):
+        with open(self.path, 'w') as f:
+            json.dump(values, f)
+
+    def test_typed_values(self):
+        config = parse_config(json.dumps(dict(CONFIG, TOKEN_EXPIRES='7200')))
+        self.assertEqual(config['TOKEN_EXPIRES'], 3599)
+        self.assertEqual(config['REATTEMPT_CALLS_FOR'], 5.0)
+        self.assertIs(config['HTTP_CACHE_ENABLED'], False)
+
+    def test_validation(self):
+        self.assertRaises(InvalidConfigurationException, parse_config, '{not json')
+        self.assertRaises(InvalidConfigurationException, parse_config, json.dumps({'CLIENT_ID': 'client'}))
+        self.assertRaises(InvalidConfigurationException, parse_config,
+                          json.dumps(dict(CONFIG, HTTP_POOL_MAXSIZE='many')))
+
+    def test_immutable(self):
+        config = parse_config(json.dumps(CONFIG))
+        with self.assertRaises(TypeError):
+            config['CLIENT_ID'] = 'other'
+        with self.assertRaises(TypeError):
+            config['DROPBOX']['ACCESS_TOKEN'] = 'other'
+
+    def test_loaded_once(self):
+        c = Configuration(path=self.path)
+        self.assertIs(c.config, c.config)
+        os.remove(self.path)
+        self.assertEqual(c.config['CLIENT_ID'], 'client')
+
+    def test_reload(self):
+        c = Configuration(path=self.path)
+        live = LiveConfig(c)
+        self.assertEqual(live['DEVELOPER_ID'], 'Bearer: developer')
+        self.assertFalse(c.reload())
+
+        self._write(dict(CONFIG, DEVELOPER_ID='Bearer: other developer'))
+        self.assertTrue(c.reload())
+        self.assertEqual(live['DEVELOPER_ID'], 'Bearer: other developer')
+
+        # a broken file keeps the current snapshot
+        with open(self.path, 'w') as f:
+            f.write('{broken')
+        self.assertFalse(c.reload())
+        self.assertEqual(live['DEVELOPER_ID'], 'Bearer: other developer')
+
+    def test_watch(self):
+        c = Configuration(path=self.path)
+        self.assertEqual(c.config['CLIENT_ID'], 'client')
+        c.watch(interval=0.01)
+        try:
+            self._write(dict(CONFIG, CLIENT_ID='another client'))
+            deadline = time.time() + 3
+            while c.config['CLIENT_ID'] != 'another client' and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(c.config['CLIENT_ID'], 'another client')
+        finally:
+            c.stop_watching()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk.APIManager import Analysis, Consumer, Enrollment, Verification
+from knurld_sdk.coalesce import RequestCoalescer
+from knurld_sdk.concurrency import AdaptiveLimiter
+from knurld_sdk.CustomExceptions import DeadlineExceeded
+from knurld_sdk.deadline import Deadline, budget, current_deadline, remaining
+from knurld_sdk.pipeline import Call, Pipeline, Retry
+from knurld_sdk.ratelimit import Limit, RateLimiter
+from knurld_sdk.polling import Poller
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+
+HREF = CONFIG['URL_ENROLLMENTS'] + '/0123456789abcdef0123456789abcdef'
+
+
+class StuckServer(FakeSession):
+    """ accepts the work orders but never completes them
+    """
+
+    def respond(self, method, url, **kwargs):
+        if method == 'POST' and url in (CONFIG['URL_ENROLLMENTS'], CONFIG['URL_VERIFICATIONS']):
+            return FakeResponse(201, {'href': url + '/0123456789abcdef0123456789abcdef'})
+        if method == 'POST' and url == CONFIG['URL_ANALYSIS']:
+            return FakeResponse(200, {'taskName': 'task', 'taskStatus': 'started'})
+        if method == 'POST':
+            return FakeResponse(202, {'href': url})
+        return FakeResponse(200, {'href': url, 'status': 'started', 'taskStatus': 'started', 'instructions': {}})
+
+
+def _fast_poller():
+    return Poller(initial_delay=0.01, max_delay=0.01, jitter=0)
+
+
+class TestBudget(unittest.TestCase):
+
+    def test_the_earlier_deadline_applies(self):
+        self.assertIsNone(current_deadline())
+        self.assertEqual(remaining(5), 5)
+        with budget(10) as outer:
+            with budget(60) as inner:
+                self.assertIs(inner, outer)
+            with budget(1) as inner:
+                self.assertIs(current_deadline(), inner)
+                self.assertLessEqual(remaining(5), 1)
+            with budget(None) as inner:
+                self.assertIs(inner, outer)
+            self.assertIs(current_deadline(), outer)
+        self.assertIsNone(current_deadline())
+
+    def test_calls_get_the_remaining_budget_as_timeout(self):
+        session = FakeSession(FakeResponse(200, {'href': 'x'}), FakeResponse(200, {'href': 'x'}))
+        client = make_client(session)
+        Consumer(None, client=client).get('abc')
+        with budget(5):
+            Consumer(None, client=client).get('abc')
+        self.assertNotIn('timeout', session.options[0])
+        self.assertTrue(4 < session.options[1]['timeout'] <= 5)
+
+    def test_no_call_once_the_deadline_passed(self):
+        session = FakeSession(FakeResponse(200, {'href': 'x'}))
+        client = make_client(session)
+        with budget(0.01):
+            time.sleep(0.02)
+            self.assertIsNone(Consumer(None, client=client).get('abc'))
+        self.assertEqual(session.requests, [])
+
+    def test_retry_stops_when_the_next_attempt_would_miss_the_deadline(self):
+        delays = []
+        session = FakeSession(FakeResponse(503, headers={'Retry-After': '0.01'}),
+                              FakeResponse(503, headers={'Retry-After': '30'}), FakeResponse(200, {'href': 'x'}))
+        client = make_client(session, pipeline=Pipeline.from_config(CONFIG))
+        client.pipeline.replace('retry', Retry(retries=5, sleep=delays.append))
+        with budget(5):
+            self.assertEqual(Consumer(None, client=client).get('abc')[0], 503)
+        self.assertEqual(delays, [0.01])
+
+
+class TestStageDeadlines(unittest.TestCase):
+
+    url = CONFIG['URL_CONSUMERS'] + '/abc'
+
+    def test_rate_limiter_does_not_sleep_past_the_deadline(self):
+        waits = []
+        limiter = RateLimiter({'consumers': Limit(1)}, sleep=waits.append)
+        limiter.acquire('consumers')
+        self.assertRaises(DeadlineExceeded, limiter.acquire, 'consumers', Deadline(0.5))
+        self.assertRaises(DeadlineExceeded, limiter.acquire, 'consumers', Deadline(0))
+        self.assertEqual(waits, [])
+        # the calls that gave up took no token: the next one waits for one token only
+        limiter.acquire('consumers')
+        self.assertEqual(len(waits), 1)
+        self.assertLessEqual(waits[0], 1)
+
+        sent = []
+        stage = Pipeline([('ratelimit', limiter)], transport=sent.append)
+        self.assertRaises(DeadlineExceeded, stage.send, Call('GET', self.url, None, deadline=Deadline(0)))
+        self.assertEqual(sent, [])
+
+    def test_concurrency_slot_wait_is_bounded(self):
+        limiter = AdaptiveLimiter(initial=1, latency_tolerance=None)
+        limiter.acquire()
+        started = time.time()
+        self.assertRaises(DeadlineExceeded, limiter.acquire, Deadline(0.05))
+        self.assertLess(time.time() - started, 1)
+
+        sent = []
+        stage = Pipeline([('concurrency', limiter)], transport=sent.append)
+        self.assertRaises(DeadlineExceeded, stage.send, Call('GET', self.url, None, deadline=Deadline(0)))
+        self.assertEqual((sent, limiter.in_flight), ([], 1))
+
+    def test_coalesced_call_does_not_wait_past_the_deadline(self):
+        coalescer = RequestCoalescer()
+        stuck = threading.Event()
+
+        def send(call):
+            stuck.wait(5)
+            return FakeResponse(200, {'href': 'x'})
+
+        pipeline = Pipeline([('coalesce', coalescer)], transport=send)
+        leader = threading.Thread(target=pipeline.send, args=(Call('GET', self.url, None),))
+        leader.start()
+        # cleanups run last in first out: the leader is let go, then joined
+        self.addCleanup(leader.join)
+        self.addCleanup(stuck.set)
+        while coalescer.requests == 0:
+            time.sleep(0.001)
+
+        started = time.time()
+        self.assertRaises(DeadlineExceeded, pipeline.send, Call('GET', self.url, None, deadline=Deadline(0.05)))
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(coalescer.coalesced, 1)
+
+
+class TestFlowDeadlines(unittest.TestCase):
+
+    def test_enrollment_fails_fast(self):
+        session = StuckServer()
+        client = make_client(session, config=dict(CONFIG, REATTEMPT_CALLS_FOR=60), poller=_fast_poller())
+        e = Enrollment(None, 'model', 'consumer', client=client)
+        started = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            e.steps({'enrollment.wav': 'x', 'intervals': []}, deadline=0.2)
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(e.timeline.root.attributes['status'], 'deadline exceeded')
+        self.assertTrue(all(0 < options['timeout'] <= 0.2 for options in session.options))
+
+    def test_verification_and_analysis(self):
+        client = make_client(StuckServer(), poller=_fast_poller())
+        v = Verification(None, 'model', 'consumer', client=client)
+        self.assertEqual(v.step_one(deadline=5), {})
+        with self.assertRaises(DeadlineExceeded):
+            v.step_two({'verification.wav': 'x', 'intervals': []}, deadline=0.1)
+
+        a = Analysis(None, 'model', 'consumer', payload={'audioUrl': 'x'}, client=client)
+        with self.assertRaises(DeadlineExceeded):
+            a.steps(deadline=0.1)
+
+    def test_no_deadline_keeps_the_flows_unchanged(self):
+        client = make_client(StuckServer(), config=dict(CONFIG, REATTEMPT_CALLS_FOR=0.1), poller=_fast_poller())
+        v = Verification(None, 'model', 'consumer', client=client)
+        v.step_one()
+        self.assertEqual(v.step_two({'verification.wav': 'x', 'intervals': []})['status'], 'started')
+
+
+if __name__ == '__main__':
+    unittest.main()
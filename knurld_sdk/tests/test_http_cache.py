@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import time
+import unittest
+
+from knurld_sdk.http_cache import HTTPCache
+from knurld_sdk.tests.fakes import FakeResponse
+
+URL = 'https://api.knurld.io/v1/app-models/abc'
+ADMIN = {'Authorization': 'Bearer token', 'Developer-Id': 'Bearer: developer'}
+CONSUMER = {'Authorization': 'Bearer token', 'Developer-Id': 'consumer-token'}
+
+
+class FakeServer(object):
+    """ answers conditional requests carrying the current ETag with a 304
+    """
+
+    def __init__(self, etag='"v1"', cache_control=None):
+        self.etag = etag
+        self.cache_control = cache_control
+        self.requests = []
+
+    def send(self, headers):
+        self.requests.append(headers)
+        if self.etag and headers.get('If-None-Match') == self.etag:
+            return FakeResponse(304, content=b'')
+        response_headers = {'ETag': self.etag} if self.etag else {}
+        if self.cache_control:
+            response_headers['Cache-Control'] = self.cache_control
+        return FakeResponse(200, headers=response_headers, content=b'{"vocabulary": ["boston"]}')
+
+
+class TestHTTPCache(unittest.TestCase):
+
+    def test_conditional_requests(self):
+        cache, server = HTTPCache(), FakeServer()
+        first = cache.send(server.send, 'GET', URL, ADMIN)
+        second = cache.send(server.send, 'GET', URL, ADMIN)
+
+        self.assertEqual(second.content, first.content)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(server.requests[1]['If-None-Match'], '"v1"')
+        self.assertEqual(cache.stats()['revalidations'], 1)
+
+        server.etag = '"v2"'
+        third = cache.send(server.send, 'GET', URL, ADMIN)
+        self.assertFalse(getattr(third, 'from_cache', False))
+
+    def test_ttl_without_validators(self):
+        server = FakeServer(etag=None)
+        cache = HTTPCache(ttl=0)
+        cache.send(server.send, 'GET', URL, ADMIN)
+        self.assertEqual(cache.stats()['size'], 0)
+
+        cache = HTTPCache(ttl=0.05)
+        cache.send(server.send, 'GET', URL, ADMIN)
+        cache.send(server.send, 'GET', URL, ADMIN)
+        self.assertEqual(len(server.requests), 2)
+        time.sleep(0.1)
+        cache.send(server.send, 'GET', URL, ADMIN)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(cache.fresh_hits, 1)
+
+    def test_max_age_overrides_ttl(self):
+        cache, server = HTTPCache(ttl=0), FakeServer(cache_control='max-age=60')
+        cache.send(server.send, 'GET', URL, ADMIN)
+        cache.send(server.send, 'GET', URL, ADMIN)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_scopes_are_separate(self):
+        cache, server = HTTPCache(), FakeServer()
+        cache.send(server.send, 'GET', URL, ADMIN)
+        cache.send(server.send, 'GET', URL, CONSUMER)
+        self.assertNotIn('If-None-Match', server.requests[1])
+
+    def test_writes_invalidate(self):
+        cache, server = HTTPCache(), FakeServer()
+        cache.send(server.send, 'GET', URL, ADMIN)
+        cache.send(server.send, 'POST', URL, ADMIN)
+        cache.send(server.send, 'GET', URL, ADMIN)
+        self.assertNotIn('If-None-Match', server.requests[2])
+
+    def test_writes_invalidate_the_listings_of_the_collection(self):
+        cache, server = HTTPCache(), FakeServer()
+        listings = ['https://api.knurld.io/v1/app-models', 'https://api.knurld.io/v1/app-models?offset=0&limit=10']
+        other = 'https://api.knurld.io/v1/consumers?offset=0&limit=10'
+        for url in listings + [other]:
+            cache.send(server.send, 'GET', url, ADMIN)
+
+        cache.send(server.send, 'DELETE', URL, ADMIN)
+        for url in listings + [other]:
+            cache.send(server.send, 'GET', url, ADMIN)
+        # the listings of the app models are downloaded again, the consumers one is revalidated
+        self.assertEqual(['If-None-Match' in headers for headers in server.requests[4:]], [False, False, True])
+
+        cache.send(server.send, 'POST', 'https://api.knurld.io/v1/app-models', ADMIN)
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_bounded(self):
+        cache, server = HTTPCache(maxsize=10), FakeServer()
+        for i in range(50):
+            cache.send(server.send, 'GET', URL + str(i), ADMIN)
+        self.assertEqual(cache.stats()['size'], 10)
+        self.assertEqual(cache.stats()['evictions'], 40)
+
+
+if __name__ == '__main__':
+    unittest.main()
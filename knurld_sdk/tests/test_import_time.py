@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# cold start budget for importing the SDK, in seconds; KNURLD_IMPORT_BUDGET overrides it on slow machines
+IMPORT_BUDGET = float(os.environ.get('KNURLD_IMPORT_BUDGET', 0.25))
+
+# third party packages that must only be loaded once they are used
+HEAVY_PACKAGES = ('requests', 'urllib3', 'dogpile', 'dropbox')
+
+PROBE = '''
+import json, sys, time
+start = time.time()
+import knurld_sdk.APIManager
+import knurld_sdk.uploader.Dropbox
+elapsed = time.time() - start
+from knurld_sdk import app_globals as g
+print(json.dumps({
+    'elapsed': elapsed,
+    'loaded': sorted(set(m.split('.')[0] for m in sys.modules) & set(%r)),
+    'config_loaded': g.c._snapshot is not None,
+}))
+''' % (HEAVY_PACKAGES,)
+
+
+class TestImportTime(unittest.TestCase):
+
+    def _probe(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=root)
+        return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    def test_import_is_lazy(self):
+        result = self._probe()
+        self.assertEqual(result['loaded'], [])
+        self.assertFalse(result['config_loaded'])
+
+    def test_import_budget(self):
+        # best of three, to keep a busy machine from failing the run
+        elapsed = min(self._probe()['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
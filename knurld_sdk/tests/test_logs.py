@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import logging
+import unittest
+
+from knurld_sdk.logs import PAYLOAD_LOGGER, log_failure, log_response, trace_payloads
+from knurld_sdk.tests.fakes import FakeResponse
+
+
+class CountingResponse(FakeResponse):
+    """ counts the reads of its body
+    """
+
+    def __init__(self):
+        self.reads = 0
+        super(CountingResponse, self).__init__(400, {'error': 'invalid'}, url='https://api.knurld.io/v1/consumers')
+
+    @property
+    def content(self):
+        self.reads += 1
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+
+class CapturingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append((record.name, record.levelno, record.getMessage()))
+
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = CapturingHandler()
+        self.logger = logging.getLogger('knurld_sdk')
+        self.logger.addHandler(self.handler)
+        self.level = self.logger.level
+        self.logger.setLevel(logging.DEBUG)
+
+    def tearDown(self):
+        trace_payloads(False)
+        self.logger.setLevel(self.level)
+        self.logger.removeHandler(self.handler)
+
+    def test_bodies_need_payload_tracing(self):
+        response = CountingResponse()
+        log_response(response)
+        log_failure(logging.getLogger('knurld_sdk.APIManager'), response)
+
+        # DEBUG on the SDK alone reports the failure, without reading the body
+        self.assertEqual(response.reads, 0)
+        self.assertEqual(self.handler.messages, [('knurld_sdk.APIManager', logging.WARNING,
+                                                  'request https://api.knurld.io/v1/consumers failed with status 400')])
+
+        trace_payloads()
+        log_response(response)
+        self.assertEqual(response.reads, 1)
+        self.assertEqual(self.handler.messages[-1], (PAYLOAD_LOGGER, logging.DEBUG,
+                                                     'request https://api.knurld.io/v1/consumers -> 400 '
+                                                     '{"error": "invalid"}'))
+
+
+if __name__ == '__main__':
+    unittest.main()
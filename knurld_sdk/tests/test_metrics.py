@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk import metrics
+from knurld_sdk.APIManager import Consumer
+from knurld_sdk.cache import LRUCache
+from knurld_sdk.metrics import MetricsRegistry, endpoint
+from knurld_sdk.polling import Poller, work_order_done
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+
+
+class SlowSession(FakeSession):
+
+    def respond(self, method, url, **kwargs):
+        time.sleep(0.1)
+        return FakeResponse(200, {'href': url})
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def test_endpoint_families(self):
+        self.assertEqual(endpoint('https://api.knurld.io/v1/enrollments/0123456789abcdef0123456789abcdef?x=1'),
+                         '/v1/enrollments/:id')
+        self.assertEqual(endpoint('https://api.knurld.io/v1/consumers?limit=10&offset=0'), '/v1/consumers')
+        self.assertEqual(endpoint('https://api.knurld.io/oauth/client_credential/accesstoken'),
+                         '/oauth/client_credential/accesstoken')
+
+    def test_prometheus_text(self):
+        registry = MetricsRegistry()
+        requests = registry.counter('requests_total', 'Requests', ('endpoint', 'status'))
+        latency = registry.histogram('latency_seconds', 'Latency', ('endpoint',), buckets=(0.1, 1))
+        requests.inc(('/v1/consumers', '200'))
+        requests.inc(('/v1/consumers', '200'))
+        requests.inc(('/v1/consumers', '5"0\\0'))
+        latency.observe(0.05, ('/v1/consumers',))
+        latency.observe(0.5, ('/v1/consumers',))
+        latency.observe(3, ('/v1/consumers',))
+
+        self.assertEqual(registry.to_prometheus().splitlines(), [
+            '# HELP requests_total Requests',
+            '# TYPE requests_total counter',
+            'requests_total{endpoint="/v1/consumers",status="200"} 2',
+            'requests_total{endpoint="/v1/consumers",status="5\\"0\\\\0"} 1',
+            '# HELP latency_seconds Latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{endpoint="/v1/consumers",le="0.1"} 1',
+            'latency_seconds_bucket{endpoint="/v1/consumers",le="1"} 2',
+            'latency_seconds_bucket{endpoint="/v1/consumers",le="+Inf"} 3',
+            'latency_seconds_sum{endpoint="/v1/consumers"} 3.55',
+            'latency_seconds_count{endpoint="/v1/consumers"} 3',
+            '# HELP knurld_cache_hits Cache lookups answered from the live caches',
+            '# TYPE knurld_cache_hits gauge',
+            '# HELP knurld_cache_misses Cache lookups of the live caches that had to fetch',
+            '# TYPE knurld_cache_misses gauge',
+            '# HELP knurld_cache_evictions Entries the live caches dropped to make room',
+            '# TYPE knurld_cache_evictions gauge',
+            '# HELP knurld_cache_size Entries currently cached',
+            '# TYPE knurld_cache_size gauge',
+        ])
+        self.assertEqual(registry.to_dict()['latency_seconds'], [
+            {'labels': {'endpoint': '/v1/consumers'},
+             'value': {'count': 3, 'sum': 3.55, 'buckets': {'0.1': 1, '1': 2, '+Inf': 3}}}])
+
+    def test_caches_are_read_at_export(self):
+        registry = MetricsRegistry()
+        first, second = LRUCache(1), LRUCache(10)
+        registry.track_cache('app_models', first)
+        registry.track_cache('app_models', second)
+        first.get('a')
+        first.set('a', 1)
+        first.set('b', 2)
+        second.set('a', 1)
+        second.get('a')
+
+        exported = registry.to_dict()
+        self.assertEqual(exported['knurld_cache_hits'], [{'labels': {'cache': 'app_models'}, 'value': 1}])
+        self.assertEqual(exported['knurld_cache_misses'], [{'labels': {'cache': 'app_models'}, 'value': 1}])
+        self.assertEqual(exported['knurld_cache_evictions'], [{'labels': {'cache': 'app_models'}, 'value': 1}])
+        self.assertEqual(exported['knurld_cache_size'], [{'labels': {'cache': 'app_models'}, 'value': 2}])
+
+        # the sums go down with the caches they count, hence gauges
+        del first
+        self.assertEqual(registry.to_dict()['knurld_cache_hits'], [{'labels': {'cache': 'app_models'}, 'value': 1}])
+        self.assertEqual(registry.to_dict()['knurld_cache_misses'], [{'labels': {'cache': 'app_models'}, 'value': 0}])
+
+        # caches are not kept alive by the registry
+        del second
+        self.assertEqual(registry.to_dict()['knurld_cache_size'], [])
+
+    def test_polls_per_completed_work_order(self):
+        statuses = iter(['started', 'started', 'completed'])
+        before = metrics.POLLS.samples()
+        Poller(sleep=lambda _: None).poll(lambda: {'status': next(statuses)}, work_order_done(),
+                                          operation='metrics-test')
+        after = dict(metrics.POLLS.samples())[('metrics-test',)]
+        self.assertNotIn(('metrics-test',), dict(before))
+        self.assertEqual((after['count'], after['sum']), (1, 3))
+
+
+class TestRequestMetrics(unittest.TestCase):
+
+    def test_cache_hits_are_not_requests(self):
+        client = make_client(SlowSession(), config=dict(CONFIG, HTTP_CACHE_ENABLED=True, HTTP_CACHE_TTL=60))
+        for _ in range(3):
+            Consumer(None, client=client).get('metrics-cache')
+
+        path = '/v1/consumers/metrics-cache'
+        self.assertEqual(metrics.REQUESTS.value(('GET', path, '200')), 1)
+        self.assertEqual(metrics.HTTP_CACHE_HITS.value((path, 'fresh')), 2)
+
+    def test_coalesced_calls_are_not_requests(self):
+        session = SlowSession()
+        client = make_client(session)
+        threads = [threading.Thread(target=lambda: Consumer(None, client=client).get('metrics-coalesce'))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        path = '/v1/consumers/metrics-coalesce'
+        self.assertEqual(len(session.requests), 1)
+        self.assertEqual(metrics.REQUESTS.value(('GET', path, '200')), 1)
+        self.assertEqual(metrics.COALESCED.value((path,)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import unittest
+
+from knurld_sdk.CustomExceptions import PageFetchException
+from knurld_sdk.pagination import iter_items, iter_pages, scan
+
+
+class FakeListing(object):
+    """ stands in for a get_all(limit, offset) static method over `total` records
+    """
+
+    def __init__(self, total, report_total=True, fail_at=None):
+        self.total = total
+        self.report_total = report_total
+        self.fail_at = fail_at
+        self.calls = []
+
+    def get_all(self, limit=10, offset=0):
+        self.calls.append((limit, offset))
+        if offset == self.fail_at:
+            return 503, b'unavailable'
+        page = {'items': [{'href': 'item/' + str(i)} for i in range(offset, min(offset + limit, self.total))],
+                'limit': limit, 'offset': offset}
+        if self.report_total:
+            page['total'] = self.total
+        return page
+
+
+class CappedListing(FakeListing):
+    """ a listing whose server returns at most cap items per page, whatever the limit asked; short_at gives the
+    offsets of pages that come back shorter still
+    """
+
+    def __init__(self, total, cap, short_at=()):
+        super(CappedListing, self).__init__(total)
+        self.cap = cap
+        self.short_at = short_at
+
+    def get_all(self, limit=10, offset=0):
+        return super(CappedListing, self).get_all(min(limit, 2 if offset in self.short_at else self.cap), offset)
+
+
+class TestPagination(unittest.TestCase):
+
+    def test_walks_every_page(self):
+        for prefetch in (True, False):
+            listing = FakeListing(total=95)
+            items = list(iter_items(listing.get_all, page_size=10, prefetch=prefetch))
+            self.assertEqual([item['href'] for item in items], ['item/' + str(i) for i in range(95)])
+            self.assertEqual(listing.calls, [(10, o) for o in range(0, 100, 10)])
+
+    def test_exact_multiple_without_total(self):
+        listing = FakeListing(total=30, report_total=False)
+        pages = list(iter_pages(listing.get_all, page_size=10))
+        self.assertEqual([len(p) for p in pages], [10, 10, 10, 0])
+
+    def test_exact_multiple_with_total_stops_early(self):
+        listing = FakeListing(total=30)
+        pages = list(iter_pages(listing.get_all, page_size=10))
+        self.assertEqual(len(pages), 3)
+
+    def test_server_capping_the_limit(self):
+        for prefetch in (True, False):
+            listing = CappedListing(total=95, cap=7)
+            items = list(iter_items(listing.get_all, page_size=10, prefetch=prefetch))
+            self.assertEqual([item['href'] for item in items], ['item/' + str(i) for i in range(95)])
+            self.assertEqual([offset for _, offset in listing.calls], list(range(0, 95, 7)))
+
+    def test_offset(self):
+        listing = FakeListing(total=25)
+        items = list(iter_items(listing.get_all, page_size=10, offset=20))
+        self.assertEqual(len(items), 5)
+
+    def test_lazy(self):
+        listing = FakeListing(total=10 ** 6)
+        items = iter_items(listing.get_all, page_size=100)
+        for _ in range(150):
+            next(items)
+        items.close()
+        # the page being consumed plus at most one prefetched page
+        self.assertLessEqual(len(listing.calls), 3)
+
+    def test_failed_page_raises(self):
+        listing = FakeListing(total=50, fail_at=20)
+        items = iter_items(listing.get_all, page_size=10)
+        self.assertRaises(PageFetchException, list, items)
+
+
+class ShiftingListing(FakeListing):
+    """ a listing where new records are inserted at the head while the scan runs
+    """
+
+    def get_all(self, limit=10, offset=0):
+        page = super(ShiftingListing, self).get_all(limit, offset)
+        if offset == 0:
+            self.inserted = 0
+        elif len(self.calls) == 3:
+            # two records inserted at the head: every later page starts two records earlier in the old numbering
+            self.inserted = 2
+        if self.inserted and isinstance(page, dict):
+            start = offset - self.inserted
+            page['items'] = [{'href': 'item/' + str(i)} for i in range(start, min(start + limit, self.total))]
+        return page
+
+
+class TestScan(unittest.TestCase):
+
+    def test_ordered(self):
+        listing = FakeListing(total=995)
+        items = list(scan(listing.get_all, page_size=10, workers=4))
+        self.assertEqual([item['href'] for item in items], ['item/' + str(i) for i in range(995)])
+
+    def test_unordered(self):
+        listing = FakeListing(total=995)
+        items = list(scan(listing.get_all, page_size=10, workers=4, ordered=False))
+        self.assertEqual(sorted(item['href'] for item in items), sorted('item/' + str(i) for i in range(995)))
+
+    def test_server_capping_the_limit(self):
+        listing = CappedListing(total=95, cap=7, short_at=(21, 56))
+        for ordered in (True, False):
+            items = list(scan(listing.get_all, page_size=10, workers=4, ordered=ordered))
+            hrefs = [item['href'] for item in items]
+            expected = ['item/' + str(i) for i in range(95)]
+            self.assertEqual(hrefs if ordered else sorted(hrefs), expected if ordered else sorted(expected))
+
+    def test_without_total(self):
+        listing = FakeListing(total=55, report_total=False)
+        self.assertEqual(len(list(scan(listing.get_all, page_size=10))), 55)
+
+    def test_dedup_when_records_shift(self):
+        listing = ShiftingListing(total=100)
+        items = [item['href'] for item in scan(listing.get_all, page_size=10, workers=1)]
+        self.assertEqual(len(items), len(set(items)))
+        self.assertEqual(set(items), set('item/' + str(i) for i in range(100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
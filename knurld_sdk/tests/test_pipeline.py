@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import unittest
+
+from knurld_sdk.APIManager import Consumer, Enrollment, Verification
+from knurld_sdk.http_cache import HTTPCache
+from knurld_sdk.pipeline import Call, Pipeline, Retry
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+from knurld_sdk.timeline import Timeline
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_stages_wrap_the_call_in_order(self):
+        seen = []
+
+        def stage(name):
+            def _stage(call, send):
+                seen.append(name)
+                response = send(call)
+                seen.append('/' + name)
+                return response
+            return _stage
+
+        pipeline = Pipeline([('a', stage('a')), ('c', stage('c'))], transport=lambda call: seen.append('send') or 200)
+        pipeline.add('b', stage('b'), after='a')
+        pipeline.add('first', stage('first'), before='a')
+        self.assertEqual(pipeline.names(), ['first', 'a', 'b', 'c'])
+        self.assertEqual(pipeline.send(Call('GET', 'https://api.knurld.io', None)), 200)
+        self.assertEqual(seen, ['first', 'a', 'b', 'c', 'send', '/c', '/b', '/a', '/first'])
+
+        pipeline.remove('b')
+        with self.assertRaises(ValueError):
+            pipeline.add('a', stage('a'))
+        del seen[:]
+        pipeline.send(Call('GET', 'https://api.knurld.io', None))
+        self.assertEqual(seen, ['first', 'a', 'c', 'send', '/c', '/a', '/first'])
+
+    def test_resource_calls_go_through_user_stages(self):
+        session = FakeSession(FakeResponse(200, {'items': []}))
+        client = make_client(session)
+
+        def tenant(call, send):
+            call.headers = dict(call.headers, **{'X-Tenant': 'acme'})
+            return send(call)
+
+        client.pipeline.add('tenant', tenant, after='auth')
+        self.assertEqual(Consumer.get_all(limit=5, client=client), {'items': []})
+        method, url, headers = session.requests[0]
+        self.assertEqual((method, url), ('GET', CONFIG['URL_CONSUMERS'] + '?limit=5&offset=0'))
+        self.assertEqual((headers['Authorization'], headers['X-Tenant']), ('Bearer token', 'acme'))
+        # the prebuilt token headers are left untouched
+        self.assertNotIn('X-Tenant', client.headers())
+
+    def test_retry_idempotent_calls_only(self):
+        delays = []
+        session = FakeSession(FakeResponse(503, headers={'Retry-After': '2'}), FakeResponse(502),
+                              FakeResponse(200, {'href': 'x'}), FakeResponse(503))
+        client = make_client(session, pipeline=Pipeline.from_config(CONFIG))
+        client.pipeline.replace('retry', Retry(retries=2, backoff=0.5, sleep=delays.append))
+
+        self.assertEqual(Consumer(None, client=client).get('abc'), {'href': 'x'})
+        self.assertEqual(delays, [2, 1.0])
+        # updates are POSTs and are never sent twice
+        self.assertEqual(Consumer(None, client=client).update('abc', {'password': 'x'})[0], 503)
+        self.assertEqual(len(session.requests), 4)
+
+    def test_missing_ids_and_options_fail_the_call(self):
+        session = FakeSession(FakeResponse(500))
+        client = make_client(session, config=dict(CONFIG, REATTEMPT_CALLS_FOR=0.1))
+        verification = Verification(None, client=client)
+        self.assertIsNone(verification.get(None))
+        self.assertIsNone(verification.step_one())
+        # step_one failed to create the verification, its id is None
+        self.assertIsNone(verification.step_two({}))
+        self.assertIsNone(Enrollment(None, client=client).delete(None))
+
+        client = make_client(FakeSession(), config=dict((k, v) for k, v in CONFIG.items() if k != 'URL_CONSUMERS'))
+        self.assertIsNone(Consumer(None, client=client).get('abc'))
+        self.assertEqual(len(session.requests), 1)
+
+    def test_cache_coalesce_and_metrics_are_stages(self):
+        session = FakeSession(FakeResponse(200, {'access_token': 'token'}), FakeResponse(200, {'href': 'x'}))
+        config = dict(CONFIG, HTTP_CACHE_ENABLED=True)
+        client = make_client(session, config=config, token_manager=None)
+        self.assertEqual(client.pipeline.names(), ['auth', 'retry', 'trace', 'coalesce', 'cache', 'metrics'])
+
+        client.pipeline.replace('cache', HTTPCache(ttl=60))
+        client.pipeline.remove('coalesce')
+        measured = []
+
+        def metrics(call, send):
+            measured.append(call.url)
+            return send(call)
+
+        client.pipeline.replace('metrics', metrics)
+        self.assertEqual(Consumer(None, client=client).get('abc'), {'href': 'x'})
+        self.assertEqual(Consumer(None, client=client).get('abc'), {'href': 'x'})
+        # the token request goes through the same metrics stage, the cache hit does not
+        self.assertEqual(measured, [CONFIG['URL_ACCESS_TOKEN'], CONFIG['URL_CONSUMERS'] + '/abc'])
+        self.assertEqual(len(session.requests), 2)
+
+    def test_trace_propagates_the_current_span(self):
+        session = FakeSession(FakeResponse(200, {'href': 'x'}))
+        client = make_client(session)
+        timeline = Timeline('consumer')
+        with timeline.span('get') as span:
+            Consumer(None, client=client).get('abc')
+
+        headers = session.requests[0][2]
+        self.assertEqual(headers['traceparent'], '00-{}-{}-01'.format(timeline.trace_id, span.span_id))
+        self.assertEqual((span.attributes['http.method'], span.attributes['http.status_code']), ('GET', 200))
+        self.assertNotIn('traceparent', client.headers())
+
+
+if __name__ == '__main__':
+    unittest.main()
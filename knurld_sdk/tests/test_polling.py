@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import unittest
+
+from knurld_sdk import helpers as h
+from knurld_sdk import metrics as sdk_metrics
+from knurld_sdk.polling import CompletionStats, Poller, work_order_done
+
+
+class TestPoller(unittest.TestCase):
+
+    def setUp(self):
+        self.slept = []
+        self.poller = Poller(initial_delay=0.1, max_delay=1.0, factor=2.0, jitter=0, sleep=self.slept.append)
+
+    def fetcher(self, statuses):
+        statuses = iter(statuses)
+        return lambda: {'status': next(statuses)}
+
+    def test_exponential_backoff_until_completed(self):
+        fetch = self.fetcher(['initialized', 'processing', 'processing', 'processing', 'completed'])
+        result, metrics = self.poller.poll(fetch, work_order_done('status'), operation='enrollment')
+
+        self.assertEqual(result.get('status'), 'completed')
+        self.assertTrue(metrics.completed)
+        self.assertEqual(metrics.count, 5)
+        self.assertEqual(self.slept, [0.1, 0.1, 0.2, 0.4, 0.8])
+
+    def test_backoff_is_capped(self):
+        self.assertEqual(self.poller.next_delay(10), 1.0)
+
+    def test_failed_is_final(self):
+        fetch = self.fetcher(['processing', 'failed', 'completed'])
+        result, metrics = self.poller.poll(fetch, work_order_done('status'))
+        self.assertEqual(result.get('status'), 'failed')
+        self.assertEqual(metrics.count, 2)
+
+    def test_retryable_errors_are_polled_again(self):
+        responses = iter([(503, b''), None, {'taskStatus': 'completed'}])
+        result, metrics = self.poller.poll(lambda: next(responses), work_order_done('taskStatus'))
+        self.assertEqual(result.get('taskStatus'), 'completed')
+        self.assertEqual(metrics.count, 3)
+
+    def test_non_retryable_error_stops_polling(self):
+        errors = sdk_metrics.POLL_ERRORS.value(('enrollment',))
+        result, metrics = self.poller.poll(lambda: (404, b'not found'), work_order_done('status'), 'enrollment')
+        self.assertEqual(result[0], 404)
+        self.assertEqual((metrics.count, metrics.outcome, metrics.completed), (1, 'error', False))
+        # errors are not completion times
+        self.assertIsNone(self.poller.stats.quantile('enrollment', 0.5))
+        self.assertEqual(sdk_metrics.POLL_ERRORS.value(('enrollment',)), errors + 1)
+
+    def test_retry_hint_overrides_backoff(self):
+        fetch = self.fetcher(['processing', 'processing', 'completed'])
+        result, metrics = self.poller.poll(fetch, work_order_done('status'), retry_hint=lambda: 0.7)
+        self.assertEqual(self.slept, [0.1, 0.7, 0.7])
+        self.assertEqual(metrics.hinted, 2)
+
+    def test_timeout(self):
+        result, metrics = self.poller.poll(lambda: {'status': 'processing'}, work_order_done('status'), timeout=0)
+        self.assertIsNone(result)
+        self.assertEqual((metrics.outcome, metrics.completed), ('timeout', False))
+
+    def test_first_delay_follows_observed_completion_times(self):
+        stats = CompletionStats()
+        for seconds in [0.3, 0.5, 0.6, 0.9]:
+            stats.record('verification', seconds)
+        poller = Poller(initial_delay=0.1, max_delay=1.0, stats=stats)
+
+        self.assertEqual(poller.first_delay('verification'), 0.6)
+        self.assertEqual(poller.first_delay('enrollment'), 0.1)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(h.parse_retry_after('3'), 3.0)
+        self.assertIsNone(h.parse_retry_after(None))
+        self.assertIsNone(h.parse_retry_after('soon'))
+        self.assertEqual(h.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import multiprocessing
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from knurld_sdk import helpers as h
+from knurld_sdk import metrics
+from knurld_sdk.APIManager import Consumer
+from knurld_sdk.ratelimit import FileBucketStore, Limit, RateLimiter, endpoint_family
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+
+
+def _take_token(path):
+    RateLimiter({'consumers': Limit(1)}, store=FileBucketStore(path)).acquire('consumers')
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.waits = []
+
+    def test_endpoint_families(self):
+        self.assertEqual(endpoint_family(CONFIG['URL_ENROLLMENTS'] + '/abc?x=1'), 'enrollments')
+        self.assertEqual(endpoint_family(CONFIG['URL_ANALYSIS']), 'endpointAnalysis')
+        self.assertEqual(endpoint_family(CONFIG['URL_APP_MODELS']), 'app-models')
+        self.assertEqual(endpoint_family(CONFIG['URL_ACCESS_TOKEN']), 'oauth')
+
+    def test_acquire_paces_the_calls(self):
+        limiter = RateLimiter({'consumers': Limit(10, burst=0.1)}, sleep=self.waits.append)
+        for _ in range(4):
+            limiter.acquire('consumers')
+        limiter.acquire('enrollments')  # not limited
+
+        self.assertEqual(len(self.waits), 3)
+        for wait, expected in zip(self.waits, (0.1, 0.2, 0.3)):
+            self.assertAlmostEqual(wait, expected, delta=0.01)
+
+    def test_throttling_cuts_the_rate_until_calls_succeed(self):
+        limiter = RateLimiter({'consumers': Limit(10)}, sleep=self.waits.append)
+        before = metrics.THROTTLED.value(('consumers',))
+        limiter.feedback('consumers', 429, retry_after=2)
+        self.assertEqual(limiter.rate('consumers'), 5)
+        self.assertEqual(metrics.THROTTLED.value(('consumers',)), before + 1)
+
+        # the family pauses for the Retry-After delay
+        limiter.acquire('consumers')
+        self.assertAlmostEqual(self.waits[0], 2, delta=0.01)
+
+        for _ in range(5):
+            limiter.feedback('consumers', 200)
+        self.assertAlmostEqual(limiter.rate('consumers'), 7.5)
+        for _ in range(10):
+            limiter.feedback('consumers', 200)
+        self.assertEqual(limiter.rate('consumers'), 10)
+
+        # families without a limit are not slowed down, but still honour the pause
+        limiter.feedback('enrollments', 429, retry_after=1)
+        self.assertIsNone(limiter.rate('enrollments'))
+        limiter.acquire('enrollments')
+        self.assertAlmostEqual(self.waits[-1], 1, delta=0.01)
+
+    def test_file_store_is_shared_between_processes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'buckets.json')
+
+        # another process takes the single token of the bucket
+        process = multiprocessing.Process(target=_take_token, args=(path,))
+        process.start()
+        process.join(10)
+        self.assertEqual(process.exitcode, 0)
+
+        limiter = RateLimiter({'consumers': Limit(1)}, store=FileBucketStore(path), sleep=self.waits.append)
+        limiter.acquire('consumers')
+        self.assertEqual(len(self.waits), 1)
+        self.assertGreater(self.waits[0], 0.5)
+
+    def test_file_store_is_private(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'buckets.json')
+        # a buckets file planted through a symbolic link is neither read nor written through
+        planted = os.path.join(directory, 'planted.json')
+        with open(planted, 'w') as f:
+            f.write('{"consumers": {"tokens": -100, "stamp": 1e12, "rate": 1}}')
+        os.symlink(planted, path)
+
+        limiter = RateLimiter({'consumers': Limit(1)}, store=FileBucketStore(path), sleep=self.waits.append)
+        limiter.acquire('consumers')
+        self.assertEqual(self.waits, [])
+        self.assertFalse(os.path.islink(path))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertIn('-100', open(planted).read())
+
+        store = RateLimiter.from_config(dict(CONFIG, RATE_LIMITS={'consumers': 1}, RATE_LIMIT_BACKEND='file')).store
+        self.assertEqual(os.path.dirname(store.path), h.private_dir())
+
+    def test_stage_only_with_limits(self):
+        self.assertNotIn('ratelimit', make_client(FakeSession()).pipeline.names())
+
+        config = dict(CONFIG, RATE_LIMITS={'consumers': 5})
+        session = FakeSession(FakeResponse(429, headers={'Retry-After': '0'}), FakeResponse(200, {'items': []}))
+        client = make_client(session, config=config)
+        self.assertEqual(client.pipeline.names(), ['auth', 'retry', 'ratelimit', 'trace', 'coalesce', 'metrics'])
+
+        self.assertEqual(Consumer.get_all(client=client)[0], 429)
+        self.assertEqual(client.rate_limiter.rate('consumers'), 2.5)
+        self.assertEqual(Consumer.get_all(client=client), {'items': []})
+        self.assertEqual(len(session.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
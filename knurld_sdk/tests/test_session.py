@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import unittest
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from knurld_sdk.APIManager import Consumer
+from knurld_sdk.client import KnurldClient
+from knurld_sdk.deadline import budget
+from knurld_sdk.session import (DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_MAXSIZE, DEFAULT_READ_TIMEOUT,
+                                retry_after_hint, session_options)
+from knurld_sdk.tests.fakes import CONFIG, static_token_manager
+from knurld_sdk.transport import KnurldSession
+
+
+class RecordingAdapter(HTTPAdapter):
+    """ answers every request with an empty json object, recording the keyword arguments it was sent with
+    """
+
+    def __init__(self, headers=None):
+        super(RecordingAdapter, self).__init__()
+        self.headers = headers or {}
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(kwargs)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"href": "x"}'
+        response.headers.update(self.headers)
+        response.request = request
+        response.url = request.url
+        return response
+
+
+class TestSessionOptions(unittest.TestCase):
+
+    def test_http_options_configure_the_pool(self):
+        options = session_options({'HTTP_POOL_CONNECTIONS': 4, 'HTTP_POOL_MAXSIZE': 50, 'HTTP_POOL_BLOCK': True,
+                                   'HTTP_CONNECT_TIMEOUT': 1.5, 'HTTP_READ_TIMEOUT': 10})
+        self.assertEqual(options, {'pool_connections': 4, 'pool_maxsize': 50, 'pool_block': True,
+                                   'timeout': (1.5, 10.0)})
+
+        session = KnurldSession(**options)
+        for url in ('https://api.knurld.io', 'http://localhost'):
+            adapter = session.get_adapter(url)
+            self.assertEqual((adapter._pool_connections, adapter._pool_maxsize, adapter._pool_block), (4, 50, True))
+        self.assertEqual(session.timeout, (1.5, 10.0))
+
+    def test_defaults(self):
+        options = session_options({})
+        self.assertEqual(options['pool_maxsize'], DEFAULT_POOL_MAXSIZE)
+        self.assertEqual(options['timeout'], (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT))
+        self.assertFalse(options['pool_block'])
+
+
+class TestSessionTimeouts(unittest.TestCase):
+
+    def setUp(self):
+        self.session = KnurldSession(timeout=(2.0, 20.0))
+        self.adapter = RecordingAdapter(headers={'Retry-After': '3'})
+        self.session.mount('https://', self.adapter)
+
+    def test_default_timeout_unless_the_call_gives_one(self):
+        self.session.get('https://api.knurld.io/v1/consumers')
+        self.session.get('https://api.knurld.io/v1/consumers', timeout=5)
+        self.session.post('https://api.knurld.io/v1/consumers', timeout=None)
+        self.assertEqual([kwargs['timeout'] for kwargs in self.adapter.sent], [(2.0, 20.0), 5, (2.0, 20.0)])
+        self.assertEqual(retry_after_hint(), 3.0)
+
+    def test_resource_calls_use_the_session_timeouts(self):
+        client = KnurldClient(config=CONFIG, session=self.session, token_manager=static_token_manager())
+        Consumer(None, client=client).get('abc')
+        with budget(4):
+            Consumer(None, client=client).get('abc')
+
+        timeouts = [kwargs['timeout'] for kwargs in self.adapter.sent]
+        self.assertEqual(timeouts[0], (2.0, 20.0))
+        # the remaining budget of a flow is the timeout of its calls
+        self.assertTrue(3 < timeouts[1] <= 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import unittest
+
+from knurld_sdk.APIManager import Enrollment
+from knurld_sdk.polling import Poller
+from knurld_sdk.tests.fakes import CONFIG, FakeResponse, FakeSession, make_client
+from knurld_sdk.timeline import STATUS_ERROR, STATUS_OK, Timeline
+
+HREF = CONFIG['URL_ENROLLMENTS'] + '/0123456789abcdef0123456789abcdef'
+
+
+class EnrollmentServer(FakeSession):
+    """ an enrollment that completes on the second status poll after its update
+    """
+
+    def __init__(self):
+        super(EnrollmentServer, self).__init__()
+        self.polls = 0
+        self.updated = False
+
+    def respond(self, method, url, **kwargs):
+        if method == 'POST' and url == CONFIG['URL_ENROLLMENTS']:
+            return FakeResponse(201, {'href': HREF})
+        if method == 'POST':
+            self.updated = True
+            return FakeResponse(202, {'href': HREF})
+        if self.updated:
+            self.polls += 1
+        status = 'completed' if self.polls >= 2 else 'initialized'
+        return FakeResponse(200, {'href': HREF, 'status': status, 'instructions': {}})
+
+
+class TestTimeline(unittest.TestCase):
+
+    def test_spans_and_otlp_export(self):
+        timeline = Timeline('verification', consumer_id='abc')
+        with timeline.span('create') as span:
+            span.record('0123')
+        results = iter([(503, 'busy'), {'status': 'completed'}])
+        fetch = timeline.traced('poll', lambda: next(results))
+        fetch()
+        fetch()
+        with self.assertRaises(ValueError):
+            with timeline.span('update'):
+                raise ValueError('bad payload')
+        timeline.mark('result', status='completed')
+        timeline.finish(status='completed')
+
+        self.assertEqual([name for name, _, _ in timeline.stages()], ['create', 'poll', 'poll', 'update', 'result'])
+        starts = [start for _, start, _ in timeline.stages()]
+        self.assertEqual(starts, sorted(starts))
+        self.assertTrue(all(duration >= 0 for _, _, duration in timeline.stages()))
+
+        spans = timeline.to_otlp()['resourceSpans'][0]['scopeSpans'][0]['spans']
+        root = spans[0]
+        self.assertEqual(root['name'], 'verification')
+        self.assertNotIn('parentSpanId', root)
+        self.assertEqual(len(root['traceId']), 32)
+        for span in spans[1:]:
+            self.assertEqual((span['traceId'], span['parentSpanId']), (root['traceId'], root['spanId']))
+            self.assertLessEqual(int(root['startTimeUnixNano']), int(span['startTimeUnixNano']))
+            self.assertLessEqual(int(span['startTimeUnixNano']), int(span['endTimeUnixNano']))
+        self.assertEqual([s['status']['code'] for s in spans[1:]],
+                         [STATUS_OK, STATUS_ERROR, STATUS_OK, STATUS_ERROR, STATUS_OK])
+        self.assertIn({'key': 'status', 'value': {'stringValue': 'http 503'}}, spans[2]['attributes'])
+        self.assertIn({'key': 'attempt', 'value': {'intValue': '2'}}, spans[3]['attributes'])
+
+    def test_enrollment_steps_timeline(self):
+        client = make_client(EnrollmentServer(), poller=Poller(initial_delay=0, sleep=lambda _: None))
+        enrollment = Enrollment(None, 'app-model', 'consumer', client=client)
+
+        self.assertEqual(enrollment.steps({'enrollment.wav': 'https://example.com/a.wav', 'intervals': []}),
+                         '0123456789abcdef0123456789abcdef')
+        timeline = enrollment.timeline
+        self.assertEqual([name for name, _, _ in timeline.stages()],
+                         ['token', 'create', 'instructions', 'update', 'poll', 'poll', 'result'])
+        self.assertEqual(timeline.spans[-1].attributes, {'status': 'completed'})
+        self.assertEqual(timeline.root.attributes['enrollment_id'], '0123456789abcdef0123456789abcdef')
+        self.assertEqual(timeline.root.status, STATUS_OK)
+
+
+if __name__ == '__main__':
+    unittest.main()
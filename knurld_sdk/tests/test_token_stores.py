@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import multiprocessing
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from dogpile.cache import make_region
+
+from knurld_sdk import app_globals as g
+from knurld_sdk import helpers as h
+from knurld_sdk.tests import fakes
+from knurld_sdk.token_stores import FileTokenStore, MemoryTokenStore, RegionTokenStore, store_from_config
+from knurld_sdk.tokens import AccessToken, TokenManager
+
+CONFIG = {'DEVELOPER_ID': 'Bearer: developer', 'TOKEN_EXPIRES': 3599, 'CLIENT_ID': 'client'}
+
+
+def _fetch_and_count(calls_dir):
+    """ a fetch leaving one file in calls_dir per oauth call
+    """
+    def fetch(config):
+        fd, name = tempfile.mkstemp(dir=calls_dir)
+        os.close(fd)
+        time.sleep(0.05)
+        return AccessToken(os.path.basename(name), time.time(), 3599)
+    return fetch
+
+
+def _get_token_in_process(path, calls_dir, queue):
+    manager = TokenManager(config=CONFIG, fetch=_fetch_and_count(calls_dir), store=FileTokenStore(path))
+    queue.put(manager.get_token())
+
+
+class TestTokenStores(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.calls_dir = os.path.join(self.tmp, 'calls')
+        os.mkdir(self.calls_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _calls(self):
+        return len(os.listdir(self.calls_dir))
+
+    def test_file_store_round_trip(self):
+        store = FileTokenStore(os.path.join(self.tmp, 'token.json'))
+        self.assertIsNone(store.load())
+        store.save(AccessToken('abc', 100.0, 60.0))
+        loaded = store.load()
+        self.assertEqual((loaded.token, loaded.issued_at, loaded.expires_in), ('abc', 100.0, 60.0))
+        store.clear()
+        self.assertIsNone(store.load())
+
+    def test_file_store_is_private(self):
+        path = os.path.join(self.tmp, 'token.json')
+        planted = 'token.json.{}.tmp'.format(os.getpid())
+        os.symlink(os.path.join(self.tmp, 'elsewhere'), os.path.join(self.tmp, planted))
+        store = FileTokenStore(path)
+        store.save(AccessToken('abc', 100.0, 60.0))
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        # the temporary file is a fresh one, never a file planted at a predictable name
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'elsewhere')))
+        self.assertEqual([n for n in os.listdir(self.tmp) if n.endswith('.tmp')], [planted])
+
+        # a token file planted through a symbolic link is not read
+        os.remove(path)
+        target = os.path.join(self.tmp, 'planted.json')
+        FileTokenStore(target).save(AccessToken('planted', 100.0, 60.0))
+        os.symlink(target, path)
+        self.assertIsNone(store.load())
+
+    @unittest.skipUnless(hasattr(os, 'getuid') and os.getuid() == 0, 'handing a file to another user needs root')
+    def test_file_of_another_user_is_ignored(self):
+        store = FileTokenStore(os.path.join(self.tmp, 'token.json'))
+        store.save(AccessToken('abc', 100.0, 60.0))
+        os.chown(store.path, 4242, -1)
+        self.assertIsNone(store.load())
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'file owners are only checked on POSIX systems')
+    def test_default_path_is_in_a_private_directory(self):
+        store = store_from_config(dict(CONFIG, TOKEN_CACHE_BACKEND='file'))
+        directory = os.path.dirname(store.path)
+        self.assertEqual(directory, h.private_dir())
+        st = os.stat(directory)
+        self.assertEqual((st.st_uid, stat.S_IMODE(st.st_mode)), (os.getuid(), 0o700))
+
+    def test_managers_share_the_file_store(self):
+        path = os.path.join(self.tmp, 'token.json')
+        fetch = _fetch_and_count(self.calls_dir)
+        first = TokenManager(config=CONFIG, fetch=fetch, store=FileTokenStore(path))
+        second = TokenManager(config=CONFIG, fetch=fetch, store=FileTokenStore(path))
+        self.assertEqual(first.get_token(), second.get_token())
+        self.assertEqual(self._calls(), 1)
+
+        # a forced renewal in one manager is picked up by the other one once its token is stale
+        renewed = first.force_renew()
+        self.assertEqual(self._calls(), 2)
+        self.assertEqual(second.renew(stale=second.current).token, renewed.token)
+        self.assertEqual(self._calls(), 2)
+
+    def test_processes_renew_once(self):
+        path = os.path.join(self.tmp, 'token.json')
+        queue = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=_get_token_in_process, args=(path, self.calls_dir, queue))
+                     for _ in range(4)]
+        for p in processes:
+            p.start()
+        tokens = set(queue.get(timeout=10) for _ in processes)
+        for p in processes:
+            p.join()
+
+        self.assertEqual(len(tokens), 1)
+        self.assertEqual(self._calls(), 1)
+
+    def test_region_store(self):
+        region = make_region().configure('dogpile.cache.memory')
+        fetch = _fetch_and_count(self.calls_dir)
+        first = TokenManager(config=CONFIG, fetch=fetch, store=RegionTokenStore(region))
+        second = TokenManager(config=CONFIG, fetch=fetch, store=RegionTokenStore(region))
+        self.assertEqual(first.get_token(), second.get_token())
+        self.assertEqual(self._calls(), 1)
+
+    def test_store_from_config(self):
+        self.assertIsInstance(store_from_config(CONFIG), MemoryTokenStore)
+        config = dict(CONFIG, TOKEN_CACHE_BACKEND='file', TOKEN_CACHE_PATH=os.path.join(self.tmp, 'token.json'))
+        store = store_from_config(config)
+        self.assertIsInstance(store, FileTokenStore)
+        self.assertEqual(store.path, config['TOKEN_CACHE_PATH'])
+
+    def test_client_builds_the_region_of_its_config(self):
+        shared = {}
+        config = dict(fakes.CONFIG, TOKEN_CACHE_BACKEND='dogpile.cache.memory',
+                      TOKEN_CACHE_ARGUMENTS={'cache_dict': shared})
+        oauth = fakes.FakeSession(fakes.FakeResponse(200, {'access_token': 'shared'}))
+        first = fakes.make_client(oauth, config=config, token_manager=None)
+        # the second client has nothing to answer an oauth request with
+        second = fakes.make_client(fakes.FakeSession(), config=config, token_manager=None)
+
+        store = first.token_manager.store
+        self.assertIsInstance(store, RegionTokenStore)
+        self.assertIsNot(store.region, g.region)
+        self.assertEqual(first.token_manager.get_token(), 'shared')
+        self.assertEqual(second.token_manager.get_token(), 'shared')
+        self.assertEqual(len(shared), 1)
+
+if __name__ == '__main__':
+    unittest.main()
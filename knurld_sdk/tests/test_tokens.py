@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import time
+import unittest
+
+from knurld_sdk.polling import Poller
+from knurld_sdk.tokens import AccessToken, TokenManager
+
+CONFIG = {'DEVELOPER_ID': 'Bearer: developer', 'TOKEN_EXPIRES': 3599}
+
+
+class FakeOAuth(object):
+    """ hands out numbered tokens, slowly enough for concurrent callers to pile up
+    """
+
+    def __init__(self, expires_in=3599, issued_ago=0):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.issued_ago = issued_ago
+        self.lock = threading.Lock()
+
+    def fetch(self, config):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(0.02)
+        return AccessToken('token-' + str(calls), time.time() - self.issued_ago, self.expires_in)
+
+
+class TestTokenManager(unittest.TestCase):
+
+    def test_single_renewal_under_concurrency(self):
+        oauth = FakeOAuth()
+        manager = TokenManager(config=CONFIG, fetch=oauth.fetch)
+        tokens = []
+
+        def worker():
+            tokens.append(manager.get_token())
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(oauth.calls, 1)
+        self.assertEqual(set(tokens), {'token-1'})
+
+    def test_expired_token_is_renewed(self):
+        oauth = FakeOAuth(expires_in=60, issued_ago=61)
+        manager = TokenManager(config=CONFIG, fetch=oauth.fetch)
+        manager.get_token()
+        manager.get_token()
+        self.assertEqual(oauth.calls, 2)
+
+    def test_expires_caps_the_lifetime(self):
+        manager = TokenManager(config=CONFIG, fetch=FakeOAuth(expires_in=3599).fetch, expires=10)
+        manager.get_token()
+        self.assertEqual(manager.current.expires_in, 10)
+
+    def test_headers_reused_until_rotation(self):
+        manager = TokenManager(config=CONFIG, fetch=FakeOAuth().fetch)
+        headers = manager.headers()
+        self.assertIs(headers, manager.headers())
+        self.assertEqual(headers['Authorization'], 'Bearer token-1')
+        self.assertEqual(headers['Developer-Id'], 'Bearer: developer')
+        self.assertEqual(manager.headers(developer_id='consumer')['Developer-Id'], 'consumer')
+
+        manager.force_renew()
+        rotated = manager.headers()
+        self.assertIsNot(headers, rotated)
+        self.assertEqual(rotated['Authorization'], 'Bearer token-2')
+
+    def test_invalidate(self):
+        oauth = FakeOAuth()
+        manager = TokenManager(config=CONFIG, fetch=oauth.fetch)
+        manager.get_token()
+        manager.invalidate()
+        self.assertEqual(manager.get_token(), 'token-2')
+
+
+
+class FlakyOAuth(FakeOAuth):
+    """ fails the given number of renewals after the first token
+    """
+
+    def __init__(self, failures, expires_in=0.4):
+        super(FlakyOAuth, self).__init__(expires_in=expires_in)
+        self.failures = failures
+
+    def fetch(self, config):
+        if self.calls >= 1 and self.failures:
+            self.failures -= 1
+            raise IOError('oauth is down')
+        return super(FlakyOAuth, self).fetch(config)
+
+
+class TestBackgroundRefresh(unittest.TestCase):
+
+    def _wait_for(self, predicate, timeout=3.0):
+        deadline = time.time() + timeout
+        while not predicate() and time.time() < deadline:
+            time.sleep(0.01)
+        return predicate()
+
+    def test_renews_before_expiry(self):
+        oauth = FakeOAuth(expires_in=1.0)
+        manager = TokenManager(config=CONFIG, fetch=oauth.fetch)
+        manager.get_token()
+        manager.start_background_refresh(margin=0.5)
+        try:
+            self.assertTrue(manager.refreshing)
+            self.assertEqual(manager.get_token(), 'token-1')
+            self.assertTrue(self._wait_for(lambda: manager.current.token == 'token-2'))
+            # the refreshed token was put in place before the old one expired, no request had to renew it
+            self.assertEqual(manager.get_token(), 'token-2')
+            self.assertEqual(manager.renewals, 2)
+        finally:
+            manager.stop_background_refresh()
+        self.assertFalse(manager.refreshing)
+
+    def test_failed_refresh_is_retried(self):
+        oauth = FlakyOAuth(failures=2)
+        backoff = Poller(initial_delay=0.01, max_delay=0.02, jitter=0)
+        manager = TokenManager(config=CONFIG, fetch=oauth.fetch, refresh_backoff=backoff)
+        manager.get_token()
+        manager.start_background_refresh(margin=0.2)
+        try:
+            # live traffic keeps the old token while the refresh is failing
+            self.assertEqual(manager.get_token(), 'token-1')
+            self.assertTrue(self._wait_for(lambda: manager.current.token == 'token-2'))
+            self.assertEqual(manager.refresh_failures, 2)
+        finally:
+            manager.stop_background_refresh()
+
+    def test_starts_from_empty_manager(self):
+        oauth = FakeOAuth()
+        manager = TokenManager(config=CONFIG, fetch=oauth.fetch)
+        manager.start_background_refresh(margin=60)
+        try:
+            self.assertTrue(self._wait_for(lambda: manager.current is not None))
+            self.assertEqual(manager.get_token(), 'token-1')
+            self.assertEqual(oauth.calls, 1)
+        finally:
+            manager.stop_background_refresh()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import threading
+import unittest
+
+from knurld_sdk.CustomExceptions import PollTimeoutException
+from knurld_sdk.polling import Poller, work_order_done
+from knurld_sdk.tracker import CompletionTracker
+
+
+class FakeWorkOrder(object):
+    """ completes (or fails) after a given number of status polls, remembering which threads polled it
+    """
+
+    def __init__(self, polls_until_final, final_status='completed'):
+        self.polls = 0
+        self.polls_until_final = polls_until_final
+        self.final_status = final_status
+        self.threads = set()
+
+    def get(self):
+        self.polls += 1
+        self.threads.add(threading.current_thread().name)
+        status = self.final_status if self.polls >= self.polls_until_final else 'processing'
+        return {'status': status}
+
+
+class TestCompletionTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = CompletionTracker(batch_size=25, timeout=5,
+                                         poller=Poller(initial_delay=0.001, max_delay=0.01))
+
+    def tearDown(self):
+        self.tracker.stop()
+
+    def test_resolves_many_work_orders_from_one_thread(self):
+        work_orders = [FakeWorkOrder(polls_until_final=i % 4 + 1) for i in range(200)]
+        futures = [self.tracker.track(('enrollment', i), 'enrollment', w.get, work_order_done('status'))
+                   for i, w in enumerate(work_orders)]
+
+        results = [f.result(timeout=5) for f in futures]
+        self.assertTrue(all(r['status'] == 'completed' for r in results))
+        self.assertEqual(set.union(*[w.threads for w in work_orders]), {'knurld-completion-tracker'})
+        self.assertEqual(self.tracker.pending, 0)
+
+    def test_failed_work_order_resolves(self):
+        w = FakeWorkOrder(polls_until_final=2, final_status='failed')
+        future = self.tracker.track(('analysis', 'task'), 'analysis', w.get, work_order_done('status'))
+        self.assertEqual(future.result(timeout=5)['status'], 'failed')
+
+    def test_same_key_shares_the_future(self):
+        w = FakeWorkOrder(polls_until_final=3)
+        first = self.tracker.track(('verification', 'v'), 'verification', w.get, work_order_done('status'))
+        second = self.tracker.track(('verification', 'v'), 'verification', w.get, work_order_done('status'))
+        self.assertIs(first, second)
+        first.result(timeout=5)
+        self.assertEqual(w.polls, 3)
+
+    def test_timeout(self):
+        self.tracker.timeout = 0.05
+        w = FakeWorkOrder(polls_until_final=10 ** 6)
+        future = self.tracker.track(('enrollment', 'slow'), 'enrollment', w.get, work_order_done('status'))
+        self.assertRaises(PollTimeoutException, future.result, 5)
+
+    def test_stop_cancels_pending(self):
+        w = FakeWorkOrder(polls_until_final=10 ** 6)
+        future = self.tracker.track(('enrollment', 'slow'), 'enrollment', w.get, work_order_done('status'))
+        self.tracker.stop()
+        self.assertTrue(future.cancelled())
+
+    def test_cancelled_while_polled(self):
+        cancelled = self.tracker.track(('enrollment', 'cancelled'), 'enrollment',
+                                       lambda: cancelled.cancel() and {'status': 'completed'},
+                                       work_order_done('status'))
+        w = FakeWorkOrder(polls_until_final=3)
+        future = self.tracker.track(('enrollment', 'other'), 'enrollment', w.get, work_order_done('status'))
+        # the scheduler survives the work order whose future was cancelled during its poll
+        self.assertEqual(future.result(timeout=5)['status'], 'completed')
+        self.assertTrue(cancelled.cancelled())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import binascii
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from knurld_sdk.polling import clock
+
+# OpenTelemetry span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# (timeline, span) of the stage the current thread is running, see current_span()
+_active = threading.local()
+
+
+def _random_id(size):
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {'boolValue': value}
+    elif isinstance(value, int):
+        typed = {'intValue': str(value)}
+    elif isinstance(value, float):
+        typed = {'doubleValue': value}
+    else:
+        typed = {'stringValue': str(value)}
+    return {'key': key, 'value': typed}
+
+
+def current_span():
+    """ (timeline, span) of the stage the calling thread is in, None outside of a stage
+    """
+    return getattr(_active, 'span', None)
+
+
+def outcome(result, status_key='status'):
+    """ the status of a work order call result: the status field of a dict, 'http <code>' for a failed call and
+    'error' when the call raised
+    """
+    if isinstance(result, dict):
+        return result.get(status_key)
+    if isinstance(result, tuple) and result:
+        return 'http {}'.format(result[0])
+    return 'error'
+
+
+class Span(object):
+    """ one stage of a flow, with monotonic start and end times in seconds
+    """
+
+    def __init__(self, name, parent_id=None, kind=SPAN_KIND_CLIENT, attributes=None):
+        self.name = name
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start = clock()
+        self.end = None
+        self.status = STATUS_UNSET
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else clock()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record(self, result, status_key='status'):
+        """ notes the outcome of the call made in the span: a failed call (None or a (status code, content) tuple)
+        marks it as failed, the status of a work order is kept as an attribute
+        """
+        if result is None or isinstance(result, tuple):
+            self.status = STATUS_ERROR
+        if result is None or isinstance(result, (dict, tuple)):
+            self.set(status=outcome(result, status_key))
+        return result
+
+    def finish(self, error=False):
+        if self.end is None:
+            self.end = clock()
+        if error:
+            self.status = STATUS_ERROR
+        elif self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+
+    def __repr__(self):
+        return 'Span({!r}, duration={:.3f}, {!r})'.format(self.name, self.duration, self.attributes)
+
+
+class Timeline(object):
+    """
+    Per invocation record of a multi-step flow (enrollment, verification, endpoint analysis): one span per stage,
+    e.g. the token fetch, the create call, the instructions fetch, the update, every status poll and the result,
+    under a root span covering the whole flow. Times come from the monotonic clock and are mapped to wall clock time
+    only when exported, e.g.
+
+        enrollment.steps(payload)
+        for span in enrollment.timeline.spans:
+            print(span.name, span.duration, span.attributes)
+        json.dumps(enrollment.timeline.to_otlp())    # for an OpenTelemetry collector (OTLP/HTTP JSON)
+    """
+
+    def __init__(self, name, **attributes):
+        self.trace_id = _random_id(16)
+        self.root = Span(name, kind=SPAN_KIND_INTERNAL, attributes=attributes)
+        self.spans = []
+        # wall clock time of the monotonic origin, to export absolute timestamps
+        self._epoch = time.time() - clock()
+
+    @property
+    def name(self):
+        return self.root.name
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """ records the enclosed block as a stage; an exception marks the span as failed and propagates
+        """
+        span = Span(name, parent_id=self.root.span_id, attributes=attributes)
+        self.spans.append(span)
+        outer = current_span()
+        _active.span = (self, span)
+        try:
+            yield span
+        except Exception as e:
+            span.set(error=str(e))
+            span.finish(error=True)
+            raise
+        finally:
+            _active.span = outer
+        span.finish(error=span.status == STATUS_ERROR)
+
+    def traced(self, name, fetch, status_key='status'):
+        """ wraps a status call so that each call is recorded as a numbered stage, e.g. the polls of a work order
+        """
+        attempts = [0]
+
+        def _fetch():
+            attempts[0] += 1
+            with self.span(name, attempt=attempts[0]) as span:
+                return span.record(fetch(), status_key)
+
+        return _fetch
+
+    def mark(self, name, **attributes):
+        """ records an instant, e.g. the final result of the flow
+        """
+        span = Span(name, parent_id=self.root.span_id, kind=SPAN_KIND_INTERNAL, attributes=attributes)
+        span.end = span.start
+        span.status = STATUS_OK
+        self.spans.append(span)
+        return span
+
+    def finish(self, error=False, **attributes):
+        """ closes the root span; a finished timeline can still be exported any number of times
+        """
+        self.root.set(**attributes)
+        self.root.finish(error=error)
+        return self
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+    def stages(self):
+        """ [(name, start offset, duration)] in seconds from the start of the flow, in the order they started
+        """
+        return [(span.name, span.start - self.root.start, span.duration) for span in self.spans]
+
+    def _nanos(self, seconds):
+        return str(int((self._epoch + seconds) * 1e9))
+
+    def _span_to_otlp(self, span):
+        data = {'traceId': self.trace_id, 'spanId': span.span_id, 'name': span.name, 'kind': span.kind,
+                'startTimeUnixNano': self._nanos(span.start),
+                'endTimeUnixNano': self._nanos(span.end if span.end is not None else clock()),
+                'attributes': [_attribute(k, v) for k, v in sorted(span.attributes.items()) if v is not None],
+                'status': {'code': span.status}}
+        if span.parent_id:
+            data['parentSpanId'] = span.parent_id
+        return data
+
+    def to_otlp(self, service_name='knurld_sdk'):
+        """ the spans as an OpenTelemetry (OTLP/JSON) ExportTraceServiceRequest
+        """
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_attribute('service.name', service_name)]},
+            'scopeSpans': [{'scope': {'name': 'knurld_sdk'},
+                            'spans': [self._span_to_otlp(span) for span in [self.root] + self.spans]}]
+        }]}
+
+    def __repr__(self):
+        return 'Timeline({!r}, duration={:.3f}, stages={})'.format(self.name, self.duration, len(self.spans))
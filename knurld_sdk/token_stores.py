@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, the file store then only locks within the process
+    fcntl = None
+
+from knurld_sdk import helpers as h
+from knurld_sdk.tokens import AccessToken
+
+DEFAULT_TOKEN_CACHE_BACKEND = 'memory'  # 'memory', 'file' or the name of a dogpile.cache backend
+
+
+def _to_dict(access):
+    return {'token': access.token, 'issued_at': access.issued_at, 'expires_in': access.expires_in}
+
+
+def _from_dict(data):
+    try:
+        return AccessToken(data['token'], float(data['issued_at']), float(data['expires_in']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _cache_key(config):
+    """ a key unique to the application, so that several applications can share a store
+    """
+    return hashlib.sha1(str(config.get('CLIENT_ID', '')).encode('utf-8')).hexdigest()[:16]
+
+
+class MemoryTokenStore(object):
+    """
+    Keeps the token in the process, i.e. every process fetches its own token. A token store holds the token shared
+    by the TokenManagers using it: load() returns the stored AccessToken or None, save() replaces it, clear() drops
+    it and lock() is the renewal lock, held while a new token is fetched.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        return _from_dict(self._data) if self._data else None
+
+    def save(self, access):
+        self._data = _to_dict(access)
+
+    def clear(self):
+        self._data = None
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            yield
+
+
+class FileTokenStore(object):
+    """
+    Shares the token between all the processes of a host through a json file; the renewal lock is an flock on a
+    sibling '.lock' file, so one process renews the token while the others wait and then read it from the file.
+    The file is only readable by its owner, and a file belonging to another user is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+
+    def load(self):
+        data = h.read_private_json(self.path)
+        return _from_dict(data) if isinstance(data, dict) else None
+
+    def save(self, access):
+        h.write_private_json(self.path, _to_dict(access))
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            fd = h.open_lock_file(self.lock_path)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)    # releases the flock
+
+
+class RegionTokenStore(object):
+    """
+    Shares the token through a dogpile.cache region, e.g. backed by a memcached or redis server reachable from every
+    process. The renewal lock is the backend's mutex: configure the backend with 'distributed_lock': True to make it
+    span processes, otherwise it only locks within the process.
+    """
+
+    def __init__(self, region, key='knurld_sdk.admin_token'):
+        self.region = region
+        self.key = key
+        self._lock = threading.Lock()
+
+    def load(self):
+        data = self.region.get(self.key, ignore_expiration=True)
+        return _from_dict(data) if isinstance(data, dict) else None
+
+    def save(self, access):
+        self.region.set(self.key, _to_dict(access))
+
+    def clear(self):
+        self.region.delete(self.key)
+
+    @contextmanager
+    def lock(self):
+        with self._lock:
+            mutex = self.region.backend.get_mutex(self.key)
+            if mutex is None:
+                yield
+                return
+            mutex.acquire()
+            try:
+                yield
+            finally:
+                mutex.release()
+
+
+def store_from_config(config):
+    """ returns the token store selected by the TOKEN_CACHE_BACKEND config option:
+        'memory' (default): one token per process
+        'file': one token per user of the host, kept in TOKEN_CACHE_PATH (defaults to a file of helpers.private_dir())
+        any other value names a dogpile.cache backend, e.g. 'dogpile.cache.memcached', configured with the
+        TOKEN_CACHE_ARGUMENTS option of the given configuration
+    """
+    backend = config.get('TOKEN_CACHE_BACKEND', DEFAULT_TOKEN_CACHE_BACKEND)
+    if backend == 'memory':
+        return MemoryTokenStore()
+    if backend == 'file':
+        path = config.get('TOKEN_CACHE_PATH')
+        if not path:
+            path = os.path.join(h.private_dir(), 'token_{}.json'.format(_cache_key(config)))
+        return FileTokenStore(path)
+
+    from dogpile.cache import make_region
+    region = make_region().configure(backend, arguments=dict(config.get('TOKEN_CACHE_ARGUMENTS') or {}))
+    return RegionTokenStore(region, key='knurld_sdk.admin_token.' + _cache_key(config))
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import json
+import logging
+import threading
+import time
+
+from knurld_sdk import metrics
+from knurld_sdk.CustomExceptions import DeadlineExceeded, TokenRenewalException
+from knurld_sdk.deadline import current_deadline
+from knurld_sdk.pipeline import Call, Pipeline, measure
+from knurld_sdk.polling import Poller
+
+log = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_MARGIN = 300    # seconds before expiry at which the background refresh renews the token
+
+# stages of the client's pipeline the oauth requests go through, the others are about the resource calls
+TOKEN_STAGES = ('ratelimit', 'metrics')
+
+
+class AccessToken(object):
+    """ an admin access token along with the time it was issued at and its lifetime
+    """
+
+    def __init__(self, token, issued_at, expires_in):
+        self.token = token
+        self.issued_at = issued_at      # seconds since the epoch, taken before the token was requested
+        self.expires_in = expires_in    # seconds
+        self.headers = {}               # prebuilt authorization headers, see TokenManager.headers()
+
+    @property
+    def expires_at(self):
+        return self.issued_at + self.expires_in
+
+    def is_valid(self, margin=0):
+        """ whether the token is still valid margin seconds from now
+        """
+        return time.time() + margin < self.expires_at
+
+    def __repr__(self):
+        return 'AccessToken(issued_at={}, expires_in={})'.format(self.issued_at, self.expires_in)
+
+
+def request_access_token(config, session=None, pipeline=None):
+    """ fetches a new admin token from the oauth endpoint; its lifetime is the 'expires_in' of the response, capped to
+    the TOKEN_EXPIRES config option
+    :param session: the session to send the request with, defaults to the process wide one
+    :param pipeline: the knurld_sdk.pipeline.Pipeline of the client, whose TOKEN_STAGES the request goes through;
+                     without one it is only measured
+    """
+    if session is None:
+        from knurld_sdk.session import get_session
+        session = get_session()
+
+    headers = {'Content-Type': 'application/x-www-form-urlencoded',
+               'Host': config['URL_HOST']
+               }
+
+    payload = {'client_id': config['CLIENT_ID'],
+               'client_secret': config['CLIENT_SECRET']
+               }
+
+    kwargs = {}
+    deadline = current_deadline()
+    if deadline is not None:
+        # fetched within the budget of a flow, see knurld_sdk.deadline
+        kwargs['timeout'] = deadline.remaining()
+        if kwargs['timeout'] <= 0:
+            raise DeadlineExceeded('the access token was not requested, the deadline has passed')
+    if pipeline is None:
+        stages = [('metrics', measure)]
+    else:
+        stages = [(name, pipeline.get(name)) for name in TOKEN_STAGES if pipeline.get(name) is not None]
+    post = Pipeline(stages, transport=lambda call: session.post(call.url, data=payload, headers=call.headers,
+                                                                **kwargs))
+    issued_at = time.time()
+    response = post.send(Call('POST', config['URL_ACCESS_TOKEN'], None, headers=headers, deadline=deadline))
+    return parse_access_token(config, response.status_code, response.content, issued_at)
+
+
+def parse_access_token(config, status_code, content, issued_at):
+    """ builds the AccessToken from the oauth endpoint's response, raises TokenRenewalException when it carries none
+    :param issued_at: the time.time() the token was requested at
+    """
+    try:
+        result = json.loads(content)
+        token = result['access_token']
+    except (ValueError, KeyError, TypeError):
+        raise TokenRenewalException('Could not renew the access token: {} {}'.format(status_code, content))
+
+    expires_in = float(config['TOKEN_EXPIRES'])
+    if result.get('expires_in'):
+        expires_in = min(expires_in, float(result['expires_in']))
+
+    return AccessToken(token, issued_at, expires_in)
+
+
+class TokenManager(object):
+    """
+    Process wide holder of the admin access token. Any number of threads can ask for the token or for ready made
+    authorization headers; when the token expires exactly one of them renews it while the others wait for the result.
+
+    With start_background_refresh() the token is renewed by a background thread shortly before it expires, so that
+    no request has to wait for the oauth round-trip; requests keep using the old token until the new one is in.
+
+    The token and the renewal lock live in a token store (see knurld_sdk.token_stores), which can be shared by all
+    the processes of a host so that they use one token and renew it once.
+    """
+
+    def __init__(self, config=None, fetch=None, expires=None, refresh_backoff=None, store=None):
+        """
+        :param config: configuration mapping, defaults to the one loaded from config.cfg
+        :param fetch: callable(config) returning a fresh AccessToken, defaults to request_access_token
+        :param expires: maximum lifetime of a token in seconds, overrides TOKEN_EXPIRES
+        :param refresh_backoff: knurld_sdk.polling.Poller spacing the retries of a failed background refresh
+        :param store: token store, defaults to the one selected by the TOKEN_CACHE_BACKEND config option
+        """
+        self._config = config
+        self._fetch = fetch if fetch else request_access_token
+        self._expires = expires
+        self._store = store
+        self._current = None
+        self._lock = threading.Lock()
+        self._refresh_backoff = refresh_backoff if refresh_backoff else Poller(initial_delay=1.0, max_delay=60.0)
+        self._refresh_thread = None
+        self._refresh_stop = threading.Event()
+        self.renewals = 0
+        self.refresh_failures = 0
+
+    @property
+    def config(self):
+        if self._config is None:
+            from knurld_sdk import app_globals as g
+            self._config = g.config
+        return self._config
+
+    @property
+    def store(self):
+        if self._store is None:
+            from knurld_sdk.token_stores import store_from_config
+            self._store = store_from_config(self.config)
+        return self._store
+
+    @property
+    def current(self):
+        """ the AccessToken in use, None before the first renewal
+        """
+        return self._current
+
+    def _valid_token(self):
+        current = self._current
+        if current is not None and current.is_valid():
+            return current
+        return self.renew(stale=current)
+
+    def renew(self, stale=None):
+        """ renews the token unless another thread already replaced the stale one meanwhile
+        :param stale: the AccessToken the caller found expired (or wants replaced); None renews an empty manager
+        """
+        with self._lock:
+            current = self._current
+            if current is not None and current is not stale and current.is_valid():
+                return current
+
+            # another process may have renewed it already
+            shared = self._shared(stale)
+            if shared is not None:
+                return shared
+
+            with self.store.lock():
+                shared = self._shared(stale)
+                if shared is not None:
+                    return shared
+
+                try:
+                    access = self._fetch(self.config)
+                except Exception:
+                    metrics.TOKEN_RENEWALS.inc(('failure',))
+                    raise
+                metrics.TOKEN_RENEWALS.inc(('success',))
+                if self._expires:
+                    access.expires_in = min(access.expires_in, float(self._expires))
+                self.store.save(access)
+                self._current = access
+                self.renewals += 1
+                return access
+
+    def _shared(self, stale):
+        """ adopts the token of the store when it is valid and not the stale one, returns it or None
+        """
+        access = self.store.load()
+        if access is None or (stale is not None and access.token == stale.token) or not access.is_valid():
+            return None
+        if self._expires:
+            access.expires_in = min(access.expires_in, float(self._expires))
+        self._current = access
+        return access
+
+    def force_renew(self):
+        """ replaces the current token with a new one
+        """
+        return self.renew(stale=self._current)
+
+    def get_token(self):
+        return self._valid_token().token
+
+    def headers(self, content_type='application/json', developer_id=None):
+        """ returns the authorization headers for the current token; the same dict is handed out until the token
+        rotates, so callers must not modify it
+        """
+        access = self._valid_token()
+        key = (content_type, developer_id)
+        headers = access.headers.get(key)
+        if headers is None:
+            headers = {
+                'Content-Type': content_type,
+                'Authorization': 'Bearer ' + str(access.token),
+                # for a consumer the consumer token replaces the Developer-Id
+                'Developer-Id': developer_id if developer_id else self.config['DEVELOPER_ID']
+            }
+            access.headers[key] = headers
+        return headers
+
+    def invalidate(self):
+        """ drops the current token, e.g. after the API rejected it; the next call renews it
+        """
+        with self._lock:
+            self._current = None
+            self.store.clear()
+
+    @property
+    def refreshing(self):
+        """ whether the background refresh is running
+        """
+        return self._refresh_thread is not None and self._refresh_thread.is_alive()
+
+    def start_background_refresh(self, margin=None):
+        """ starts renewing the token in a background thread margin seconds before it expires
+        :param margin: seconds, defaults to the TOKEN_REFRESH_MARGIN config option; at most half of the lifetime of
+                       a token is used, so that a token is always in use for a while before being replaced
+        """
+        if self.refreshing:
+            return
+        if margin is None:
+            margin = float(self.config.get('TOKEN_REFRESH_MARGIN', DEFAULT_REFRESH_MARGIN))
+
+        self._refresh_stop.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, args=(margin,),
+                                                name='knurld-token-refresh')
+        self._refresh_thread.daemon = True
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self, wait=True):
+        self._refresh_stop.set()
+        if wait and self.refreshing:
+            self._refresh_thread.join()
+        self._refresh_thread = None
+
+    def _next_refresh_in(self, margin):
+        current = self._current
+        if current is None:
+            return 0
+        return max(0, current.expires_at - min(margin, current.expires_in / 2.0) - time.time())
+
+    def _refresh_loop(self, margin):
+        failures = 0
+        while True:
+            if failures:
+                wait = self._refresh_backoff.next_delay(failures - 1)
+            else:
+                wait = self._next_refresh_in(margin)
+            if self._refresh_stop.wait(wait):
+                return
+
+            try:
+                # a live request may have renewed an expired token meanwhile, then there's nothing to do yet
+                current = self._current
+                if current is None or not current.is_valid(min(margin, current.expires_in / 2.0)):
+                    self.renew(stale=current)
+                failures = 0
+            except Exception as e:
+                # the current token (if still valid) stays in use, live requests are not affected
+                failures += 1
+                self.refresh_failures += 1
+                log.warning('Background token refresh failed, attempt %s: %s', failures, e)
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def _default_fetch(config):
+    from knurld_sdk.client import default_client
+    return request_access_token(config, pipeline=default_client().pipeline)
+
+
+def default_token_manager():
+    """ returns the process wide TokenManager, creating it on first use
+    """
+    global _default_manager
+
+    if _default_manager is None:
+        with _default_manager_lock:
+            if _default_manager is None:
+                # the default client holds the rate limiter of config.cfg
+                _default_manager = TokenManager(fetch=_default_fetch)
+                if _default_manager.config.get('TOKEN_BACKGROUND_REFRESH'):
+                    _default_manager.start_background_refresh()
+    return _default_manager
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+
+try:
+    from concurrent.futures import InvalidStateError
+except ImportError:     # before Python 3.8 the outcome of a cancelled future could be set without an error
+    InvalidStateError = RuntimeError
+
+from knurld_sdk.CustomExceptions import PollTimeoutException
+from knurld_sdk.client import default_client
+from knurld_sdk.polling import clock, work_order_done
+
+
+class _Tracked(object):
+    """ one work order followed by the CompletionTracker
+    """
+
+    def __init__(self, key, operation, fetch, is_done, retry_hint, deadline):
+        self.key = key
+        self.operation = operation
+        self.fetch = fetch
+        self.is_done = is_done
+        self.retry_hint = retry_hint
+        self.deadline = deadline
+        self.started = clock()
+        self.attempt = 0
+        self.future = Future()
+
+
+class CompletionTracker(object):
+    """
+    Follows many in-flight work orders (endpoint analysis tasks, enrollments, verifications) from one scheduler
+    thread, instead of one polling loop per work order. Each track_* call returns a concurrent.futures.Future that
+    is resolved with the final result once the work order is 'completed' or 'failed'. Every tick the scheduler
+    polls a batch of the work orders that are due, each one on its own backoff schedule, so the polling cost grows
+    with the number of ticks rather than with the number of work orders times threads, e.g.
+
+        with CompletionTracker() as tracker:
+            futures = [tracker.track_task(name) for name in task_names]
+            results = [f.result() for f in futures]
+
+    Note: future callbacks run on the scheduler thread and should return quickly.
+    """
+
+    def __init__(self, batch_size=50, timeout=None, poller=None, client=None):
+        """
+        :param batch_size: maximum number of work orders polled in one tick
+        :param timeout: seconds after which a work order that is still running fails with PollTimeoutException,
+                        defaults to the REATTEMPT_CALLS_FOR config option; 0 to wait forever
+        :param poller: knurld_sdk.polling.Poller giving the per work order backoff schedule, defaults to the one of
+                       the client
+        :param client: knurld_sdk.client.KnurldClient the work orders belong to, defaults to default_client()
+        """
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._poller = poller
+        self.client = client if client else default_client()
+        self._tracked = {}
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    @property
+    def poller(self):
+        if self._poller is None:
+            self._poller = self.client.poller
+        return self._poller
+
+    @property
+    def pending(self):
+        """ number of work orders not resolved yet
+        """
+        return len(self._tracked)
+
+    def _timeout(self):
+        if self.timeout is None:
+            self.timeout = float(self.client.config['REATTEMPT_CALLS_FOR'])
+        return self.timeout
+
+    def track(self, key, operation, fetch, is_done, retry_hint=None):
+        """ starts following a work order; tracking the same key twice returns the same future
+        :param key: unique key of the work order, e.g. ('enrollment', enrollment_id)
+        :param operation: operation type for the poller's completion time statistics
+        :param fetch: callable returning the current state of the work order
+        :param is_done: predicate on the result of fetch(), e.g. polling.work_order_done()
+        :param retry_hint: callable returning the delay (seconds) asked by the server for the last fetch, or None
+        """
+        timeout = self._timeout()
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError('CompletionTracker is stopped')
+
+            tracked = self._tracked.get(key)
+            if tracked is None:
+                deadline = clock() + timeout if timeout else None
+                tracked = self._tracked[key] = _Tracked(key, operation, fetch, is_done, retry_hint, deadline)
+                self._schedule_poll(tracked, clock() + self.poller.first_delay(operation))
+                self._start()
+            return tracked.future
+
+    def track_task(self, task_name):
+        """ follows an endpoint analysis task started by Analysis.start_task
+        """
+        from knurld_sdk.APIManager import Analysis
+        from knurld_sdk.session import retry_after_hint
+        return self.track(('analysis', task_name), 'analysis',
+                          lambda: Analysis.check_status(task_name, client=self.client), work_order_done('taskStatus'),
+                          retry_after_hint)
+
+    def track_enrollment(self, enrollment_id):
+        """ follows an enrollment updated with its recording by Enrollment.update
+        """
+        from knurld_sdk.APIManager import Enrollment
+        from knurld_sdk.session import retry_after_hint
+        return self.track(('enrollment', enrollment_id), 'enrollment',
+                          lambda: Enrollment(None, client=self.client).get(enrollment_id), work_order_done('status'),
+                          retry_after_hint)
+
+    def track_verification(self, verification_id):
+        """ follows a verification updated with its recording by Verification.update
+        """
+        from knurld_sdk.APIManager import Verification
+        from knurld_sdk.session import retry_after_hint
+        return self.track(('verification', verification_id), 'verification',
+                          lambda: Verification(None, client=self.client).get(verification_id),
+                          work_order_done('status'), retry_after_hint)
+
+    def _schedule_poll(self, tracked, due):
+        heapq.heappush(self._schedule, (due, next(self._sequence), tracked))
+        self._condition.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='knurld-completion-tracker')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next_batch(self):
+        """ waits for the next tick and returns the work orders due for a poll, None once stopped
+        """
+        with self._condition:
+            while not self._stopped:
+                now = clock()
+                if self._schedule and self._schedule[0][0] <= now:
+                    batch = []
+                    while self._schedule and self._schedule[0][0] <= now and len(batch) < self.batch_size:
+                        batch.append(heapq.heappop(self._schedule)[2])
+                    return batch
+                self._condition.wait(self._schedule[0][0] - now if self._schedule else None)
+        return None
+
+    def _resolve(self, tracked, result=None, exception=None):
+        with self._condition:
+            self._tracked.pop(tracked.key, None)
+        try:
+            if exception is not None:
+                tracked.future.set_exception(exception)
+            else:
+                tracked.future.set_result(result)
+        except InvalidStateError:
+            # cancelled by the caller or by stop() meanwhile
+            pass
+
+    def _poll(self, tracked):
+        try:
+            result = tracked.fetch()
+        except Exception as e:
+            self._resolve(tracked, exception=e)
+            return
+
+        now = clock()
+        if tracked.is_done(result):
+            self.poller.done(tracked.operation, result, now - tracked.started, tracked.attempt + 1)
+            self._resolve(tracked, result=result)
+        elif tracked.deadline is not None and now >= tracked.deadline:
+            self._resolve(tracked, exception=PollTimeoutException(
+                '{} {} did not complete in time, last result: {}'.format(tracked.key[0], tracked.key[1], result)))
+        else:
+            delay = self.poller.next_delay(tracked.attempt, tracked.retry_hint() if tracked.retry_hint else None)
+            tracked.attempt += 1
+            with self._condition:
+                self._schedule_poll(tracked, now + delay)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            for tracked in batch:
+                if tracked.future.cancelled():
+                    with self._condition:
+                        self._tracked.pop(tracked.key, None)
+                    continue
+                self._poll(tracked)
+
+    def stop(self, wait=True):
+        """ stops the scheduler thread and cancels the futures of the work orders still running
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            tracked, self._tracked, self._schedule = list(self._tracked.values()), {}, []
+
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        for t in tracked:
+            t.future.cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+# Copyright 2016 Intellisis Inc.  All rights reserved.
+#
+# Use of this source code is governed by a BSD-style
+# license that can be found in the LICENSE file
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from knurld_sdk.session import (DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_BLOCK, DEFAULT_POOL_CONNECTIONS,
+                                DEFAULT_POOL_MAXSIZE, DEFAULT_READ_TIMEOUT, record_retry_after)
+
+
+class KnurldSession(requests.Session):
+    """ A requests.Session shared by all the resource classes, so that consecutive calls re-use warm keep-alive
+    connections instead of doing a fresh TCP + TLS handshake for every request
+    """
+
+    def __init__(self, pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                 pool_block=DEFAULT_POOL_BLOCK, timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
+        """
+        :param pool_connections: number of per-host connection pools to cache
+        :param pool_maxsize: maximum number of connections to keep alive per host
+        :param pool_block: block (instead of opening extra, non pooled connections) once pool_maxsize is reached
+        :param timeout: default (connect, read) timeout applied to requests that do not pass their own
+        """
+        super(KnurldSession, self).__init__()
+        self.timeout = timeout
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.hooks['response'].append(record_retry_after)
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super(KnurldSession, self).request(method, url, **kwargs)
@@ -8,14 +8,15 @@
 
 import contextlib
 import datetime
-import dropbox
-from dropbox.exceptions import ApiError, HttpError
-from dropbox.files import FileMetadata
+import logging
 import os
 import time
 import uuid
 
 from knurld_sdk import app_globals as g
+from knurld_sdk import metrics
+
+log = logging.getLogger(__name__)
 
 """ sample json configuration object:
 {
@@ -27,24 +28,34 @@ from knurld_sdk import app_globals as g
 }
 """
 
-# dbx_config is being read from the main config, which you can be overwritten by app-developers
-dbx_config = g.config['DROPBOX']
+# dbx_config is being read from the main config on first use, which you can be overwritten by app-developers
+dbx_config = None
+
+
+def _dbx_config():
+    global dbx_config
+
+    if dbx_config is None:
+        dbx_config = g.config['DROPBOX']
+    return dbx_config
 
 
 def download(dbx, remote_file_path):
     """Download a file.
     Return the bytes of the file, or None if it doesn't exist.
     """
+    from dropbox.exceptions import ApiError, HttpError
+
     while '//' in remote_file_path:
         remote_file_path = remote_file_path.replace('//', '/')
     with stopwatch('"download" file: %s' % str(remote_file_path)):
         try:
             md, res = dbx.files_download(remote_file_path)
         except (HttpError, ApiError) as err:
-            print('*** HTTP/API error', err)
+            log.error('HTTP/API error: %s', err)
             return None
     data = res.content
-    print(len(data), 'bytes; md:', md)
+    log.debug('%d bytes; md: %s', len(data), md)
     return data
 
 
@@ -52,6 +63,9 @@ def upload(dbx, local_file_path, remote_file_path, overwrite=False):
     """Upload a file.
     Return the request response, or None in case of error.
     """
+    import dropbox
+    from dropbox.exceptions import ApiError, HttpError
+
     while '//' in remote_file_path:
         remote_file_path = remote_file_path.replace('//', '/')
     mode = (dropbox.files.WriteMode.overwrite
@@ -68,9 +82,10 @@ def upload(dbx, local_file_path, remote_file_path, overwrite=False):
                     mute=True)
 
             except (HttpError, ApiError) as err:
-                print('*** Http/API error', err)
+                log.error('HTTP/API error: %s', err)
                 return None
-    print('uploaded as: ' + str(res.name.encode('utf8')))
+    metrics.UPLOADED_BYTES.inc(amount=len(data))
+    log.debug('uploaded as: %s', res.name)
     return res
 
 
@@ -78,6 +93,8 @@ def share(dbx, remote_file_path):
     """Share the file.
     Return the public url to shared file or None in case of error.
     """
+    from dropbox.exceptions import ApiError, HttpError
+
     while '//' in remote_file_path:
         remote_file_path = remote_file_path.replace('//', '/')
 
@@ -89,28 +106,31 @@ def share(dbx, remote_file_path):
                 res.url = res.url.replace('dl=0', 'dl=1')
                 return res.url
         except (HttpError, ApiError, TypeError) as err:
-            print('*** Http/API error', err)
+            log.error('HTTP/API error: %s', err)
 
     return None
 
 
 @contextlib.contextmanager
 def stopwatch(message):
-    """Context manager to print how long a block of code took."""
+    """Context manager to log how long a block of code took."""
     t0 = time.time()
     try:
         yield
     finally:
         t1 = time.time()
-        print('Total elapsed time for %s: %.3f' % (message, t1 - t0))
+        log.debug('Total elapsed time for %s: %.3f', message, t1 - t0)
 
 
 def get_dropbox_client():
+    # the dropbox SDK is only imported once a client is needed
+    import dropbox
+
     try:
-        dbx = dropbox.Dropbox(dbx_config['ACCESS_TOKEN'])
+        dbx = dropbox.Dropbox(_dbx_config()['ACCESS_TOKEN'])
         return dbx
     except ValueError as e:
-        print('ACCESS_TOKEN not found error. ' + str(e))
+        log.error('ACCESS_TOKEN not found error: %s', e)
     return None
 
 
@@ -124,8 +144,12 @@ def upload_and_share(local_file_path, file_type='enrollment'):
     :param local_file_path: full local path of the file to be uploaded
     :param file_type: indicated the purpose of this file upload (enrollment or verification)
     """
+    from dropbox.exceptions import ApiError
+    from dropbox.files import FileMetadata
+
     try:
         dbx = get_dropbox_client()
+        dbx_config = _dbx_config()
         remote_path = dbx_config['REMOTE_DIR'].replace(os.path.sep, '/')
 
         file_id = '_standalone_' + str(uuid.uuid1())
@@ -134,12 +158,12 @@ def upload_and_share(local_file_path, file_type='enrollment'):
 
         response = upload(dbx, local_file_path, remote_file_path, overwrite=True)
         if response:
-            print('{} Upload Successful!'.format(remote_file_path))
+            log.info('%s Upload Successful!', remote_file_path)
             shared_url = share(dbx, remote_file_path)
-            print('{} Shared Successfully!'.format(shared_url))
+            log.info('%s Shared Successfully!', shared_url)
             return True
     except (OSError, KeyError, ApiError, IOError, BufferError, FileMetadata) as e:
-        print('File {} could not be uploaded or shared. {} '.format(local_file_path, e))
+        log.error('File %s could not be uploaded or shared: %s', local_file_path, e)
 
     return None
 
@@ -19,7 +19,7 @@ setup(name='knurld_sdk',
       author='Rohan Bakare',
       author_email='rbakare@knurld.com',
       license='https://github.com/knurld/Python-SDK/blob/master/LICENSE',
-      packages=['knurld_sdk'],
+      packages=['knurld_sdk', 'knurld_sdk.aio'],
       zip_safe=False,
       install_requires=knurld_sdk_requirements,  # includes all the dependencies while installation
       test_suite='nose.collector',